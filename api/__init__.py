@@ -1,21 +1,79 @@
+import asyncio
 import json
 import logging
-from contextlib import asynccontextmanager
+import time
+from contextlib import asynccontextmanager, suppress
 
 from aiogram import types
 from bot import bot, dp, set_commands
-from config import ADMIN_ID, BASE_URL, WEBHOOK_PATH
+from config import (
+    ADMIN_ID,
+    BACKUP_INTERVAL,
+    BASE_URL,
+    CONTENT_WATCH_INTERVAL,
+    LEADERBOARD_REFRESH_INTERVAL,
+    MAINTENANCE_INTERVAL,
+    WEBHOOK_PATH,
+    WORKERS,
+)
+from db.backup import backup_periodically
+from db.leaderboard import load_leaderboard, refresh_leaderboard_periodically
+from db.maintenance import maintain_periodically
+from db.presence import presence, sweep_presence_periodically
+from db.utils import watch_content
+from db.world import reload_world, share_world_generation
 from fastapi import FastAPI
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await set_commands()
-    # urljoin doesn't work on the server for some reason, so I use manual concatenation here
-    await bot.set_webhook(f"{BASE_URL.rstrip('/')}/{WEBHOOK_PATH.lstrip('/')}")
+    app.state.workers = None
+    if WORKERS > 1:
+        from api.workers import WorkerPool
+
+        if not LEADERBOARD_REFRESH_INTERVAL:
+            raise ValueError(
+                "The workers' leaderboards drift apart without LEADERBOARD_REFRESH_INTERVAL, set it above 0"
+            )
+
+        # the updates are handled by the workers, this process only routes them
+        app.state.workers = WorkerPool(WORKERS)
+        app.state.workers.start()
+        share_world_generation(app.state.workers.generation)
+    # the world is built in a thread, so it doesn't wait for the telegram requests
+    await asyncio.gather(
+        reload_world(),
+        set_commands(),
+        # urljoin doesn't work on the server for some reason, so I use manual concatenation here
+        bot.set_webhook(f"{BASE_URL.rstrip('/')}/{WEBHOOK_PATH.lstrip('/')}"),
+    )
+    tasks = []
+    if not app.state.workers:
+        # the workers keep their own leaderboards
+        await asyncio.to_thread(load_leaderboard)
+        if LEADERBOARD_REFRESH_INTERVAL:
+            tasks.append(
+                asyncio.create_task(
+                    refresh_leaderboard_periodically(LEADERBOARD_REFRESH_INTERVAL)
+                )
+            )
+    if presence.enabled:
+        tasks.append(asyncio.create_task(sweep_presence_periodically()))
+    if CONTENT_WATCH_INTERVAL:
+        tasks.append(asyncio.create_task(watch_content(CONTENT_WATCH_INTERVAL)))
+    if BACKUP_INTERVAL:
+        tasks.append(asyncio.create_task(backup_periodically(BACKUP_INTERVAL)))
+    if MAINTENANCE_INTERVAL:
+        tasks.append(asyncio.create_task(maintain_periodically(MAINTENANCE_INTERVAL)))
     if ADMIN_ID:
         await bot.send_message(chat_id=ADMIN_ID, text="Bot's started")
     yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    if app.state.workers:
+        await asyncio.to_thread(app.state.workers.stop)
     if ADMIN_ID:
         await bot.send_message(chat_id=ADMIN_ID, text="Bot's stopped")
     await bot.delete_webhook(drop_pending_updates=True)
@@ -24,6 +82,8 @@ async def lifespan(app: FastAPI):
 
 app = FastAPI(lifespan=lifespan)
 logger = logging.getLogger(__name__)
+started_at = time.perf_counter()
+first_update_handled = False
 
 
 @app.post(f"/{WEBHOOK_PATH.lstrip()}")
@@ -35,4 +95,13 @@ async def bot_webhook(update: dict):
                 chat_id=ADMIN_ID,
                 text=f"Interaction received from id={update['message']['chat']['id']}; user={update['message']['chat']['username']}",
             )
+    if app.state.workers:
+        app.state.workers.submit(update)
+        return
     await dp.feed_update(bot, types.Update(**update))
+    global first_update_handled
+    if not first_update_handled:
+        first_update_handled = True
+        logger.info(
+            f"Cold start: first update handled {(time.perf_counter() - started_at) * 1000:.0f} ms after start"
+        )
@@ -0,0 +1,344 @@
+import asyncio
+import datetime
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import suppress
+
+from aiogram import methods, types
+from aiogram.client.session.base import BaseSession
+from db.storage import get_shard
+
+BENCHMARK_USERS = 200
+"""A constant that defines the number of users in the worker benchmark."""
+
+BENCHMARK_ACTIONS = ("get_location", "get_inventory", "get_stats", "get_quests") * 3
+"""A constant that defines the menu buttons every user presses in the worker benchmark after creating a character."""
+
+BENCHMARK_USER_ID = 2**40
+"""A constant that defines the first user id of the worker benchmark."""
+
+
+def get_user_id(update):
+    """A function that returns the id of the user who sent an update.
+
+    :param dict update: The update from telegram.
+
+    :returns:
+        int: The id of the user or 0 if the update has no user.
+    """
+    for value in update.values():
+        if isinstance(value, dict):
+            user = value.get("from") or value.get("user") or value.get("chat")
+            if user:
+                return user["id"]
+    return 0
+
+
+def get_worker(user_id, workers):
+    """A function that returns the worker that handles the updates of a user.
+
+    It's the same hash as the one of the player shards, so with WORKERS equal to PLAYER_SHARDS
+    every shard is written by one worker only.
+
+    :param int user_id: The id of the user.
+    :param int workers: The number of workers.
+
+    :returns:
+        int: The index of the worker.
+    """
+    return get_shard(user_id, workers)
+
+
+class NullSession(BaseSession):
+    """A class that represents a bot session that doesn't send anything to telegram, used by the benchmark."""
+
+    async def close(self):
+        """A method that closes the session."""
+
+    async def stream_content(self, *args, **kwargs):
+        """A method that streams nothing."""
+        yield b""
+
+    async def make_request(self, bot, method, timeout=None):
+        """A method that returns a reply as if telegram accepted the request.
+
+        Every sent message gets id 1, so the benchmark can press the buttons of the last message.
+        """
+        if isinstance(method, (methods.SendMessage, methods.EditMessageText)):
+            return types.Message(
+                message_id=getattr(method, "message_id", None) or 1,
+                date=datetime.datetime.now(),
+                chat=types.Chat(id=method.chat_id or 0, type="private"),
+                text=method.text,
+            )
+        return True
+
+
+async def _handle(bot, dp, update, previous, handled):
+    if previous:
+        with suppress(Exception):
+            await previous
+    try:
+        await dp.feed_update(bot, types.Update(**update))
+    except Exception as e:
+        logging.error(f"Couldn't handle update {update.get('update_id')}: {e}")
+    finally:
+        if handled is not None:
+            handled.put(update.get("update_id"))
+
+
+async def _serve(updates, handled, generation, null_session):
+    from bot import bot, dp
+    from bot.handlers import router
+    from config import LEADERBOARD_REFRESH_INTERVAL
+    from db.events import event_log
+    from db.leaderboard import load_leaderboard, refresh_leaderboard_periodically
+    from db.world import follow_world_generation, reload_world, share_world_generation
+
+    share_world_generation(generation)
+    dp.include_router(router)
+    if null_session:
+        bot.session = NullSession()
+    await reload_world()
+    await asyncio.to_thread(load_leaderboard)
+    tasks = []
+    if generation is not None:
+        tasks.append(asyncio.create_task(follow_world_generation()))
+    if LEADERBOARD_REFRESH_INTERVAL:
+        tasks.append(
+            asyncio.create_task(
+                refresh_leaderboard_periodically(LEADERBOARD_REFRESH_INTERVAL)
+            )
+        )
+    if handled is not None:
+        handled.put(None)
+
+    loop = asyncio.get_running_loop()
+    # the last task of every user, the next update of the user waits for it to keep the order
+    pending = {}
+
+    def forget(user_id, task):
+        if pending.get(user_id) is task:
+            del pending[user_id]
+
+    while True:
+        update = await loop.run_in_executor(None, updates.get)
+        if update is None:
+            break
+        user_id = get_user_id(update)
+        task = asyncio.create_task(
+            _handle(bot, dp, update, pending.get(user_id), handled)
+        )
+        pending[user_id] = task
+        task.add_done_callback(lambda task, user_id=user_id: forget(user_id, task))
+    await asyncio.gather(*pending.values())
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await bot.session.close()
+    # a worker process exits without running the atexit handlers
+    if event_log:
+        event_log.flush()
+
+
+def run_worker(updates, handled=None, generation=None, null_session=False):
+    """A function that handles the updates from a queue until it gets None.
+
+    The updates of one user are handled one by one in order, the updates of different users concurrently.
+
+    :param multiprocessing.Queue updates: The queue of the updates.
+    :param multiprocessing.Queue handled: (optional) The queue to put the ids of the handled updates to. Defaults to None.
+    :param multiprocessing.Value generation: (optional) The world reload counter shared by the workers. Defaults to None.
+    :param bool null_session: (optional) Whether to replace the bot session with NullSession. Defaults to False.
+    """
+    logging.basicConfig(
+        level=logging.WARNING if null_session else logging.INFO,
+        format=f"%(asctime)s - worker {os.getpid()} - %(name)s - %(levelname)s - %(message)s",
+    )
+    asyncio.run(_serve(updates, handled, generation, null_session))
+
+
+class WorkerPool:
+    """A class that represents a pool of processes that handle the updates.
+
+    Every user is assigned to one worker, so the updates of the user are handled in order
+    and the FSM data of the user stays in one process.
+    """
+
+    def __init__(self, workers: int, handled=None, null_session: bool = False):
+        """A method that initializes the pool.
+
+        :param int workers: The number of worker processes.
+        :param multiprocessing.Queue handled: (optional) The queue the workers put the ids of the handled updates to. Defaults to None.
+        :param bool null_session: (optional) Whether the workers don't send anything to telegram. Defaults to False.
+        """
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue() for _ in range(workers)]
+        self.generation = self.context.Value("i", 0)
+        self.handled = handled
+        self.null_session = null_session
+        self.processes = []
+
+    def start(self):
+        """A method that starts the worker processes."""
+        for queue in self.queues:
+            process = self.context.Process(
+                target=run_worker,
+                args=(queue, self.handled, self.generation, self.null_session),
+                daemon=True,
+            )
+            process.start()
+            self.processes.append(process)
+
+    def submit(self, update):
+        """A method that sends an update to the worker of its user.
+
+        :param dict update: The update from telegram.
+        """
+        self.queues[get_worker(get_user_id(update), len(self.queues))].put(update)
+
+    def stop(self):
+        """A method that stops the workers after they handle the updates already sent to them."""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join()
+
+
+def make_benchmark_updates(users, actions):
+    """A function that returns the updates of users who start the bot, create a character and press buttons.
+
+    :param int users: The number of users.
+    :param tuple actions: The callback data of the buttons every user presses.
+
+    :returns:
+        list: A list of updates, the updates of all users are interleaved.
+    """
+    now = int(time.time())
+    update_id = 0
+
+    def update(user_id, **kwargs):
+        nonlocal update_id
+        update_id += 1
+        return {"update_id": update_id, **kwargs}
+
+    def message(user_id, text):
+        return update(
+            user_id,
+            message={
+                "message_id": update_id + 1,
+                "date": now,
+                "chat": {"id": user_id, "type": "private", "username": "bench"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+                "text": text,
+                **(
+                    {"entities": [{"type": "bot_command", "offset": 0, "length": 6}]}
+                    if text == "/start"
+                    else {}
+                ),
+            },
+        )
+
+    def press(user_id, data):
+        return update(
+            user_id,
+            callback_query={
+                "id": str(update_id + 1),
+                "from": {"id": user_id, "is_bot": False, "first_name": "bench"},
+                "chat_instance": "bench",
+                "data": data,
+                "message": {
+                    "message_id": 1,
+                    "date": now,
+                    "chat": {"id": user_id, "type": "private", "username": "bench"},
+                    "text": "",
+                    "reply_markup": {"inline_keyboard": []},
+                },
+            },
+        )
+
+    user_ids = range(BENCHMARK_USER_ID, BENCHMARK_USER_ID + users)
+    rounds = [
+        [message(user_id, "/start") for user_id in user_ids],
+        [press(user_id, "create_character") for user_id in user_ids],
+        [message(user_id, f"bench{user_id}") for user_id in user_ids],
+    ]
+    for action in actions:
+        rounds.append([press(user_id, action) for user_id in user_ids])
+    return [update for round in rounds for update in round]
+
+
+def measure(workers, users=BENCHMARK_USERS, actions=BENCHMARK_ACTIONS):
+    """A function that measures how many updates per second a pool of workers handles.
+
+    Every user starts the bot, creates a character and presses the menu buttons, the updates of
+    all users are interleaved. The bot session doesn't send anything, so only the bot's own work is measured.
+
+    :param int workers: The number of worker processes.
+    :param int users: (optional) The number of users. Defaults to BENCHMARK_USERS.
+    :param tuple actions: (optional) The buttons every user presses. Defaults to BENCHMARK_ACTIONS.
+
+    :returns:
+        float: The number of handled updates per second.
+    """
+    updates = make_benchmark_updates(users, actions)
+    context = multiprocessing.get_context("spawn")
+    handled = context.Queue()
+    pool = WorkerPool(workers, handled=handled, null_session=True)
+    pool.start()
+    for _ in range(workers):
+        handled.get()
+    started = time.perf_counter()
+    for update in updates:
+        pool.submit(update)
+    for _ in updates:
+        handled.get()
+    elapsed = time.perf_counter() - started
+    pool.stop()
+    return len(updates) / elapsed
+
+
+def benchmark(workers):
+    """A function that measures a pool of workers on a scratch database in a new process.
+
+    :param int workers: The number of worker processes.
+
+    :returns:
+        float: The number of handled updates per second.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "GAME_DB_PATH": os.path.join(directory, "game.db"),
+            "EVENT_LOG_DIR": os.path.join(directory, "events"),
+            "DB_URL": "",
+            "WORLD_SNAPSHOT_PATH": "",
+        }
+        output = subprocess.run(
+            [sys.executable, "-m", "api.workers", "--measure", str(workers)],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    return float(output.splitlines()[-1])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    counts = [int(arg) for arg in sys.argv[1:] if not arg.startswith("--")]
+    if "--measure" in sys.argv:
+        from db.utils import check_db
+
+        check_db()
+        print(measure(counts[0]))
+        sys.exit(0)
+    print(f"{'workers':<10}{'updates/s':>10}")
+    for workers in counts or [1, 2, 4, 8]:
+        print(f"{workers:<10}{benchmark(workers):>10.0f}")
@@ -10,5 +10,8 @@ router = Router()
 
 
 async def set_commands():
-    commands = [BotCommand(command="start", description="Start you adventure")]
+    commands = [
+        BotCommand(command="start", description="Start you adventure"),
+        BotCommand(command="top", description="Show the top players"),
+    ]
     await bot.set_my_commands(commands, BotCommandScopeDefault())
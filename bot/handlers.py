@@ -1,3 +1,4 @@
+import asyncio
 import html
 import logging
 import re
@@ -10,6 +11,13 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import CallbackQuery, Message
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from config import ADMIN_ID
+from db.backup import backup
+from db.leaderboard import get_leaderboard
+from db.presence import presence
+from db.utils import reload_content
+from db.world import get_world
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 
 import bot.kb as kb
 import bot.msg_text as msg_text
@@ -20,6 +28,7 @@ def check_character(func):
     """
     A decorator that checks if the user has a character and if the callback query is from the same message as the character menu.
     If not, it sends a message that the character is not found and returns.
+    Otherwise it records that the player is active, which restores an archived character.
 
     :param function func: The function to be decorated.
 
@@ -42,12 +51,16 @@ def check_character(func):
             if character is None or callback_query.message.message_id != msg_id:
                 await send_edit_message(callback_query, msg_text.msg_no_character)
             else:
+                await character.touch()
                 return await func(
                     callback_query=callback_query,
                     state=state,
                     character=character,
                     **kwargs,
                 )
+        except PoolTimeoutError:
+            # the write connection is held by a background job, the player can try again
+            await callback_query.answer(msg_text.spec_msg_busy)
         except Exception as e:
             logging.error(str(e))
 
@@ -94,6 +107,44 @@ async def send_edit_message(
             logging.error(str(e))
 
 
+def get_page_cursor(callback_query: CallbackQuery, view: str):
+    """
+    A helper function that returns the cursor of the page of a list that the callback query asks for.
+
+    :param CallbackQuery callback_query: The callback query from the user.
+    :param str view: The callback data of the list.
+
+    :returns:
+        str: The cursor, or an empty string for the first page or a callback query of another button.
+    """
+    prefix = f"{view}:"
+    if callback_query.data.startswith(prefix):
+        return callback_query.data[len(prefix) :]
+    return ""
+
+
+def get_leaderboard_message(character_id: int):
+    """
+    A helper function that returns the text of the leaderboard with the rank of a character.
+
+    :param int character_id: The id of the character, the rank isn't shown if it's not on the leaderboard.
+
+    :returns:
+        str: The text of the leaderboard.
+    """
+    leaderboard = get_leaderboard()
+    top = "\n".join(
+        msg_text.spec_msg_top_player.format(
+            rank=rank, name=html.escape(name), level=level
+        )
+        for rank, _, name, level in leaderboard.get_top()
+    )
+    rank = leaderboard.get_rank(character_id)
+    if rank:
+        top += msg_text.spec_msg_your_rank.format(rank=rank, total=len(leaderboard))
+    return msg_text.format_string(f"{msg_text.spec_msg_top}{top}")
+
+
 @router.message(Command("start"))
 async def start_command(message: Message, state: FSMContext, bot: Bot):
     """
@@ -113,6 +164,7 @@ async def start_command(message: Message, state: FSMContext, bot: Bot):
             logging.error(str(e))
     existing_character = await db.get_character(message.from_user.id)
     if existing_character:
+        await existing_character.touch()
         await state.update_data(character=existing_character)
         msg = await message.answer(
             msg_text.msg_welcome.format(name=existing_character.name),
@@ -125,6 +177,68 @@ async def start_command(message: Message, state: FSMContext, bot: Bot):
         )
 
 
+@router.message(Command("top"))
+async def top_command(message: Message):
+    """
+    A handler function that handles the /top command from the user.
+    It answers with the characters with the highest levels and the rank of the user's character.
+
+    :param Message message: The message from the user.
+    """
+    await message.answer(get_leaderboard_message(message.from_user.id))
+
+
+@router.message(Command("reload"))
+async def reload_command(message: Message):
+    """
+    A handler function that handles the /reload command from the admin.
+    It reloads the world content from the json files without restarting the bot.
+
+    :param Message message: The message from the user.
+    """
+    if not ADMIN_ID or str(message.from_user.id) != ADMIN_ID:
+        return
+    try:
+        world = await reload_content()
+        await message.answer(msg_text.msg_reload_succ.format(version=world.version))
+    except Exception as e:
+        logging.error(str(e))
+        # a validation error lists every broken reference, so it's cut to fit in a message
+        await message.answer(
+            msg_text.msg_reload_fail.format(error=html.escape(str(e)[:3000]))
+        )
+
+
+@router.message(Command("backup"))
+async def backup_command(message: Message):
+    """
+    A handler function that handles the /backup command from the admin.
+    It backs up the database in a background thread and reports the result.
+
+    :param Message message: The message from the user.
+    """
+    if not ADMIN_ID or str(message.from_user.id) != ADMIN_ID:
+        return
+    await message.answer(msg_text.msg_backup_started)
+    try:
+        report = await asyncio.to_thread(backup)
+        await message.answer(
+            msg_text.msg_backup_succ.format(
+                path=html.escape(report["path"]),
+                size=report["size"] // 1024,
+                duration=report["duration"],
+                integrity=report["integrity"],
+                count=report["writes_during"]["count"],
+                p99=report["writes_during"]["p99"],
+                p99_before=report["writes_before"]["p99"],
+                max=report["writes_during"]["max"],
+            )
+        )
+    except Exception as e:
+        logging.error(str(e))
+        await message.answer(msg_text.msg_backup_fail.format(error=html.escape(str(e))))
+
+
 @router.callback_query(F.data == "main_menu")
 async def main_menu(callback_query: CallbackQuery):
     """
@@ -177,18 +291,26 @@ async def get_location(
 ):
     """
     A handler function that handles the callback query for the get location button.
-    It edits the message with the current location of the character.
+    It edits the message with the current location of the character and the other players recently active there.
 
     :param CallbackQuery callback_query: The callback query from the user.
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    location = await character.whereami()
-    await send_edit_message(
-        callback_query,
-        msg_text.msg_current_location.format(location=location.name),
-        reply_markup=kb.main_menu,
-    )
+    location = get_world().get_location(character.location_id)
+    names, count = presence.get_nearby(character.location_id, character.id)
+    if names:
+        players = ", ".join(html.escape(name) for name in names)
+        if count > len(names):
+            players = msg_text.spec_msg_more_players.format(
+                players=players, count=count - len(names)
+            )
+        msg = msg_text.msg_current_location_players.format(
+            location=location.name, players=players
+        )
+    else:
+        msg = msg_text.msg_current_location.format(location=location.name)
+    await send_edit_message(callback_query, msg, reply_markup=kb.main_menu)
 
 
 @router.callback_query(F.data == "get_stats")
@@ -209,6 +331,24 @@ async def get_stats(callback_query: CallbackQuery, character: db.Protagonist, **
     )
 
 
+@router.callback_query(F.data == "get_top")
+@check_character
+async def get_top(callback_query: CallbackQuery, character: db.Protagonist, **kwargs):
+    """
+    A handler function that handles the callback query for the top button.
+    It edits the message with the characters with the highest levels and the rank of the character.
+
+    :param CallbackQuery callback_query: The callback query from the user.
+    :param db.Protagonist character: The character object for the user.
+    :param \*\*kwargs: Additional keyword arguments.
+    """
+    await send_edit_message(
+        callback_query,
+        get_leaderboard_message(character.id),
+        reply_markup=kb.main_menu,
+    )
+
+
 @router.callback_query(F.data == "get_inventory")
 @check_character
 async def get_inventory(
@@ -235,24 +375,33 @@ async def get_inventory(
     )
 
 
-@router.callback_query(F.data == "get_usable_items")
+@router.callback_query(
+    (F.data == "get_usable_items") | F.data.startswith("get_usable_items:")
+)
 @check_character
 async def get_usable_items(
     callback_query: CallbackQuery,
     character: db.Protagonist,
     effect: str = None,
+    cursor: str = None,
     **kwargs,
 ):
     """
-    A handler function that handles the callback query for the get usable items button.
-    It edits the message with the current usable items of the character and the effect of using an item, if any.
+    A handler function that handles the callback query for the get usable items button and its pages.
+    It edits the message with a page of the current usable items of the character and the effect of using an item, if any.
+    The cursor of a page is the item id it starts after, prefixed with ">", or ends before, prefixed with "<".
 
     :param CallbackQuery callback_query: The callback query from the user.
     :param db.Protagonist character: The character object for the user.
     :param str effect: (optional) The effect of using an item. Defaults to None.
+    :param str cursor: (optional) The cursor of the page. Defaults to None, which takes it from the callback query.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    usable_items = await character.get_usable_inventory()
+    if cursor is None:
+        cursor = get_page_cursor(callback_query, "get_usable_items")
+    usable_items, before, after = await character.get_usable_inventory_page(
+        int(cursor.lstrip("<>") or 0), cursor.startswith("<")
+    )
     if not usable_items:
         if effect:
             msg = effect
@@ -262,14 +411,22 @@ async def get_usable_items(
             reply_markup = kb.main_menu
     else:
         msg = effect if effect else msg_text.msg_choose_item_to_use
-        builder = InlineKeyboardBuilder()
-        for idx, item in enumerate(usable_items):
-            builder.button(
-                text=f"{item.item.name} ({item.count})", callback_data=f"use_item:{idx}"
-            )
-        builder.add(kb.back_to_menu_btn)
-        builder.adjust(1)
-        reply_markup = builder.as_markup()
+        # using an item shows the page again from its first item
+        page = f">{usable_items[0].item_id - 1}"
+        reply_markup = kb.build_page_menu(
+            [
+                [
+                    types.InlineKeyboardButton(
+                        text=f"{item.item.name} ({item.count})",
+                        callback_data=f"use_item:{item.item_id}:{page}",
+                    )
+                ]
+                for item in usable_items
+            ],
+            "get_usable_items",
+            f"<{usable_items[0].item_id}" if before else None,
+            f">{usable_items[-1].item_id}" if after else None,
+        )
     await send_edit_message(callback_query, msg, reply_markup=reply_markup)
 
 
@@ -284,42 +441,37 @@ async def use_item(callback_query: CallbackQuery, character: db.Protagonist, **k
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, item_idx = callback_query.data.split(":")
-    effect = msg_text.format_string(
-        await character.use_item(character.inventory_usable[int(item_idx)])
-    )
+    _, item_id, *page = callback_query.data.split(":")
+    effect = msg_text.format_string(await character.use_item(int(item_id)))
     await get_usable_items(
-        callback_query=callback_query, character=character, effect=effect, **kwargs
+        callback_query=callback_query,
+        character=character,
+        effect=effect,
+        cursor=page[0] if page else "",
+        **kwargs,
     )
 
 
-@router.callback_query(F.data == "change_location")
+@router.callback_query(
+    (F.data == "change_location") | F.data.startswith("change_location:")
+)
 @check_character
 async def change_location(
     callback_query: CallbackQuery, character: db.Protagonist, **kwargs
 ):
     """
-    A handler function that handles the callback query for the change location button.
-    It edits the message with the available directions for the character to move.
+    A handler function that handles the callback query for the change location button and its pages.
+    It edits the message with a page of the available directions for the character to move.
 
     :param CallbackQuery callback_query: The callback query from the user.
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    location = await character.whereami()
-    directions = await location.get_directions()
-    builder = InlineKeyboardBuilder()
-    for direction in directions:
-        builder.button(
-            text=direction.name, callback_data=f"set_location:{direction.id}"
-        )
-    builder.add(kb.back_to_menu_btn)
-    builder.adjust(2)
-
+    offset = int(get_page_cursor(callback_query, "change_location") or 0)
     await send_edit_message(
         callback_query,
         msg_text.msg_change_location_ask,
-        reply_markup=builder.as_markup(),
+        reply_markup=kb.get_directions_menu(get_world(), character.location_id, offset),
     )
 
 
@@ -337,8 +489,8 @@ async def set_location(
     :param \*\*kwargs: Additional keyword arguments.
     """
     _, location_id = callback_query.data.split(":")
-    await character.go(location_id)
-    location = await character.whereami()
+    await character.go(int(location_id))
+    location = get_world().get_location(character.location_id)
     await send_edit_message(
         callback_query,
         msg_text.msg_change_location_succ.format(
@@ -348,29 +500,28 @@ async def set_location(
     )
 
 
-@router.callback_query(F.data == "get_npcs")
+@router.callback_query((F.data == "get_npcs") | F.data.startswith("get_npcs:"))
 @check_character
 async def get_npcs(callback_query: CallbackQuery, character: db.Protagonist, **kwargs):
     """
-    A handler function that handles the callback query for the get npcs button.
-    It edits the message with the npcs in the current location of the character and the options to interact with them.
+    A handler function that handles the callback query for the get npcs button and its pages.
+    It edits the message with a page of the npcs in the current location of the character, marked if they have a quest for the character, and the options to interact with them.
 
     :param CallbackQuery callback_query: The callback query from the user.
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    location = await character.whereami()
-    npcs = await location.get_npcs()
-
-    if npcs:
-        builder = InlineKeyboardBuilder()
-        for idx, npc in enumerate(npcs):
-            builder.button(text=npc.name, callback_data=f"interact_with_npc:{idx}")
-        builder.add(kb.back_to_menu_btn)
-        builder.adjust(1)
+    offset = int(get_page_cursor(callback_query, "get_npcs") or 0)
+    npcs_menu = kb.get_npcs_menu(
+        get_world(),
+        character.location_id,
+        offset,
+        await character.get_quest_states(),
+    )
 
+    if npcs_menu:
         await send_edit_message(
-            callback_query, msg_text.msg_pick_npc, reply_markup=builder.as_markup()
+            callback_query, msg_text.msg_pick_npc, reply_markup=npcs_menu
         )
     else:
         await send_edit_message(
@@ -389,10 +540,10 @@ async def interact_with_npc(callback_query: CallbackQuery, msg: str = None, **kw
     :param str msg: (optional) The message to be sent. Defaults to None.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, npc_idx = callback_query.data.split(":")
+    _, npc_id = callback_query.data.split(":")
     builder = InlineKeyboardBuilder()
-    builder.button(text=msg_text.btn_dialog, callback_data=f"npc_dialog:{npc_idx}:1")
-    builder.button(text=msg_text.btn_quest, callback_data=f"npc_quest:{npc_idx}")
+    builder.button(text=msg_text.btn_dialog, callback_data=f"npc_dialog:{npc_id}:1")
+    builder.button(text=msg_text.btn_quest, callback_data=f"npc_quest:{npc_id}")
     builder.button(text=msg_text.btn_back, callback_data="get_npcs")
     builder.button(text=msg_text.btn_menu, callback_data="main_menu")
     builder.adjust(2)
@@ -420,12 +571,20 @@ async def npc_dialog(
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, npc_idx, stage_id = callback_query.data.split(":")
+    _, npc_id, stage_id = callback_query.data.split(":")
     stage_id = int(stage_id)
     if stage_id == 1:
-        location = await character.whereami()
-        npc = location.npcs[int(npc_idx)]
-        dialogs = character.talk_to(npc)
+        world = get_world()
+        npc = world.get_npc(character.location_id, npc_id)
+        if not npc:
+            await get_npcs(
+                callback_query=callback_query,
+                state=state,
+                character=character,
+                **kwargs,
+            )
+            return
+        dialogs = character.talk_to(npc, world)
         dialog = next(dialogs)
     else:
         data = await state.get_data()
@@ -438,11 +597,11 @@ async def npc_dialog(
         if response.next_stage_id:
             builder.button(
                 text=response.text,
-                callback_data=f"npc_dialog:{npc_idx}:{response.next_stage_id}",
+                callback_data=f"npc_dialog:{npc_id}:{response.next_stage_id}",
             )
         else:
             builder.button(
-                text=response.text, callback_data=f"interact_with_npc:{npc_idx}"
+                text=response.text, callback_data=f"interact_with_npc:{npc_id}"
             )
     builder.adjust(1)
 
@@ -464,11 +623,14 @@ async def npc_quest(callback_query: CallbackQuery, character: db.Protagonist, **
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, npc_idx = callback_query.data.split(":")
-    location = await character.whereami()
-    npc = location.npcs[int(npc_idx)]
-    quest, journal_entry = await character.get_npc_quest(npc)
-    if not quest or (journal_entry and journal_entry.completed):
+    _, npc_id = callback_query.data.split(":")
+    npc = get_world().get_npc(character.location_id, npc_id)
+    if not npc:
+        await get_npcs(callback_query=callback_query, character=character, **kwargs)
+        return
+    quest = get_world().quests.get(npc.id)
+    completed = (await character.get_journal()).get(npc.id) if quest else None
+    if not quest or completed:
         await send_edit_message(
             callback_query,
             msg_text.msg_npc_no_quest,
@@ -476,10 +638,10 @@ async def npc_quest(callback_query: CallbackQuery, character: db.Protagonist, **
         )
     else:
         builder = InlineKeyboardBuilder()
-        if journal_entry:
+        if completed is not None:
             builder.button(
                 text=msg_text.btn_complete_quest,
-                callback_data=f"npc_quest_complete:{npc_idx}",
+                callback_data=f"npc_quest_complete:{npc_id}",
             )
         elif quest.required_level > character.level:
             builder.button(
@@ -490,10 +652,10 @@ async def npc_quest(callback_query: CallbackQuery, character: db.Protagonist, **
             )
         else:
             builder.button(
-                text=msg_text.btn_accept, callback_data=f"npc_quest_accept:{npc_idx}"
+                text=msg_text.btn_accept, callback_data=f"npc_quest_accept:{npc_id}"
             )
         builder.button(
-            text=msg_text.btn_back, callback_data=f"interact_with_npc:{npc_idx}"
+            text=msg_text.btn_back, callback_data=f"interact_with_npc:{npc_id}"
         )
         await send_edit_message(
             callback_query,
@@ -515,9 +677,11 @@ async def npc_quest_accept(
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, npc_idx = callback_query.data.split(":")
-    location = await character.whereami()
-    npc = location.npcs[int(npc_idx)]
+    _, npc_id = callback_query.data.split(":")
+    npc = get_world().get_npc(character.location_id, npc_id)
+    if not npc:
+        await get_npcs(callback_query=callback_query, character=character, **kwargs)
+        return
     await character.accept_npc_quest(npc)
     await interact_with_npc(
         callback_query=callback_query, character=character, **kwargs
@@ -537,9 +701,11 @@ async def npc_quest_complete(
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, npc_idx = callback_query.data.split(":")
-    location = await character.whereami()
-    npc = location.npcs[int(npc_idx)]
+    _, npc_id = callback_query.data.split(":")
+    npc = get_world().get_npc(character.location_id, npc_id)
+    if not npc:
+        await get_npcs(callback_query=callback_query, character=character, **kwargs)
+        return
     if await character.complete_npc_quest(npc):
         msg = msg_text.msg_quest_complete_succ
     else:
@@ -575,39 +741,100 @@ async def get_quests(
             ]
         )
         msg = msg_text.format_string(f"{msg_text.spec_msg_current_quests}{quests_msg}")
+        builder = InlineKeyboardBuilder()
+        destinations = {
+            quest["location_id"]: quest["location"]
+            for quest in quests
+            if quest["location_id"] != character.location_id
+        }
+        for location_id, location in destinations.items():
+            builder.button(
+                text=msg_text.btn_travel.format(location=location),
+                callback_data=f"travel:{location_id}",
+            )
+        builder.add(kb.back_to_menu_btn)
+        builder.adjust(1)
+        reply_markup = builder.as_markup()
     else:
         msg = msg_text.msg_no_quests
-    await send_edit_message(callback_query, msg, reply_markup=kb.main_menu)
+        reply_markup = kb.main_menu
+    await send_edit_message(callback_query, msg, reply_markup=reply_markup)
 
 
-@router.callback_query(F.data == "get_enemies")
+@router.callback_query(F.data.startswith("travel:"))
+@check_character
+async def travel(callback_query: CallbackQuery, character: db.Protagonist, **kwargs):
+    """
+    A handler function that handles the callback query for traveling to a location.
+    It moves the character along the shortest path in one step and edits the message with the path taken.
+
+    :param CallbackQuery callback_query: The callback query from the user.
+    :param db.Protagonist character: The character object for the user.
+    :param \*\*kwargs: Additional keyword arguments.
+    """
+    _, location_id = callback_query.data.split(":")
+    world = get_world()
+    path = world.get_path(character.location_id, location_id)
+    if path is None:
+        location = world.get_location(location_id)
+        await send_edit_message(
+            callback_query,
+            msg_text.msg_travel_no_path.format(
+                location=location.name if location else location_id
+            ),
+            reply_markup=kb.main_menu,
+        )
+        return
+    if not path:
+        location = world.get_location(character.location_id)
+        await send_edit_message(
+            callback_query,
+            msg_text.msg_change_location_succ.format(
+                location=location.name, desc=location.description
+            ),
+            reply_markup=kb.main_menu,
+        )
+        return
+    await character.go(path[-1].id)
+    await send_edit_message(
+        callback_query,
+        msg_text.msg_travel_succ.format(
+            path=" → ".join(location.name for location in path),
+            desc=path[-1].description,
+        ),
+        reply_markup=kb.main_menu,
+    )
+
+
+@router.callback_query((F.data == "get_enemies") | F.data.startswith("get_enemies:"))
 @check_character
 async def get_enemies(
-    callback_query: CallbackQuery, character: db.Protagonist, msg: str = None, **kwargs
+    callback_query: CallbackQuery,
+    character: db.Protagonist,
+    msg: str = None,
+    offset: int = None,
+    **kwargs,
 ):
     """
-    A handler function that handles the callback query for the get enemies button.
-    It edits the message with the enemies in the current location of the character and the option to fight them.
+    A handler function that handles the callback query for the get enemies button and its pages.
+    It edits the message with a page of the enemies in the current location of the character, the chances to beat them and the option to fight them.
 
     :param CallbackQuery callback_query: The callback query from the user.
     :param db.Protagonist character: The character object for the user.
     :param str msg: (optional) The message to be sent. Defaults to None.
+    :param int offset: (optional) The offset of the first enemy of the page. Defaults to None, which takes it from the callback query.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    location = await character.whereami()
-    enemies = await location.get_enemies()
-    if enemies:
-        builder = InlineKeyboardBuilder()
-        for idx, enemy in enumerate(enemies):
-            builder.button(
-                text=f"{enemy.name} (lvl {enemy.level})", callback_data=f"fight:{idx}"
-            )
-        builder.add(kb.back_to_menu_btn)
-        builder.adjust(1)
+    if offset is None:
+        offset = int(get_page_cursor(callback_query, "get_enemies") or 0)
+    enemies_menu = kb.get_enemies_menu(
+        get_world(), character.location_id, character.level, offset
+    )
+    if enemies_menu:
         await send_edit_message(
             callback_query,
             msg if msg else msg_text.msg_pick_enemy,
-            reply_markup=builder.as_markup(),
+            reply_markup=enemies_menu,
         )
     else:
         await send_edit_message(
@@ -633,9 +860,18 @@ async def fight(
     :param db.Protagonist character: The character object for the user.
     :param \*\*kwargs: Additional keyword arguments.
     """
-    _, enemy_idx = callback_query.data.split(":")
-    location = await character.whereami()
-    enemy = location.enemies[int(enemy_idx)]
+    _, enemy_id, *page = callback_query.data.split(":")
+    offset = int(page[0]) if page else 0
+    enemy = get_world().get_enemy(character.location_id, enemy_id)
+    if not enemy:
+        await get_enemies(
+            callback_query=callback_query,
+            state=state,
+            character=character,
+            offset=offset,
+            **kwargs,
+        )
+        return
     try:
         res, loot = await character.attack(enemy)
     except Exception as e:
@@ -662,5 +898,76 @@ async def fight(
         state=state,
         character=character,
         msg=f"{result_text}\n{msg_text.msg_pick_enemy}",
+        offset=offset,
+        **kwargs,
+    )
+
+
+@router.callback_query(F.data.startswith("auto_fight:"))
+@check_character
+async def auto_fight(
+    callback_query: CallbackQuery,
+    state: FSMContext,
+    character: db.Protagonist,
+    **kwargs,
+):
+    """
+    A handler function that handles the callback query for fighting an enemy automatically.
+    It fights up to AUTO_FIGHT_ROUNDS rounds in one transaction and edits the message with the summary.
+
+    :param CallbackQuery callback_query: The callback query from the user.
+    :param db.Protagonist character: The character object for the user.
+    :param \*\*kwargs: Additional keyword arguments.
+    """
+    _, enemy_id, *page = callback_query.data.split(":")
+    offset = int(page[0]) if page else 0
+    enemy = get_world().get_enemy(character.location_id, enemy_id)
+    if not enemy:
+        await get_enemies(
+            callback_query=callback_query,
+            state=state,
+            character=character,
+            offset=offset,
+            **kwargs,
+        )
+        return
+    hp = character.hp
+    try:
+        rounds, res, loot = await character.auto_attack(enemy)
+    except Exception as e:
+        if str(e) == "You died":
+            msg = msg_text.msg_fight_die.format(enemy=enemy.name)
+            await character.die()
+            await state.update_data(character=None)
+            await send_edit_message(callback_query, msg)
+            return
+        raise
+
+    if not rounds:
+        result_text = msg_text.msg_auto_fight_low_hp
+    else:
+        if res and enemy.loot_id:
+            result_text = msg_text.msg_fight_succ.format(
+                enemy=enemy.name, level=character.level, loot=loot.name
+            )
+        elif res:
+            result_text = msg_text.msg_fight_succ_no_loot.format(
+                enemy=enemy.name, level=character.level
+            )
+        else:
+            result_text = msg_text.msg_auto_fight_stopped.format(
+                enemy=enemy.name, lost=hp - character.hp, hp=character.hp
+            )
+        result_text = (
+            msg_text.spec_msg_auto_fight_rounds.format(enemy=enemy.name, rounds=rounds)
+            + result_text
+        )
+
+    await get_enemies(
+        callback_query=callback_query,
+        state=state,
+        character=character,
+        msg=f"{result_text}\n{msg_text.msg_pick_enemy}",
+        offset=offset,
         **kwargs,
     )
@@ -1,4 +1,10 @@
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from config import PAGE_SIZE
+from db.combat import MAX_DIFFERENCE, MIN_DIFFERENCE, get_win_chance
+from db.db import QuestState
+from db.world import register_cache_builder
+
+import bot.msg_text as msg_text
 
 back_to_menu_btn = InlineKeyboardButton(text="🔙 Back", callback_data="main_menu")
 """A button that takes the user back to the main menu.
@@ -43,6 +49,7 @@ main_menu_buttons = [
         InlineKeyboardButton(text="🏆 Stats", callback_data="get_stats"),
         InlineKeyboardButton(text="📜 Quests", callback_data="get_quests"),
     ],
+    [InlineKeyboardButton(text="🏅 Top", callback_data="get_top")],
 ]
 """A list of lists of buttons that allows the user to access various features of the game.
 
@@ -54,3 +61,210 @@ main_menu = InlineKeyboardMarkup(inline_keyboard=main_menu_buttons)
 
     :meta hide-value:
 """
+
+
+npc_quest_buttons = {
+    QuestState.AVAILABLE: msg_text.btn_npc_quest_available,
+    QuestState.ACTIVE: msg_text.btn_npc_quest_active,
+    QuestState.COMPLETABLE: msg_text.btn_npc_quest_completable,
+}
+"""A dictionary of the texts of the NPC buttons by the state of the NPC's quest.
+
+    :meta hide-value:
+"""
+
+
+def build_page_menu(rows, view, previous_cursor=None, next_cursor=None, back=True):
+    """A function that builds the keyboard of a page of a list with the buttons to the pages around it.
+
+    :param list rows: The rows of buttons of the page.
+    :param str view: The callback data of the list, the cursor of a page is added to it after a colon.
+    :param str previous_cursor: (optional) The cursor of the previous page. Defaults to None, which means there is no previous page.
+    :param str next_cursor: (optional) The cursor of the next page. Defaults to None, which means there is no next page.
+    :param bool back: (optional) Whether to add the back to menu button. Defaults to True.
+
+    :returns:
+        InlineKeyboardMarkup: The keyboard.
+    """
+    navigation = []
+    if previous_cursor is not None:
+        navigation.append(
+            InlineKeyboardButton(
+                text=msg_text.btn_previous_page,
+                callback_data=f"{view}:{previous_cursor}",
+            )
+        )
+    if next_cursor is not None:
+        navigation.append(
+            InlineKeyboardButton(
+                text=msg_text.btn_next_page, callback_data=f"{view}:{next_cursor}"
+            )
+        )
+    rows = list(rows)
+    if navigation:
+        rows.append(navigation)
+    if back:
+        rows.append([back_to_menu_btn])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _get_page_cursors(offset, count):
+    # the cursors of the pages of a list in the world snapshot are the offsets of their first entries
+    previous_cursor = max(offset - PAGE_SIZE, 0) if offset else None
+    next_cursor = offset + PAGE_SIZE if offset + PAGE_SIZE < count else None
+    return previous_cursor, next_cursor
+
+
+def build_world_menus(world):
+    """A function that prebuilds the keyboards that only depend on the world content.
+
+    It's called for every new world snapshot, so the keyboards are never built on the request path.
+    The markups are made directly instead of with InlineKeyboardBuilder, which copies every button,
+    so the keyboards of tens of thousands of locations take seconds rather than minutes.
+    Every keyboard holds a page of PAGE_SIZE entries and is stored by the location and its offset.
+
+    :param World world: The world snapshot to build the keyboards for.
+    """
+    directions_menus, npcs_menus = {}, {}
+    for location_id in world.locations:
+        directions = world.get_directions(location_id)
+        for offset in range(0, max(len(directions), 1), PAGE_SIZE):
+            buttons = [
+                InlineKeyboardButton(
+                    text=direction.name, callback_data=f"set_location:{direction.id}"
+                )
+                for direction in directions[offset : offset + PAGE_SIZE]
+            ]
+            buttons.append(back_to_menu_btn)
+            previous_cursor, next_cursor = _get_page_cursors(offset, len(directions))
+            directions_menus[location_id, offset] = build_page_menu(
+                [buttons[i : i + 2] for i in range(0, len(buttons), 2)],
+                "change_location",
+                previous_cursor,
+                next_cursor,
+                back=False,
+            )
+
+        npcs = world.get_npcs(location_id)
+        for offset in range(0, len(npcs), PAGE_SIZE):
+            npcs_menus[location_id, offset] = _build_npcs_menu(npcs, offset)
+
+    world.cache["directions_menus"] = directions_menus
+    world.cache["npcs_menus"] = npcs_menus
+    world.cache["enemies_menus"] = {}
+
+
+def get_directions_menu(world, location_id, offset=0):
+    """A function that returns a page of the keyboard of the directions from a location.
+
+    :param World world: The world snapshot.
+    :param int location_id: The id of the location.
+    :param int offset: (optional) The offset of the first direction of the page. Defaults to 0.
+
+    :returns:
+        InlineKeyboardMarkup: The keyboard, the first page if there is no page at the offset.
+    """
+    menus = world.cache["directions_menus"]
+    return menus.get((location_id, offset)) or menus.get((location_id, 0), back_menu)
+
+
+def _build_npcs_menu(npcs, offset, quest_states=None):
+    previous_cursor, next_cursor = _get_page_cursors(offset, len(npcs))
+    return build_page_menu(
+        [
+            [
+                InlineKeyboardButton(
+                    text=(
+                        npc_quest_buttons[quest_states[npc.id]].format(npc=npc.name)
+                        if quest_states and npc.id in quest_states
+                        else npc.name
+                    ),
+                    callback_data=f"interact_with_npc:{npc.id}",
+                )
+            ]
+            for npc in npcs[offset : offset + PAGE_SIZE]
+        ],
+        "get_npcs",
+        previous_cursor,
+        next_cursor,
+    )
+
+
+def get_npcs_menu(world, location_id, offset=0, quest_states=None):
+    """A function that returns a page of the keyboard of the NPCs in a location.
+
+    The pages without quests for the character are prebuilt, a page with quest marks is built
+    from the page of the NPCs only.
+
+    :param World world: The world snapshot.
+    :param int location_id: The id of the location.
+    :param int offset: (optional) The offset of the first NPC of the page. Defaults to 0.
+    :param dict quest_states: (optional) The QuestState of the quests by NPC id, as returned by Protagonist.get_quest_states. Defaults to None.
+
+    :returns:
+        InlineKeyboardMarkup: The keyboard, the first page if there is no page at the offset,
+        or None if there are no NPCs in the location.
+    """
+    menus = world.cache["npcs_menus"]
+    if (location_id, offset) not in menus:
+        offset = 0
+    menu = menus.get((location_id, offset))
+    if menu is None or not quest_states:
+        return menu
+    npcs = world.get_npcs(location_id)
+    if not any(npc.id in quest_states for npc in npcs[offset : offset + PAGE_SIZE]):
+        return menu
+    return _build_npcs_menu(npcs, offset, quest_states)
+
+
+def get_enemies_menu(world, location_id, level, offset=0):
+    """A function that returns a page of the keyboard of the enemies in a location with the win odds for a level.
+
+    The odds depend on the character's level, but stop changing once every enemy is either unbeatable
+    or always beaten, so there are only a few keyboards per page. Every one is built the first time
+    it's shown and kept in the world snapshot. The fight buttons keep the offset of the page to come back to it.
+
+    :param World world: The world snapshot.
+    :param int location_id: The id of the location.
+    :param int level: The level of the character.
+    :param int offset: (optional) The offset of the first enemy of the page. Defaults to 0.
+
+    :returns:
+        InlineKeyboardMarkup: The keyboard, the first page if there is no page at the offset,
+        or None if there are no enemies in the location.
+    """
+    enemies = world.get_enemies(location_id)
+    if not enemies:
+        return None
+    if not 0 <= offset < len(enemies) or offset % PAGE_SIZE:
+        offset = 0
+    lowest = max(min(enemy.level for enemy in enemies) + MIN_DIFFERENCE, 1)
+    highest = max(max(enemy.level for enemy in enemies) + MAX_DIFFERENCE, lowest)
+    key = (location_id, min(max(level, lowest), highest), offset)
+    menus = world.cache["enemies_menus"]
+    menu = menus.get(key)
+    if menu is None:
+        previous_cursor, next_cursor = _get_page_cursors(offset, len(enemies))
+        menu = menus[key] = build_page_menu(
+            [
+                [
+                    InlineKeyboardButton(
+                        text=f"{enemy.name} (lvl {enemy.level}, "
+                        f"{get_win_chance(key[1], enemy.level):.0%} win)",
+                        callback_data=f"fight:{enemy.id}:{offset}",
+                    ),
+                    InlineKeyboardButton(
+                        text=msg_text.btn_auto_fight,
+                        callback_data=f"auto_fight:{enemy.id}:{offset}",
+                    ),
+                ]
+                for enemy in enemies[offset : offset + PAGE_SIZE]
+            ],
+            "get_enemies",
+            previous_cursor,
+            next_cursor,
+        )
+    return menu
+
+
+register_cache_builder(build_world_menus)
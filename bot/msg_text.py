@@ -10,37 +10,66 @@ SPEC_MSG_END = "&#x200D;"
     :meta hide-value:
 """
 
-msg_welcome_new = "Welcome! Please, create a character to start playing."
+
+def format_string(input_string, line_length=MAX_LINE_WIDTH):
+    """A function that formats a string to fit a given line width and adds a special character at the end.
+
+    :param str input_string: The string to format.
+    :param int line_length: (optional) The maximum line width. Defaults to MAX_LINE_WIDTH.
+
+    :returns:
+        str: The formatted string with the special character at the end.
+    """
+    return f"{input_string:<{line_length}}" + SPEC_MSG_END
+
+
+msg_welcome_new = format_string("Welcome! Please, create a character to start playing.")
 """A message that welcomes a new user and prompts them to create a character.
 
     :meta hide-value:
 """
 
-msg_welcome = "Welcome, {name}!"
+msg_welcome = format_string("Welcome, {name}!")
 """A message that welcomes an existing user by their name.
 
     :meta hide-value:
 """
 
-msg_enter_name = "Enter your character name (only english letters and numbers):"
+msg_enter_name = format_string(
+    "Enter your character name (only english letters and numbers):"
+)
 """A message that asks the user to enter their character name.
 
     :meta hide-value:
 """
 
-msg_create_succ = "Character created."
+msg_create_succ = format_string("Character created.")
 """A message that confirms the successful creation of a character.
 
     :meta hide-value:
 """
 
-msg_current_location = "Current location: {location}."
+msg_current_location = format_string("Current location: {location}.")
 """A message that displays the current location of the character.
 
     :meta hide-value:
 """
 
-msg_stats = "Current level: {level}.\nCurrent health: {health}."
+msg_current_location_players = format_string(
+    "Current location: {location}.\nAlso here: {players}."
+)
+"""A message that displays the current location of the character and the other players recently active there.
+
+    :meta hide-value:
+"""
+
+spec_msg_more_players = "{players} and {count} more"
+"""A message that lists some of the players in a location and the number of the others.
+
+    :meta hide-value:
+"""
+
+msg_stats = format_string("Current level: {level}.\nCurrent health: {health}.")
 """A message that displays the current level and health of the character.
 
     :meta hide-value:
@@ -52,79 +81,85 @@ spec_msg_current_inventory = "Current inventory:\n"
     :meta hide-value:
 """
 
-msg_choose_item_to_use = "Choose an item to use:"
+msg_choose_item_to_use = format_string("Choose an item to use:")
 """A message that prompts the user to choose an item to use from their inventory.
 
     :meta hide-value:
 """
 
-msg_no_usable_items = "No usable items available."
+msg_no_usable_items = format_string("No usable items available.")
 """A message that informs the user that they have no usable items in their inventory.
 
     :meta hide-value:
 """
 
-msg_change_location_ask = "Where do you want to go?"
+msg_change_location_ask = format_string("Where do you want to go?")
 """A message that asks the user where they want to go.
 
     :meta hide-value:
 """
 
-msg_change_location_succ = "You've moved to {location}.\nDescription: {desc}"
+msg_change_location_succ = format_string(
+    "You've moved to {location}.\nDescription: {desc}"
+)
 """A message that confirms the successful change of location and displays the description of the new location.
 
     :meta hide-value:
 """
 
-msg_pick_npc = "Which NPC do you want to interact with?"
+msg_pick_npc = format_string("Which NPC do you want to interact with?")
 """A message that prompts the user to choose an NPC to interact with.
 
     :meta hide-value:
 """
 
-msg_leave_npc = "You left."
+msg_leave_npc = format_string("You left.")
 """A message that confirms the user has left the interaction with the NPC.
 
     :meta hide-value:
 """
 
-msg_no_npcs_in_location = "There are no NPCs in this location."
+msg_no_npcs_in_location = format_string("There are no NPCs in this location.")
 """A message that informs the user that there are no NPCs in their current location.
 
     :meta hide-value:
 """
 
-msg_pick_enemy = "Which enemy do you want to fight:"
+msg_pick_enemy = format_string("Which enemy do you want to fight:")
 """A message that prompts the user to choose an enemy to fight.
 
     :meta hide-value:
 """
 
-msg_no_enemies_in_location = "There are no enemies in this location."
+msg_no_enemies_in_location = format_string("There are no enemies in this location.")
 """A message that informs the user that there are no enemies in their current location.
 
     :meta hide-value:
 """
 
-msg_choose_action = "Choose an action:"
+msg_choose_action = format_string("Choose an action:")
 """A message that prompts the user to choose an action to perform.
 
     :meta hide-value:
 """
 
-msg_fight_succ = "You've defeated the {enemy}!\nYour level is increased by 1.\nCurrent level is {level}.\nYou've looted 1 {loot}."
+msg_fight_succ = format_string(
+    "You've defeated the {enemy}!\nYour level is increased by 1.\nCurrent level is {level}.\nYou've looted 1 {loot}."
+)
 """A message that displays the result of a successful fight, the level increase, and the loot obtained.
 
     :meta hide-value:
 """
 
-msg_fight_succ_no_loot = "You've defeated the {enemy}!\nYour level is increased by 1.\nCurrent level is {level}."
+msg_fight_succ_no_loot = format_string(
+    "You've defeated the {enemy}!\nYour level is increased by 1.\nCurrent level is {level}."
+)
 """A message that displays the result of a successful fight and the level increase, but no loot obtained.
 
     :meta hide-value:
 """
 
-msg_fight_fail = (
+msg_fight_fail = format_string(
     "{enemy} has defeated you.\nYour health is reduced by 1.\nCurrent health is {hp}."
 )
 """A message that displays the result of a failed fight and the health decrease.
@@ -132,7 +167,7 @@ msg_fight_fail = (
     :meta hide-value:
 """
 
-msg_fight_die = (
+msg_fight_die = format_string(
     "{enemy} has defeated you. You've died.\nType /start to create a new character."
 )
 """A message that displays the result of a fatal fight and prompts the user to create a new character.
@@ -140,13 +175,47 @@ msg_fight_die = (
     :meta hide-value:
 """
 
-msg_npc_no_quest = "No quests available."
+spec_msg_auto_fight_rounds = "Rounds fought against the {enemy}: {rounds}.\n"
+"""A message that displays the number of rounds of an automatic fight, it precedes the result of the fight.
+
+    :meta hide-value:
+"""
+
+msg_auto_fight_stopped = format_string(
+    "The {enemy} is still standing.\nYour health is reduced by {lost}.\nCurrent health is {hp}."
+)
+"""A message that displays the result of an automatic fight that ended without a win and the health decrease.
+
+    :meta hide-value:
+"""
+
+msg_auto_fight_low_hp = format_string(
+    "Your health is too low to fight automatically, heal or fight round by round."
+)
+"""A message that informs the user that the character's health is too low for an automatic fight.
+
+    :meta hide-value:
+"""
+
+msg_travel_succ = format_string("You've traveled: {path}.\nDescription: {desc}")
+"""A message that confirms a travel along several locations and displays the description of the destination.
+
+    :meta hide-value:
+"""
+
+msg_travel_no_path = format_string("There is no way from here to {location}.")
+"""A message that informs the user that the destination of a travel can't be reached.
+
+    :meta hide-value:
+"""
+
+msg_npc_no_quest = format_string("No quests available.")
 """A message that informs the user that the NPC has no quests to offer.
 
     :meta hide-value:
 """
 
-msg_no_quests = "You have no quests."
+msg_no_quests = format_string("You have no quests.")
 """A message that informs the user that they have no quests in their journal.
 
     :meta hide-value:
@@ -158,43 +227,104 @@ spec_msg_current_quests = "Current quests:\n"
     :meta hide-value:
 """
 
-msg_quest = "{npc} at {location}: {task}"
+msg_quest = format_string("{npc} at {location}: {task}")
 """A message that displays the details of a quest, including the NPC, the location, and the task.
 
     :meta hide-value:
 """
 
-msg_quest_complete_succ = "You've completed the quest."
+spec_msg_top = "🏅 Top players:\n"
+"""A message that displays the characters with the highest levels.
+
+    :meta hide-value:
+"""
+
+spec_msg_top_player = "{rank}. {name}, level {level}"
+"""A message that displays a character on the leaderboard with its rank and level.
+
+    :meta hide-value:
+"""
+
+spec_msg_your_rank = "\nYour rank: {rank} of {total}."
+"""A message that displays the rank of the user's character among all characters.
+
+    :meta hide-value:
+"""
+
+msg_quest_complete_succ = format_string("You've completed the quest.")
 """A message that confirms the successful completion of a quest.
 
     :meta hide-value:
 """
 
-msg_quest_complete_deny = "You don't have required items to complete this quest."
+msg_quest_complete_deny = format_string(
+    "You don't have required items to complete this quest."
+)
 """A message that informs the user that they don't have the required items to complete a quest.
 
     :meta hide-value:
 """
 
-msg_no_character = "An error occured. Please, use /start to reload."
+msg_no_character = format_string("An error occured. Please, use /start to reload.")
 """A message that informs the user that an error has occurred and prompts them to reload the bot.
 
     :meta hide-value:
 """
 
-msg_gen_welcome = "This is a bot to generate names for various characters and items."
+spec_msg_busy = "The world is busy, please try again in a moment."
+"""A message that asks the user to repeat the action when the database is busy with a background job, shown as a notification.
+
+    :meta hide-value:
+"""
+
+msg_reload_succ = format_string("World content is reloaded, version {version}.")
+"""A message that confirms the successful reload of the world content.
+
+    :meta hide-value:
+"""
+
+msg_reload_fail = format_string("Couldn't reload the world content: {error}")
+"""A message that informs the admin that the world content couldn't be reloaded.
+
+    :meta hide-value:
+"""
+
+msg_backup_started = format_string("Backup is started.")
+"""A message that informs the admin that the backup is started.
+
+    :meta hide-value:
+"""
+
+msg_backup_succ = format_string(
+    "Backup is written to {path}: {size} KiB in {duration:.1f} s, integrity {integrity}.\n"
+    "Writes during the backup: {count}, p99 {p99:.1f} ms (before {p99_before:.1f} ms), max {max:.1f} ms."
+)
+"""A message that reports the successful backup to the admin.
+
+    :meta hide-value:
+"""
+
+msg_backup_fail = format_string("Couldn't back up the database: {error}")
+"""A message that informs the admin that the backup failed.
+
+    :meta hide-value:
+"""
+
+msg_gen_welcome = format_string(
+    "This is a bot to generate names for various characters and items."
+)
 """A message that introduces the bot's functionality of generating names.
 
     :meta hide-value:
 """
 
-msg_gen_choose_type = "Choose a type:"
+msg_gen_choose_type = format_string("Choose a type:")
 """A message that prompts the user to choose a type of name to generate.
 
     :meta hide-value:
 """
 
-msg_gen_choose_category = "Choose a category:"
+msg_gen_choose_category = format_string("Choose a category:")
 """A message that prompts the user to choose a category of name to generate.
 
     :meta hide-value:
@@ -212,6 +342,48 @@ btn_back = "🔙 Back"
     :meta hide-value:
 """
 
+btn_previous_page = "◀️"
+"""A button that shows the previous page of a list.
+
+    :meta hide-value:
+"""
+
+btn_next_page = "▶️"
+"""A button that shows the next page of a list.
+
+    :meta hide-value:
+"""
+
+btn_auto_fight = "⏩ Auto"
+"""A button that fights an enemy for several rounds at once.
+
+    :meta hide-value:
+"""
+
+btn_travel = "🧭 Travel to {location}"
+"""A button that moves the character to a location along the shortest path.
+
+    :meta hide-value:
+"""
+
+btn_npc_quest_available = "❗ {npc}"
+"""A button of an NPC that has a quest the character can accept.
+
+    :meta hide-value:
+"""
+
+btn_npc_quest_active = "⏳ {npc}"
+"""A button of an NPC whose quest the character has accepted but can't complete yet.
+
+    :meta hide-value:
+"""
+
+btn_npc_quest_completable = "🎉 {npc}"
+"""A button of an NPC whose quest the character can complete.
+
+    :meta hide-value:
+"""
+
 btn_dialog = "💬 Dialogue"
 """A button that initiates a dialogue with an NPC.
 
@@ -241,30 +413,3 @@ btn_quest_not_available = "❌ required level {level}"
 
     :meta hide-value:
 """
-
-
-def format_string(input_string, line_length=MAX_LINE_WIDTH):
-    """A function that formats a string to fit a given line width and adds a special character at the end.
-
-    :param str input_string: The string to format.
-    :param int line_length: (optional) The maximum line width. Defaults to MAX_LINE_WIDTH.
-
-    :returns:
-        str: The formatted string with the special character at the end.
-    """
-    return f"{input_string:<{line_length}}" + SPEC_MSG_END
-
-
-def _apply_formatting():
-    """A function that applies the formatting function to all the global variables that start with 'msg_'."""
-    globals_to_format = {
-        k: v
-        for k, v in globals().items()
-        if isinstance(v, str) and k.startswith("msg_") and k != __name__
-    }
-    for name, value in globals_to_format.items():
-        formatted_value = format_string(value)
-        globals()[name] = formatted_value
-
-
-_apply_formatting()
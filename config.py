@@ -7,3 +7,39 @@ PORT = config("PORT", cast=int, default=8000)
 WEBHOOK_PATH = config("WEBHOOK_PATH", default="webhook")
 BASE_URL = config("BASE_URL")
 GAME_DB_PATH = config("GAME_DB_PATH", default="game.db")
+DB_URL = config("DB_URL", default="")
+CONTENT_WATCH_INTERVAL = config("CONTENT_WATCH_INTERVAL", cast=int, default=0)
+WORLD_SNAPSHOT_PATH = config("WORLD_SNAPSHOT_PATH", default="")
+SQLITE_WAL = config("SQLITE_WAL", cast=bool, default=True)
+SQLITE_SYNCHRONOUS = config("SQLITE_SYNCHRONOUS", default="NORMAL")
+SQLITE_MMAP_SIZE = config("SQLITE_MMAP_SIZE", cast=int, default=268435456)
+SQLITE_CACHE_SIZE = config("SQLITE_CACHE_SIZE", cast=int, default=-16000)
+SQLITE_BUSY_TIMEOUT = config("SQLITE_BUSY_TIMEOUT", cast=int, default=5000)
+DB_READ_POOL_SIZE = config("DB_READ_POOL_SIZE", cast=int, default=4)
+DB_WRITE_TIMEOUT = config("DB_WRITE_TIMEOUT", cast=float, default=2)
+DB_POOL_SIZE = config("DB_POOL_SIZE", cast=int, default=10)
+PLAYER_SHARDS = config("PLAYER_SHARDS", cast=int, default=0)
+WORKERS = config("WORKERS", cast=int, default=1)
+BACKUP_DIR = config("BACKUP_DIR", default="backups")
+BACKUP_KEEP = config("BACKUP_KEEP", cast=int, default=7)
+BACKUP_INTERVAL = config("BACKUP_INTERVAL", cast=int, default=0)
+BACKUP_PAGES = config("BACKUP_PAGES", cast=int, default=100)
+BACKUP_PAUSE = config("BACKUP_PAUSE", cast=float, default=0.005)
+EXPORT_DIR = config("EXPORT_DIR", default="exports")
+ARCHIVE_IDLE_DAYS = config("ARCHIVE_IDLE_DAYS", cast=int, default=90)
+ARCHIVE_DEAD = config("ARCHIVE_DEAD", cast=bool, default=False)
+MAINTENANCE_INTERVAL = config("MAINTENANCE_INTERVAL", cast=int, default=0)
+EVENT_LOG_DIR = config("EVENT_LOG_DIR", default="")
+EVENT_SEGMENT_SIZE = config("EVENT_SEGMENT_SIZE", cast=int, default=16777216)
+EVENT_FLUSH_INTERVAL = config("EVENT_FLUSH_INTERVAL", cast=float, default=1.0)
+INVENTORY_LAYOUT = config("INVENTORY_LAYOUT", default="rows")
+AUTO_FIGHT_ROUNDS = config("AUTO_FIGHT_ROUNDS", cast=int, default=10)
+AUTO_FIGHT_MIN_HP = config("AUTO_FIGHT_MIN_HP", cast=int, default=2)
+CONTENT_DIR = config("CONTENT_DIR", default="")
+PAGE_SIZE = config("PAGE_SIZE", cast=int, default=8)
+LEADERBOARD_SIZE = config("LEADERBOARD_SIZE", cast=int, default=10)
+LEADERBOARD_REFRESH_INTERVAL = config(
+    "LEADERBOARD_REFRESH_INTERVAL", cast=int, default=60 if WORKERS > 1 else 0
+)
+PRESENCE_TIMEOUT = config("PRESENCE_TIMEOUT", cast=float, default=600)
+PRESENCE_SHOWN = config("PRESENCE_SHOWN", cast=int, default=5)
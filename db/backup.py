@@ -0,0 +1,230 @@
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timezone
+
+from config import (
+    BACKUP_DIR,
+    BACKUP_KEEP,
+    BACKUP_PAGES,
+    BACKUP_PAUSE,
+    DB_URL,
+    GAME_DB_PATH,
+)
+from sqlalchemy import event
+
+from db.db import Session, shard_sessions
+from db.storage import get_archive_path, get_shard_paths
+import db.bench as bench
+
+BACKUP_MAX_RESTARTS = 3
+"""A constant that defines how many times the copy may restart before it's finished in a single step."""
+
+WRITE_LATENCY_SAMPLES = 10000
+"""A constant that defines the number of the latest write transactions whose latency is kept."""
+
+_write_latencies = deque(maxlen=WRITE_LATENCY_SAMPLES)
+_backup_lock = threading.Lock()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _track_writes(session_factory):
+    @event.listens_for(session_factory, "after_begin")
+    def after_begin(session, transaction, connection):
+        session.info["began"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def after_commit(session):
+        began = session.info.pop("began", None)
+        if began is not None:
+            committed = time.perf_counter()
+            _write_latencies.append((committed, committed - began))
+
+
+for _session_factory in [Session] + [write for write, _ in shard_sessions]:
+    _track_writes(_session_factory)
+
+
+def get_write_latency(started, finished):
+    """A function that returns the latency of the write transactions committed in a period, including the waits for the lock.
+
+    :param float started: The start of the period, as returned by time.perf_counter.
+    :param float finished: The end of the period, as returned by time.perf_counter.
+
+    :returns:
+        dict: The number of transactions and their median, p99 and max latency in ms.
+    """
+    latencies = [
+        latency * 1000 for at, latency in _write_latencies if started <= at <= finished
+    ]
+    return {"count": len(latencies), **bench.summarize(latencies)}
+
+
+def backup_file(source, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """A function that copies a live SQLite database with the online backup API.
+
+    The copy is made in steps of a few pages with a pause between them, so the writers get the lock
+    in between. In WAL mode the source connection holds a read transaction for the whole copy: it
+    doesn't block the writers, and the backup doesn't restart every time they change the database.
+    With the rollback journal every change restarts the backup, so after BACKUP_MAX_RESTARTS restarts
+    the rest is copied in a single step, which holds the writers off until it's done.
+
+    :param str source: The path of the database.
+    :param str target: The path of the copy.
+    :param int pages: (optional) The number of pages copied in one step. Defaults to BACKUP_PAGES.
+    :param float pause: (optional) The pause between the steps in seconds. Defaults to BACKUP_PAUSE.
+
+    :returns:
+        str: The result of the integrity check of the copy, "ok" if the copy is valid.
+    """
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == "wal":
+            src.execute("BEGIN")
+            src.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        last_remaining = None
+        restarts = 0
+
+        def progress(status, remaining, total):
+            nonlocal last_remaining, restarts
+            if last_remaining is not None and remaining >= last_remaining:
+                restarts += 1
+                if restarts > BACKUP_MAX_RESTARTS:
+                    raise _TooManyRestarts
+            last_remaining = remaining
+            time.sleep(pause)
+
+        try:
+            src.backup(dst, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            src.backup(dst)
+        src.rollback()
+        return dst.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+
+
+def rotate_backups(directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    """A function that deletes all backups except the latest ones.
+
+    :param str directory: (optional) The directory with the backups. Defaults to BACKUP_DIR.
+    :param int keep: (optional) The number of backups to keep. Defaults to BACKUP_KEEP.
+
+    :returns:
+        list: A list of the names of the deleted backups.
+    """
+    backups = sorted(
+        name
+        for name in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, name)) and not name.endswith(".tmp")
+    )
+    deleted = backups[: max(len(backups) - keep, 0)]
+    for name in deleted:
+        shutil.rmtree(os.path.join(directory, name))
+    return deleted
+
+
+def backup(directory=BACKUP_DIR, keep=BACKUP_KEEP):
+    """A function that backs up the main database, the player shards and the archive into a new directory.
+
+    The backup is written to a temporary directory and renamed only if every copy passes the integrity check.
+
+    :param str directory: (optional) The directory with the backups. Defaults to BACKUP_DIR.
+    :param int keep: (optional) The number of backups to keep. Defaults to BACKUP_KEEP.
+
+    :returns:
+        dict: The report with the path, size, duration, integrity and write latency during the backup.
+
+    :raises:
+        ValueError: If the database is not SQLite or a copy fails the integrity check.
+        RuntimeError: If another backup is running.
+    """
+    if DB_URL:
+        raise ValueError(
+            "Only SQLite databases can be backed up, use pg_dump for PostgreSQL"
+        )
+    if not _backup_lock.acquire(blocking=False):
+        raise RuntimeError("Another backup is running")
+    try:
+        name = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+        target = os.path.join(directory, name)
+        # the bot and the shell can back up in the same microsecond, the later one gets a suffix
+        for suffix in itertools.count(1):
+            tmp_target = f"{target}.tmp"
+            with suppress(FileExistsError):
+                if not os.path.exists(target):
+                    os.makedirs(tmp_target)
+                    break
+            target = os.path.join(directory, f"{name}-{suffix}")
+        started = time.perf_counter()
+        size = 0
+        try:
+            archive = get_archive_path(GAME_DB_PATH)
+            sources = [GAME_DB_PATH] + get_shard_paths(GAME_DB_PATH)
+            for source in sources + ([archive] if os.path.exists(archive) else []):
+                copy = os.path.join(tmp_target, os.path.basename(source))
+                integrity = backup_file(source, copy)
+                if integrity != "ok":
+                    raise ValueError(f"Backup of {source} is damaged: {integrity}")
+                size += os.path.getsize(copy)
+        except Exception:
+            shutil.rmtree(tmp_target, ignore_errors=True)
+            raise
+        finished = time.perf_counter()
+        os.replace(tmp_target, target)
+        rotated = rotate_backups(directory, keep)
+    finally:
+        _backup_lock.release()
+
+    duration = finished - started
+    report = {
+        "path": target,
+        "size": size,
+        "duration": duration,
+        "integrity": "ok",
+        "rotated": rotated,
+        "writes_during": get_write_latency(started, finished),
+        "writes_before": get_write_latency(started - duration, started),
+    }
+    logging.info(
+        f"Backup {target} is done in {duration:.2f} s, {size / 1024:.0f} KiB, "
+        f"write p99 {report['writes_during']['p99']:.2f} ms "
+        f"(before {report['writes_before']['p99']:.2f} ms)"
+    )
+    return report
+
+
+async def backup_periodically(interval):
+    """A function that makes a backup every interval seconds.
+
+    :param int interval: The number of seconds between the backups.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(backup)
+        except Exception as e:
+            logging.error(f"Couldn't back up the database: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    try:
+        report = backup(sys.argv[1] if len(sys.argv) > 1 else BACKUP_DIR)
+    except (ValueError, RuntimeError) as e:
+        print(e)
+        sys.exit(1)
+    print(f"Backup is written to {report['path']} ({report['size'] / 1024:.0f} KiB)")
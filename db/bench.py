@@ -0,0 +1,48 @@
+import statistics
+import time
+
+
+def measure(operation, repeats):
+    """A function that calls an operation several times and returns the median duration of a call.
+
+    :param function operation: The operation to measure, called without arguments.
+    :param int repeats: The number of calls.
+
+    :returns:
+        float: The median duration of a call in µs.
+    """
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        operation()
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(latencies)
+
+
+def percentile(values, fraction):
+    """A function that returns a percentile of a list of values.
+
+    :param list values: The values, at least one.
+    :param float fraction: The percentile as a fraction, e.g. 0.99 for p99.
+
+    :returns:
+        float: The value below which the given fraction of the values lies.
+    """
+    return sorted(values)[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(latencies):
+    """A function that returns the median, p99 and max of a list of latencies.
+
+    :param list latencies: The latencies, in any unit.
+
+    :returns:
+        dict: The median, p99 and max latency in the same unit, zeros if there are no latencies.
+    """
+    if not latencies:
+        return {"p50": 0, "p99": 0, "max": 0}
+    return {
+        "p50": statistics.median(latencies),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+    }
@@ -0,0 +1,262 @@
+import random
+import statistics
+import sys
+import time
+from itertools import product
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DIE_SIDES = 6
+"""A constant that defines the number of sides of the die rolled by both sides of a fight."""
+
+MIN_DIFFERENCE = -DIE_SIDES
+"""A constant that defines the level difference at and below which the character can't win."""
+
+MAX_DIFFERENCE = DIE_SIDES - 1
+"""A constant that defines the level difference at and above which the character always wins."""
+
+PLAYTHROUGH_RUNS = 10000
+"""A constant that defines the number of playthroughs simulated by default."""
+
+TARGET_ODDS = 0.5
+"""A constant that defines the win chance a simulated player wants before fighting the next enemy."""
+
+
+def _build_win_odds():
+    # the fight is decided by the difference of the rolls, so the whole table of (level, enemy level)
+    # pairs comes down to one chance per level difference, counted over all pairs of rolls
+    differences = range(MIN_DIFFERENCE, MAX_DIFFERENCE + 1)
+    outcomes = DIE_SIDES * DIE_SIDES
+    if numpy is not None:
+        faces = numpy.arange(1, DIE_SIDES + 1)
+        rolls = numpy.subtract.outer(faces, faces).ravel()
+        wins = (rolls[None, :] + numpy.array(differences)[:, None] >= 0).sum(axis=1)
+        return tuple(int(count) / outcomes for count in wins)
+    faces = range(1, DIE_SIDES + 1)
+    return tuple(
+        sum(own + difference >= enemy for own, enemy in product(faces, faces))
+        / outcomes
+        for difference in differences
+    )
+
+
+WIN_ODDS = _build_win_odds()
+"""A tuple of the exact chances to win a fight by the level difference from MIN_DIFFERENCE to MAX_DIFFERENCE.
+
+    :meta hide-value:
+"""
+
+
+def get_win_chance(level, enemy_level):
+    """A function that returns the chance of a character to win a fight, as it's resolved by Protagonist.attack.
+
+    :param int level: The level of the character.
+    :param int enemy_level: The level of the enemy.
+
+    :returns:
+        float: The chance to win from 0 to 1.
+    """
+    difference = min(max(level - enemy_level, MIN_DIFFERENCE), MAX_DIFFERENCE)
+    return WIN_ODDS[difference - MIN_DIFFERENCE]
+
+
+def roll_fight(level, enemy_level):
+    """A function that resolves one round of a fight, both sides roll a die and add their levels.
+
+    :param int level: The level of the character.
+    :param int enemy_level: The level of the enemy.
+
+    :returns:
+        bool: True if the character wins the round.
+    """
+    return (
+        random.randint(1, DIE_SIDES) + level
+        >= random.randint(1, DIE_SIDES) + enemy_level
+    )
+
+
+def get_expected_hp_loss(level, enemy_level):
+    """A function that returns the health a character is expected to lose before beating an enemy.
+
+    Every lost fight takes one point of health and the level only grows with a win, so the number of
+    losses before the first win follows the geometric distribution.
+
+    :param int level: The level of the character.
+    :param int enemy_level: The level of the enemy.
+
+    :returns:
+        float: The expected number of lost health points, infinity if the enemy can't be beaten.
+    """
+    chance = get_win_chance(level, enemy_level)
+    return (1 - chance) / chance if chance else float("inf")
+
+
+def _target_enemy(level, stage, enemy_levels, target_odds):
+    if stage and get_win_chance(level, enemy_levels[stage]) < target_odds:
+        return 0
+    return stage
+
+
+def _simulate_python(enemy_levels, runs, level, hp, target_odds, seed):
+    rnd = random.Random(seed)
+    count = len(enemy_levels)
+    deaths, lost, fights = [0] * count, [0] * count, []
+    levels, survived = [], 0
+    for _ in range(runs):
+        run_level, run_hp, stage, run_fights = level, hp, 0, 0
+        while stage < count and run_hp > 0:
+            target = _target_enemy(run_level, stage, enemy_levels, target_odds)
+            run_fights += 1
+            if rnd.randint(1, DIE_SIDES) + run_level >= (
+                rnd.randint(1, DIE_SIDES) + enemy_levels[target]
+            ):
+                run_level += 1
+                if target == stage:
+                    stage += 1
+            else:
+                run_hp -= 1
+                lost[target] += 1
+        if stage < count:
+            deaths[stage] += 1
+        else:
+            survived += 1
+        fights.append(run_fights)
+        levels.append(run_level)
+    return survived, deaths, lost, fights, levels
+
+
+def _simulate_numpy(enemy_levels, runs, level, hp, target_odds, seed):
+    rng = numpy.random.default_rng(seed)
+    count = len(enemy_levels)
+    enemy_levels = numpy.array(enemy_levels)
+    odds = numpy.array(WIN_ODDS)
+    levels = numpy.full(runs, level)
+    hps = numpy.full(runs, hp)
+    stages = numpy.zeros(runs, dtype=int)
+    fights = numpy.zeros(runs, dtype=int)
+    lost = numpy.zeros(count, dtype=int)
+    # every step fights one round of all unfinished playthroughs at once
+    while True:
+        active = numpy.flatnonzero((stages < count) & (hps > 0))
+        if not active.size:
+            break
+        level, stage = levels[active], stages[active]
+        difference = numpy.clip(
+            level - enemy_levels[stage], MIN_DIFFERENCE, MAX_DIFFERENCE
+        )
+        target = numpy.where(
+            (stage == 0) | (odds[difference - MIN_DIFFERENCE] >= target_odds), stage, 0
+        )
+        rolls = rng.integers(1, DIE_SIDES + 1, size=(2, active.size))
+        win = rolls[0] + level >= rolls[1] + enemy_levels[target]
+        fights[active] += 1
+        levels[active] += win
+        stages[active] += win & (target == stage)
+        hps[active] -= ~win
+        numpy.add.at(lost, target[~win], 1)
+    dead = stages < count
+    deaths = numpy.bincount(stages[dead], minlength=count)
+    return (
+        int(runs - dead.sum()),
+        deaths.tolist(),
+        lost.tolist(),
+        fights.tolist(),
+        levels.tolist(),
+    )
+
+
+def simulate_playthroughs(
+    enemies,
+    runs=PLAYTHROUGH_RUNS,
+    level=1,
+    hp=10,
+    target_odds=TARGET_ODDS,
+    seed=None,
+    vectorized=None,
+):
+    """A function that simulates playthroughs of a character fighting its way through the enemies.
+
+    The player fights the enemies in order, every one until it's beaten. When the chance to win against
+    the next enemy is below target_odds, the player gains a level on the first enemy instead. A lost fight
+    takes one point of health and a playthrough ends when the last enemy is beaten or the health runs out.
+    With NumPy installed all playthroughs are simulated at once, otherwise one after another.
+
+    :param list enemies: The enemies in the order they are fought.
+    :param int runs: (optional) The number of playthroughs. Defaults to PLAYTHROUGH_RUNS.
+    :param int level: (optional) The level of the character at the start. Defaults to 1.
+    :param int hp: (optional) The health of the character at the start, the healing potions count too. Defaults to 10.
+    :param float target_odds: (optional) The win chance the player wants before fighting the next enemy. Defaults to TARGET_ODDS.
+    :param int seed: (optional) The seed of the random generator. Defaults to None.
+    :param bool vectorized: (optional) Whether to use NumPy. Defaults to None, which uses it when it's installed.
+
+    :returns:
+        dict: The share of survived playthroughs, the deaths and lost health by enemy id,
+        and the median fights and final level.
+
+    :raises:
+        ImportError: If vectorized is True and NumPy isn't installed.
+    """
+    if vectorized is None:
+        vectorized = numpy is not None
+    if vectorized and numpy is None:
+        raise ImportError("The vectorized simulation needs NumPy, uv sync --extra sim")
+    simulate = _simulate_numpy if vectorized else _simulate_python
+    enemy_levels = [enemy.level for enemy in enemies]
+    survived, deaths, lost, fights, levels = simulate(
+        enemy_levels, runs, level, hp, target_odds, seed
+    )
+    return {
+        "survived": survived / runs,
+        "deaths": {enemy.id: died for enemy, died in zip(enemies, deaths)},
+        "lost_hp": {enemy.id: hp / runs for enemy, hp in zip(enemies, lost)},
+        "fights": statistics.median(fights),
+        "level": statistics.median(levels),
+    }
+
+
+if __name__ == "__main__":
+    import db.db as db
+    from db.world import build_world
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    runs = int(args[0]) if args else PLAYTHROUGH_RUNS
+    world = build_world()
+    enemies = sorted(world.enemies.values(), key=lambda enemy: enemy.level)
+    character = db.Protagonist(0, "")
+    potions = sum(
+        count
+        for item_id, count in db.STARTING_INVENTORY.items()
+        if world.items[item_id].usable
+    )
+
+    print("level difference  win chance  expected hp loss")
+    for difference in range(MIN_DIFFERENCE, MAX_DIFFERENCE + 1):
+        print(
+            f"{difference:>16}  {get_win_chance(difference, 0):>10.1%}"
+            f"  {get_expected_hp_loss(difference, 0):>16.2f}"
+        )
+
+    started = time.perf_counter()
+    report = simulate_playthroughs(
+        enemies,
+        runs,
+        character.level,
+        character.hp + potions,
+        vectorized=False if "--python" in sys.argv else None,
+    )
+    elapsed = time.perf_counter() - started
+    print(
+        f"\n{runs} playthroughs in {elapsed:.2f} s "
+        f"({'NumPy' if numpy is not None and '--python' not in sys.argv else 'pure Python'})"
+    )
+    print(f"survived {report['survived']:.1%}, median {report['fights']:.0f} fights")
+    print(f"median final level {report['level']:.0f}")
+    print(f"{'enemy':<24}{'level':>6}{'deaths':>8}{'lost hp':>9}")
+    for enemy in enemies:
+        print(
+            f"{enemy.name:<24}{enemy.level:>6}{report['deaths'][enemy.id]:>8}"
+            f"{report['lost_hp'][enemy.id]:>9.2f}"
+        )
@@ -0,0 +1,211 @@
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from collections import deque
+
+from config import CONTENT_DIR, WORLD_SNAPSHOT_PATH
+
+DATA_DIR = CONTENT_DIR or os.path.join(os.path.dirname(__file__), "data")
+"""A constant that defines the directory with the content files, CONTENT_DIR or db/data by default."""
+
+CONTENT_NAMES = ("items", "npcs", "enemies", "dialogs", "quests", "locations")
+"""A constant that defines the names of the content files in the order they are loaded."""
+
+START_LOCATION_ID = 1
+"""A constant that defines the location where new characters start."""
+
+SNAPSHOT_MAGIC = b"TGWS"
+"""A constant that defines the first bytes of a world snapshot file."""
+
+SNAPSHOT_FORMAT = 2
+"""A constant that defines the version of the world snapshot file format."""
+
+_HEADER = struct.Struct("<4sHBB")
+
+
+def get_json_data(filename):
+    """A function that reads a JSON file and returns its data and hash.
+
+    :param str filename: The name of the JSON file without the extension.
+
+    :returns:
+        tuple: A tuple of (hash, data), where hash is the sha256 of the file contents.
+
+    :raises:
+        ValueError: If the file can't be read or is not valid JSON.
+    """
+    try:
+        with open(os.path.join(DATA_DIR, f"{filename}.json"), "rb") as file:
+            raw = file.read()
+        return hashlib.sha256(raw).hexdigest(), json.loads(raw)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Couldn't read the json file '{filename}': {e}") from e
+
+
+def read_content():
+    """A function that reads all content, from the world snapshot if it's configured and from the JSON files otherwise.
+
+    :returns:
+        dict: A dictionary of (hash, data) tuples by content name.
+
+    :raises:
+        ValueError: If a content file can't be read.
+    """
+    if WORLD_SNAPSHOT_PATH and os.path.exists(WORLD_SNAPSHOT_PATH):
+        return load_snapshot(WORLD_SNAPSHOT_PATH)
+    return {name: get_json_data(name) for name in CONTENT_NAMES}
+
+
+def content_sources():
+    """A function that returns the files the content is read from.
+
+    :returns:
+        list: A list of file paths.
+    """
+    if WORLD_SNAPSHOT_PATH and os.path.exists(WORLD_SNAPSHOT_PATH):
+        return [WORLD_SNAPSHOT_PATH]
+    return [os.path.join(DATA_DIR, f"{name}.json") for name in CONTENT_NAMES]
+
+
+def validate_content(content):
+    """A function that checks the references between the content files.
+
+    :param dict content: The data of each content file by its name.
+
+    :returns:
+        list: A list of error messages, empty if the content is valid.
+    """
+    errors = []
+    items = {item["id"] for item in content["items"]}
+    locations = {location["id"]: location for location in content["locations"]}
+    npcs = {npc["id"] for npc in content["npcs"]}
+
+    for location in content["locations"]:
+        for direction in location["directions"]:
+            if direction not in locations:
+                errors.append(
+                    f"Location {location['id']} leads to unknown location {direction}"
+                )
+    for npc in content["npcs"]:
+        if npc["location_id"] not in locations:
+            errors.append(
+                f"NPC {npc['id']} is in unknown location {npc['location_id']}"
+            )
+    for enemy in content["enemies"]:
+        if enemy["location_id"] not in locations:
+            errors.append(
+                f"Enemy {enemy['id']} is in unknown location {enemy['location_id']}"
+            )
+        if enemy.get("loot_id") and enemy["loot_id"] not in items:
+            errors.append(f"Enemy {enemy['id']} drops unknown item {enemy['loot_id']}")
+
+    stages = {(dialog["npc_id"], dialog["stage_id"]) for dialog in content["dialogs"]}
+    for dialog in content["dialogs"]:
+        if dialog["npc_id"] not in npcs:
+            errors.append(f"Dialog of unknown NPC {dialog['npc_id']}")
+        for response in dialog["responses"]:
+            next_stage_id = response.get("next_stage_id")
+            if next_stage_id and (dialog["npc_id"], next_stage_id) not in stages:
+                errors.append(
+                    f"Dialog {dialog['npc_id']}:{dialog['stage_id']} leads to unknown stage {next_stage_id}"
+                )
+
+    for quest in content["quests"]:
+        if quest["npc_id"] not in npcs:
+            errors.append(f"Quest of unknown NPC {quest['npc_id']}")
+        for key in ("required_item_id", "reward_item_id"):
+            if quest[key] not in items:
+                errors.append(
+                    f"Quest of NPC {quest['npc_id']} uses unknown item {quest[key]}"
+                )
+
+    if START_LOCATION_ID in locations:
+        reachable, queue = {START_LOCATION_ID}, deque([START_LOCATION_ID])
+        while queue:
+            for direction in locations[queue.popleft()]["directions"]:
+                if direction in locations and direction not in reachable:
+                    reachable.add(direction)
+                    queue.append(direction)
+        for location_id in locations.keys() - reachable:
+            errors.append(f"Location {location_id} is unreachable")
+    else:
+        errors.append(f"Start location {START_LOCATION_ID} doesn't exist")
+    return errors
+
+
+def check_content(content):
+    """A function that raises an error if the references between the content files are broken.
+
+    :param dict content: The data of each content file by its name.
+
+    :raises:
+        ValueError: If the content is not valid, with every error on its own line.
+    """
+    errors = validate_content(content)
+    if errors:
+        raise ValueError("\n".join(errors))
+
+
+def compile_snapshot(path):
+    """A function that validates the JSON files and compiles them into a binary world snapshot.
+
+    :param str path: The path of the snapshot file.
+
+    :raises:
+        ValueError: If the content is not valid.
+    """
+    content = {name: get_json_data(name) for name in CONTENT_NAMES}
+    check_content({name: data for name, (_, data) in content.items()})
+    payload = marshal.dumps({name: list(entry) for name, entry in content.items()})
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        # marshal's format can change between Python versions, so the version is stored with it
+        file.write(_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, *sys.version_info[:2]))
+        file.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """A function that loads a binary world snapshot through a memory map.
+
+    :param str path: The path of the snapshot file.
+
+    :returns:
+        dict: A dictionary of (hash, data) tuples by content name.
+
+    :raises:
+        ValueError: If the file is not a world snapshot of the supported format or was compiled by another Python version.
+    """
+    with (
+        open(path, "rb") as file,
+        mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+    ):
+        if len(mapped) < _HEADER.size:
+            raise ValueError(f"'{path}' is not a world snapshot")
+        magic, version, major, minor = _HEADER.unpack_from(mapped)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT:
+            raise ValueError(
+                f"'{path}' is not a world snapshot of format {SNAPSHOT_FORMAT}"
+            )
+        if (major, minor) != sys.version_info[:2]:
+            raise ValueError(
+                f"'{path}' is compiled by Python {major}.{minor}, "
+                f"compile it again with `python -m db.content`"
+            )
+        with memoryview(mapped)[_HEADER.size :] as payload:
+            content = marshal.loads(payload)
+    return {name: tuple(content[name]) for name in CONTENT_NAMES}
+
+
+if __name__ == "__main__":
+    output = sys.argv[1] if len(sys.argv) > 1 else WORLD_SNAPSHOT_PATH or "world.bin"
+    try:
+        compile_snapshot(output)
+    except ValueError as e:
+        print(f"Content is not valid:\n{e}")
+        sys.exit(1)
+    print(f"World snapshot is written to {output}")
@@ -1,35 +1,138 @@
-from random import randint
-
-from config import GAME_DB_PATH
+import json
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from itertools import islice
+from typing import NamedTuple
+
+from config import (
+    ARCHIVE_DEAD,
+    AUTO_FIGHT_MIN_HP,
+    AUTO_FIGHT_ROUNDS,
+    DB_URL,
+    GAME_DB_PATH,
+    INVENTORY_LAYOUT,
+    PAGE_SIZE,
+    PLAYER_SHARDS,
+)
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
+    JSON,
+    LargeBinary,
     String,
     Table,
     and_,
-    create_engine,
+    bindparam,
+    delete,
     select,
+    update,
 )
 from sqlalchemy.orm import (
-    aliased,
     declarative_base,
     foreign,
     relationship,
-    selectinload,
     sessionmaker,
 )
+from sqlalchemy.orm.attributes import set_committed_value
+
+from db.combat import roll_fight
+from db.events import EventType, record, track_events
+from db.inventory import INVENTORY_LAYOUTS, pack_inventory, unpack_inventory
+from db.leaderboard import track_ranking, update_ranking
+from db.presence import presence
+from db.storage import (
+    create_engines,
+    get_archive_path,
+    get_insert,
+    get_shard,
+    get_shard_paths,
+)
+from db.world import WorldItem, get_world
 
 Base = declarative_base()
-engine = create_engine("sqlite:///" + GAME_DB_PATH)
+ArchiveBase = declarative_base()
+engine, read_engine = create_engines(DB_URL or "sqlite:///" + GAME_DB_PATH)
 Session = sessionmaker(bind=engine)
+ReadSession = sessionmaker(bind=read_engine, autoflush=False)
+insert = get_insert(engine)
+
+if DB_URL and PLAYER_SHARDS:
+    raise ValueError("Player shards are only supported with SQLite")
+shard_engines = [
+    create_engines("sqlite:///" + path, attach=GAME_DB_PATH)
+    for path in get_shard_paths(GAME_DB_PATH)
+]
+shard_sessions = [
+    (sessionmaker(bind=write), sessionmaker(bind=read, autoflush=False))
+    for write, read in shard_engines
+]
+# the archive is a separate file, so the space of the archived players is returned from the hot one
+archive_engine = (
+    engine
+    if DB_URL
+    else create_engines("sqlite:///" + get_archive_path(GAME_DB_PATH))[0]
+)
+
+
+def player_session(character_id, read=False):
+    """A function that opens a session on the database that stores a character.
+
+    With PLAYER_SHARDS set the player tables are split across shard files by the character id,
+    and every shard connection has the world database attached, so the queries can still join
+    the content tables. Otherwise all tables are in the main database.
+
+    :param int character_id: The id of the character.
+    :param bool read: (optional) Whether the session is used only for queries. Defaults to False.
+
+    :returns:
+        Session: The new session.
+    """
+    if not shard_sessions:
+        return ReadSession() if read else Session()
+    write_session, read_session = shard_sessions[
+        get_shard(character_id, len(shard_sessions))
+    ]
+    return read_session() if read else write_session()
+
+
+CharacterId = BigInteger().with_variant(Integer, "sqlite")
+"""A type of the character ids, which are telegram user ids and don't fit into a 32-bit integer.
+
+    SQLite keeps INTEGER, so the id stays an alias of the rowid.
+"""
+
+
+ACTIVITY_RESOLUTION = timedelta(hours=1)
+"""A constant that defines how often the time the player was last active is updated.
+
+    :meta hide-value:
+"""
+
+
+def content_key(column):
+    """A function that returns a foreign key to a content table.
+
+    The key is checked at commit, so the content loader can sync the tables in any order.
+
+    :param str column: The referenced column.
+
+    :returns:
+        ForeignKey: The foreign key.
+    """
+    return ForeignKey(column, deferrable=True, initially="DEFERRED")
+
 
 directions_association = Table(
     "directions",
     Base.metadata,
-    Column("location_from_id", Integer, ForeignKey("locations.id"), primary_key=True),
-    Column("location_to_id", Integer, ForeignKey("locations.id"), primary_key=True),
+    Column("location_from_id", Integer, content_key("locations.id"), primary_key=True),
+    Column("location_to_id", Integer, content_key("locations.id"), primary_key=True),
 )
 
 
@@ -45,7 +148,7 @@ class NPC(Base):
     __tablename__ = "npcs"
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    location_id = Column(Integer, ForeignKey("locations.id"))
+    location_id = Column(Integer, content_key("locations.id"), index=True)
 
     location = relationship("Location", back_populates="npcs")
     dialogs = relationship("Dialog", back_populates="npc", order_by="Dialog.stage_id")
@@ -58,9 +161,9 @@ class Enemy(Base):
     __tablename__ = "enemies"
     id = Column(Integer, primary_key=True)
     name = Column(String)
-    location_id = Column(Integer, ForeignKey("locations.id"))
+    location_id = Column(Integer, content_key("locations.id"), index=True)
     level = Column(Integer)
-    loot_id = Column(Integer, ForeignKey("items.id"), nullable=True)
+    loot_id = Column(Integer, content_key("items.id"), nullable=True)
 
     location = relationship("Location", back_populates="enemies")
     loot = relationship("Item")
@@ -86,19 +189,19 @@ class Location(Base):
 
     async def get_directions(self):
         """A method that returns the directions from this location."""
-        with Session() as session:
+        with ReadSession() as session:
             session.add(self)
             return self.directions
 
     async def get_npcs(self):
         """A method that returns the NPCs in this location."""
-        with Session() as session:
+        with ReadSession() as session:
             session.add(self)
             return self.npcs
 
     async def get_enemies(self):
         """A method that returns the enemies in this location."""
-        with Session() as session:
+        with ReadSession() as session:
             session.add(self)
             return self.enemies
 
@@ -107,7 +210,7 @@ class Dialog(Base):
     """A class that represents a dialog between an NPC and the player."""
 
     __tablename__ = "dialogs"
-    npc_id = Column(Integer, ForeignKey("npcs.id"), primary_key=True)
+    npc_id = Column(Integer, content_key("npcs.id"), primary_key=True)
     stage_id = Column(Integer, nullable=False, index=True, primary_key=True)
     npc_text = Column(String, nullable=False)
 
@@ -122,8 +225,11 @@ class PlayerResponse(Base):
     """A class that represents a player's response to a dialog."""
 
     __tablename__ = "player_responses"
+    __table_args__ = (
+        Index("ix_player_responses_npc_id_stage_id", "npc_id", "stage_id"),
+    )
     id = Column(Integer, primary_key=True, autoincrement=True)
-    npc_id = Column(Integer, ForeignKey("npcs.id"))
+    npc_id = Column(Integer, content_key("npcs.id"))
     stage_id = Column(Integer)
     text = Column(String, nullable=False)
     next_stage_id = Column(Integer, nullable=True)
@@ -140,14 +246,21 @@ class Inventory(Base):
     """A class that represents an inventory of items for a character."""
 
     __tablename__ = "inventories"
-    character_id = Column(Integer, ForeignKey("characters.id"), primary_key=True)
-    item_id = Column(Integer, ForeignKey("items.id"), primary_key=True)
+    character_id = Column(CharacterId, ForeignKey("characters.id"), primary_key=True)
+    item_id = Column(Integer, content_key("items.id"), primary_key=True)
     count = Column(Integer)
 
-    character = relationship("Protagonist", back_populates="inventory")
     item = relationship("Item", lazy="selectin")
 
 
+class PackedInventory(Base):
+    """A class that represents the inventory of a character packed into a single value, see pack_inventory."""
+
+    __tablename__ = "packed_inventories"
+    character_id = Column(CharacterId, ForeignKey("characters.id"), primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+
 class Item(Base):
     """A class that represents an item in the game."""
 
@@ -161,12 +274,12 @@ class Quest(Base):
     """A class that represents a quest given by an NPC."""
 
     __tablename__ = "quests"
-    npc_id = Column(Integer, ForeignKey("npcs.id"), primary_key=True)
+    npc_id = Column(Integer, content_key("npcs.id"), primary_key=True)
     task = Column(String)
     required_level = Column(Integer)
-    required_item_id = Column(Integer, ForeignKey("items.id"))
+    required_item_id = Column(Integer, content_key("items.id"))
     required_count = Column(Integer)
-    reward_item_id = Column(Integer, ForeignKey("items.id"))
+    reward_item_id = Column(Integer, content_key("items.id"))
     reward_count = Column(Integer)
 
     npc = relationship("NPC", back_populates="quest")
@@ -174,12 +287,43 @@ class Quest(Base):
     reward_item = relationship("Item", foreign_keys=[reward_item_id])
 
 
+class ContentVersion(Base):
+    """A class that represents the loaded version of a content file."""
+
+    __tablename__ = "content_versions"
+    name = Column(String, primary_key=True)
+    hash = Column(String, nullable=False)
+
+
+class SchemaMigration(Base):
+    """A class that represents a schema migration applied to the database."""
+
+    __tablename__ = "schema_migrations"
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+
+class ArchivedCharacter(ArchiveBase):
+    """A class that represents a character moved out of the player tables, with its inventory and journal."""
+
+    __tablename__ = "archived_characters"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    character_id = Column(CharacterId, nullable=False, index=True)
+    reason = Column(String, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+    data = Column(JSON, nullable=False)
+
+
 class Journal(Base):
     """A class that represents a journal entry for a character's quest."""
 
     __tablename__ = "journals"
-    character_id = Column(Integer, ForeignKey("characters.id"), primary_key=True)
-    npc_id = Column(Integer, ForeignKey("npcs.id"), primary_key=True)
+    __table_args__ = (
+        Index("ix_journals_character_id_completed", "character_id", "completed"),
+    )
+    character_id = Column(CharacterId, ForeignKey("characters.id"), primary_key=True)
+    npc_id = Column(Integer, content_key("npcs.id"), primary_key=True)
     completed = Column(Boolean)
 
     character = relationship("Protagonist", back_populates="journal")
@@ -195,21 +339,14 @@ class Protagonist(Base):
     """A class that represents the main character of the game."""
 
     __tablename__ = "characters"
-    id = Column(Integer, primary_key=True, autoincrement=True)
+    id = Column(CharacterId, primary_key=True, autoincrement=False)
     name = Column(String)
     hp = Column(Integer)
     level = Column(Integer)
-    location_id = Column(Integer, ForeignKey("locations.id"))
+    location_id = Column(Integer, content_key("locations.id"), index=True)
+    last_active = Column(DateTime, index=True)
 
     location = relationship("Location", back_populates="characters")
-    inventory = relationship(
-        "Inventory", back_populates="character", cascade="all, delete-orphan"
-    )
-    inventory_usable = relationship(
-        "Inventory",
-        secondary="join(Inventory, Item, and_(Inventory.item_id == Item.id, Item.usable == True))",
-        viewonly=True,
-    )
 
     journal = relationship(
         "Journal", back_populates="character", cascade="all, delete-orphan"
@@ -239,30 +376,20 @@ class Protagonist(Base):
         self.hp: int = 10
         self.level = 1
         self.location_id = 1
-        self.inventory = [Inventory(item_id=1, count=1), Inventory(item_id=2, count=5)]
+        self.last_active = utcnow()
 
-    def talk_to(self, npc: NPC):
+    def talk_to(self, npc: NPC, world):
         """A method that initiates a dialog with an NPC.
 
         :param NPC npc: The NPC to talk to.
+        :param World world: The world snapshot to read the dialog from.
 
         :returns:
             Dialog: The dialog object for each stage of the conversation.
         """
         stage = 1
-        with Session() as session:
-            dialogs = (
-                session.execute(
-                    select(Dialog)
-                    .options(selectinload(Dialog.responses))
-                    .where(Dialog.npc_id == npc.id)
-                )
-                .scalars()
-                .all()
-            )
-
         while True:
-            dialog = dialogs[stage - 1]
+            dialog = world.get_dialog(npc.id, stage)
             if not dialog:
                 break
             stage = yield dialog
@@ -275,73 +402,166 @@ class Protagonist(Base):
         :returns:
             tuple: A tuple of (win, loot), where win is a boolean indicating if the attack was successful, and loot is an Item object or None if the enemy had no loot.
         """
-        character_total = randint(1, 6) + int(self.level)
-        enemy_total = randint(1, 6) + int(enemy.level)
-        win = character_total >= enemy_total
+        win = roll_fight(int(self.level), int(enemy.level))
         loot = None
-        with Session() as session:
+        with player_session(self.id) as session:
             session.expire_on_commit = False
             session.add(self)
+            record(session, EventType.FOUGHT, self.id, enemy.id, int(win))
             if win:
-                await self.advance_level()
+                await self.advance_level(session)
                 if enemy.loot_id:
-                    existing_item = next(
-                        (
-                            item
-                            for item in self.inventory
-                            if item.item_id == enemy.loot_id
-                        ),
-                        None,
-                    )
-                    if existing_item:
-                        existing_item.count += 1
-                    else:
-                        self.inventory.append(Inventory(item_id=enemy.loot_id, count=1))
+                    await self.add_item(session, enemy.loot_id)
                     loot = session.execute(
-                        select(Item).where(Item.id == enemy.loot_id)
-                    ).scalar_one_or_none()
+                        SELECT_ITEM, {"id": enemy.loot_id}
+                    ).scalar_one()
             else:
-                await self.take_hit()
+                await self.take_hit(session)
             session.commit()
         return win, loot
 
-    async def take_hit(self, value: int = 1):
+    async def auto_attack(
+        self,
+        enemy: Enemy,
+        rounds: int = AUTO_FIGHT_ROUNDS,
+        min_hp: int = AUTO_FIGHT_MIN_HP,
+    ):
+        """A method that fights an enemy for several rounds in a single transaction.
+
+        The rounds are rolled up front and stop at the first win, when the health drops to min_hp or after
+        the given number of rounds, then the health, level and loot are updated at once.
+
+        :param Enemy enemy: The enemy to attack.
+        :param int rounds: (optional) The maximum number of rounds. Defaults to AUTO_FIGHT_ROUNDS.
+        :param int min_hp: (optional) The health at which the fight stops. Defaults to AUTO_FIGHT_MIN_HP.
+
+        :returns:
+            tuple: A tuple of (rounds, win, loot), where rounds is the number of rounds fought, win is a boolean indicating if the enemy was defeated, and loot is an Item object or None.
+
+        :raises:
+            Exception: If the character's health reaches zero or below.
+        """
+        fought, win, hp = 0, False, self.hp
+        while fought < rounds and not win and hp > min_hp:
+            win = roll_fight(int(self.level), int(enemy.level))
+            fought += 1
+            hp -= not win
+        loot = None
+        if not fought:
+            return fought, win, loot
+        with player_session(self.id) as session:
+            session.expire_on_commit = False
+            session.add(self)
+            for number in range(1, fought + 1):
+                record(
+                    session,
+                    EventType.FOUGHT,
+                    self.id,
+                    enemy.id,
+                    int(win and number == fought),
+                )
+            if fought > win:
+                await self.take_hit(session, fought - win)
+            if win:
+                await self.advance_level(session)
+                if enemy.loot_id:
+                    await self.add_item(session, enemy.loot_id)
+                    loot = session.execute(
+                        SELECT_ITEM, {"id": enemy.loot_id}
+                    ).scalar_one()
+            session.commit()
+        return fought, win, loot
+
+    async def take_hit(self, session, value: int = 1):
         """A method that reduces the character's health by a given value.
 
+        :param Session session: The database session to update the character in.
         :param int value: (optional) The amount of damage to take. Defaults to 1.
 
         :raises:
             Exception: If the character's health reaches zero or below.
         """
-        self.hp -= value
-        if self.hp <= 0:
+        hp = session.execute(
+            UPDATE_HP, {"character_id": self.id, "value": -value}
+        ).scalar_one()
+        set_committed_value(self, "hp", hp)
+        record(session, EventType.HP, self.id, hp)
+        if hp <= 0:
             raise Exception("You died")
 
-    async def heal(self, value: int = 1):
+    async def heal(self, session, value: int = 1):
         """A method that increases the character's health by a given value.
 
+        :param Session session: The database session to update the character in.
         :param int value: (optional) The amount of healing to receive. Defaults to 1.
         """
-        self.hp += value
+        hp = session.execute(
+            UPDATE_HP, {"character_id": self.id, "value": value}
+        ).scalar_one()
+        set_committed_value(self, "hp", hp)
+        record(session, EventType.HP, self.id, hp)
 
-    async def advance_level(self, value: int = 1):
+    async def advance_level(self, session, value: int = 1):
         """A method that increases the character's level by a given value.
 
+        :param Session session: The database session to update the character in.
         :param int value: (optional) The amount of levels to gain. Defaults to 1.
         """
-        self.level += value
+        level = session.execute(
+            UPDATE_LEVEL, {"character_id": self.id, "value": value}
+        ).scalar_one()
+        set_committed_value(self, "level", level)
+        record(session, EventType.LEVEL, self.id, level)
+        update_ranking(session, self.id, self.name, level)
+
+    async def add_item(self, session, item_id: int, count: int = 1):
+        """A method that adds items to the character's inventory.
+
+        :param Session session: The database session to update the inventory in.
+        :param int item_id: The id of the item.
+        :param int count: (optional) The number of items to add. Defaults to 1.
+        """
+        total = inventory_store.add(session, self.id, item_id, count)
+        record(session, EventType.ITEM, self.id, item_id, total)
+        self._expire_collections(session)
+
+    async def remove_item(self, session, item_id: int, count: int = 1):
+        """A method that removes items from the character's inventory if there are enough of them.
+
+        :param Session session: The database session to update the inventory in.
+        :param int item_id: The id of the item.
+        :param int count: (optional) The number of items to remove. Defaults to 1.
+
+        :returns:
+            bool: True if the items were removed, False if there weren't enough of them.
+        """
+        remaining = inventory_store.remove(session, self.id, item_id, count)
+        if remaining is None:
+            return False
+        record(session, EventType.ITEM, self.id, item_id, remaining)
+        self._expire_collections(session)
+        return True
+
+    def _expire_collections(self, session):
+        """A method that marks the character's quests as stale, so they're loaded again on the next access.
+
+        :param Session session: The database session the character is added to.
+        """
+        session.expire(self, ["journal", "active_quests"])
 
     async def go(self, location_id):
         """A method that changes the character's location to a given location id.
 
         :param int lon_id (int): The id of the destination location.
         """
-        with Session() as session:
+        with player_session(self.id) as session:
             session.expire_on_commit = False
             session.add(self)
             self.location_id = location_id
+            record(session, EventType.MOVED, self.id, location_id)
             session.commit()
             session.refresh(self, attribute_names=["location"])
+        presence.see(self.id, self.name, location_id)
 
     async def whereami(self):
         """A method that returns the character's current location.
@@ -349,43 +569,42 @@ class Protagonist(Base):
         :returns:
             Location: The location object of the character's current location.
         """
-        with Session() as session:
+        with player_session(self.id, read=True) as session:
             session.add(self)
             return self.location
 
-    async def use_item(self, item: Inventory):
+    async def use_item(self, item_id: int):
         """A method that uses an item from the character's inventory.
 
-        :param Inventory item: The inventory object of the item to use.
+        :param int item_id: The id of the item to use.
 
         :returns:
             str: A message describing the effect of using the item.
         """
         effect = "You can't use this item."
-        with Session() as session:
-            if item.item.usable:
-                session.expire_on_commit = False
-                session.add(self)
-                item = session.merge(item)
-                if "potion of health" in item.item.name.lower():
-                    await self.heal()
-                    effect = (
-                        f"You've used {item.item.name}.\nYour health increased by 1."
-                    )
-                    item.count -= 1
-                if item.count <= 0:
-                    session.delete(item)
+        with player_session(self.id) as session:
+            session.expire_on_commit = False
+            session.add(self)
+            item = session.execute(SELECT_ITEM, {"id": item_id}).scalar_one_or_none()
+            if (
+                item
+                and item.usable
+                and "potion of health" in item.name.lower()
+                and await self.remove_item(session, item_id)
+            ):
+                await self.heal(session)
+                record(session, EventType.USED, self.id, item_id)
+                effect = f"You've used {item.name}.\nYour health increased by 1."
                 session.commit()
-                session.refresh(self, attribute_names=["inventory", "inventory_usable"])
         return effect
 
     async def get_active_quests(self):
         """A method that returns the character's active quests.
 
         :returns:
-            list: A list of dictionaries, each containing the npc, location, and task of a quest.
+            list: A list of dictionaries, each containing the npc, location, location id, and task of a quest.
         """
-        with Session() as session:
+        with player_session(self.id, read=True) as session:
             session.add(self)
             quests = self.active_quests
             quests = list(map(session.merge, quests))
@@ -394,6 +613,7 @@ class Protagonist(Base):
                     {
                         "npc": quest.npc.name,
                         "location": quest.npc.location.name,
+                        "location_id": quest.npc.location_id,
                         "task": quest.task,
                     }
                     for quest in quests
@@ -407,135 +627,727 @@ class Protagonist(Base):
         :returns:
             tuple: A tuple of (Quest, Journal) or (None, None) if the NPC has no quest.
         """
-        with Session() as session:
+        with player_session(self.id, read=True) as session:
             data = session.execute(
-                select(Quest, Journal)
-                .join(
-                    Journal,
-                    and_(
-                        Quest.npc_id == Journal.npc_id, Journal.character_id == self.id
-                    ),
-                    isouter=True,
-                )
-                .where(Quest.npc_id == npc.id)
+                SELECT_NPC_QUEST, {"character_id": self.id, "npc_id": npc.id}
             ).first()
         return data if data else (None, None)
 
+    async def get_journal(self):
+        """A method that returns the state of the character's quests.
+
+        The journal is loaded with the first call and kept with the character until a quest is accepted
+        or completed, so the quest marks of the NPCs don't read the database on every update.
+
+        :returns:
+            dict: A dictionary of whether the quest is completed by the id of the NPC that gives it.
+        """
+        with player_session(self.id, read=True) as session:
+            session.add(self)
+            return {entry.npc_id: entry.completed for entry in self.journal}
+
+    async def get_quest_states(self):
+        """A method that returns the state of the quests the character can take or complete in its location.
+
+        The quests come from the world snapshot index by location and required level and are checked
+        against the journal. The inventory is read only if one of the quests there is active.
+
+        :returns:
+            dict: A dictionary of QuestState objects by the id of the NPC that gives the quest.
+        """
+        # an active quest was accepted at a lower level, so the quests above the level can be skipped
+        quests = get_world().get_location_quests(self.location_id, self.level)
+        if not quests:
+            return {}
+        journal = await self.get_journal()
+        states, active = {}, []
+        for quest in quests:
+            completed = journal.get(quest.npc_id)
+            if completed is None:
+                states[quest.npc_id] = QuestState.AVAILABLE
+            elif not completed:
+                active.append(quest)
+        if active:
+            with player_session(self.id, read=True) as session:
+                inventory = inventory_store.load(session, self.id)
+            for quest in active:
+                enough = (
+                    inventory.get(quest.required_item_id, 0) >= quest.required_count
+                )
+                states[quest.npc_id] = (
+                    QuestState.COMPLETABLE if enough else QuestState.ACTIVE
+                )
+        return states
+
     async def accept_npc_quest(self, npc: NPC):
         """A method that accepts a quest from an NPC and adds it to the character's journal.
 
         :param NPC npc: The NPC to accept the quest from.
         """
-        with Session() as session:
+        with player_session(self.id) as session:
             session.expire_on_commit = False
             session.add(self)
-            self.journal.append(
-                Journal(character_id=self.id, npc_id=npc.id, completed=False)
-            )
+            session.execute(ACCEPT_QUEST, {"character_id": self.id, "npc_id": npc.id})
+            record(session, EventType.QUEST_ACCEPTED, self.id, npc.id)
+            self._expire_collections(session)
             session.commit()
-            session.refresh(self, attribute_names=["active_quests"])
 
     async def complete_npc_quest(self, npc: NPC):
         """A method that completes a quest from an NPC and updates the character's journal and inventory.
 
+        Every change is a conditional statement in one short transaction, so completing the same quest
+        twice at the same time can't spend the required items twice.
+
         :param NPC npc: The NPC to complete the quest for.
 
         :returns:
             bool: True if the quest was completed successfully, False otherwise.
         """
-        with Session() as session:
+        with player_session(self.id) as session:
+            session.expire_on_commit = False
             session.add(self)
-            item_required = aliased(Inventory)
-            item_reward = aliased(Inventory)
-            data = session.execute(
-                select(Journal, Quest, item_required, item_reward)
-                .join(Quest, Journal.npc_id == Quest.npc_id)
-                .join(
-                    item_required,
-                    and_(
-                        Journal.character_id == item_required.character_id,
-                        item_required.item_id == Quest.required_item_id,
-                        item_required.count >= Quest.required_count,
-                    ),
-                )
-                .join(
-                    item_reward,
-                    and_(
-                        Journal.character_id == item_reward.character_id,
-                        item_reward.item_id == Quest.reward_item_id,
-                    ),
-                    isouter=True,
-                )
-                .where(Journal.character_id == self.id)
-                .where(Journal.npc_id == npc.id)
-            ).first()
-            if data:
-                entry, quest, item_required, item_reward = data
-                session.expire_on_commit = False
-                entry.completed = True
-                if item_reward:
-                    item_reward.count += quest.reward_count
-                else:
-                    self.inventory.append(
-                        Inventory(
-                            item_id=quest.reward_item_id, count=quest.reward_count
-                        )
-                    )
-                if item_required.count == quest.required_count:
-                    session.delete(item_required)
-                else:
-                    item_required.count -= quest.required_count
-                session.commit()
-                session.refresh(
-                    self,
-                    attribute_names=["active_quests", "inventory", "inventory_usable"],
-                )
-                return True
-            else:
+            quest = session.execute(
+                SELECT_QUEST, {"npc_id": npc.id}
+            ).scalar_one_or_none()
+            if not quest:
+                return False
+            completed = session.execute(
+                COMPLETE_QUEST, {"b_character_id": self.id, "b_npc_id": npc.id}
+            ).scalar_one_or_none()
+            if completed is None or not await self.remove_item(
+                session, quest.required_item_id, quest.required_count
+            ):
                 return False
+            await self.add_item(session, quest.reward_item_id, quest.reward_count)
+            record(session, EventType.QUEST_COMPLETED, self.id, npc.id)
+            session.commit()
+            return True
 
     async def die(self):
-        """A method that deletes the character from the database."""
-        with Session() as session:
-            session.add(self)
-            session.delete(self)
+        """A method that deletes the character from the database.
+
+        With ARCHIVE_DEAD the character is moved to the archive for the stats instead.
+        """
+        with player_session(self.id) as session:
+            if ARCHIVE_DEAD:
+                archive_characters(session, [self.id], "dead")
+            else:
+                inventory_store.delete(session, [self.id])
+                session.add(self)
+                session.delete(self)
+            record(session, EventType.DIED, self.id)
+            update_ranking(session, self.id)
             session.commit()
+        presence.leave(self.id)
+
+    async def touch(self):
+        """A method that records that the player is active, at most once per ACTIVITY_RESOLUTION.
+
+        The player is marked present in its location on every call.
+        If the character has been archived in the meantime, it's restored.
+        """
+        presence.see(self.id, self.name, self.location_id)
+        now = utcnow()
+        if self.last_active and now - self.last_active < ACTIVITY_RESOLUTION:
+            return
+        with player_session(self.id) as session:
+            touched = session.execute(
+                TOUCH_CHARACTER, {"character_id": self.id, "now": now}
+            ).scalar_one_or_none()
+            session.commit()
+        if touched is None:
+            await restore_character(self.id)
+        set_committed_value(self, "last_active", now)
 
     async def get_inventory(self):
         """A method that returns the character's inventory.
 
+        The names of the items are taken from the world snapshot.
+
         :returns:
-            list: A list of dictionaries, each containing the item name and count.
+            list: A list of dictionaries, each containing the item name and count, ordered by item id.
         """
-        with Session() as session:
-            session.add(self)
-            return [
-                {"item": item.item.name, "count": item.count} for item in self.inventory
-            ]
+        items = get_world().items
+        with player_session(self.id, read=True) as session:
+            inventory = inventory_store.load(session, self.id)
+        return [
+            {"item": items[item_id].name, "count": count}
+            for item_id, count in inventory.items()
+        ]
 
     async def get_usable_inventory(self):
         """A method that returns the character's usable inventory.
 
         :returns:
-            list: A list of Inventory objects, each representing a usable item.
+            list: A list of InventoryEntry objects, each representing a usable item.
         """
-        with Session() as session:
-            session.add(self)
-            return self.inventory_usable
+        items = get_world().items
+        with player_session(self.id, read=True) as session:
+            inventory = inventory_store.load(session, self.id)
+        return [
+            InventoryEntry(item_id, count, items[item_id])
+            for item_id, count in inventory.items()
+            if items[item_id].usable
+        ]
+
+    async def get_usable_inventory_page(
+        self, cursor=0, backward=False, limit=PAGE_SIZE
+    ):
+        """A method that returns a page of the character's usable inventory.
+
+        Only the page is read from the database. A page is found by the item id it starts after or ends
+        before, so it takes the same time whatever the size of the inventory. If the page is gone because
+        the items were used up, the first page is returned instead.
+
+        :param int cursor: (optional) The item id the page starts after, or ends before if backward is True. Defaults to 0.
+        :param bool backward: (optional) Whether the page ends before the cursor. Defaults to False.
+        :param int limit: (optional) The maximum number of items on the page. Defaults to PAGE_SIZE.
+
+        :returns:
+            tuple: A list of InventoryEntry objects ordered by item id, and whether there are pages before and after it.
+        """
+        world = get_world()
+        with player_session(self.id, read=True) as session:
+            page = inventory_store.load_page(
+                session, self.id, cursor, limit + 1, True, backward
+            )
+            if (len(page) <= limit) if backward else (cursor and not page):
+                cursor, backward = 0, False
+                page = inventory_store.load_page(session, self.id, 0, limit + 1, True)
+            # the page shown again after using an item starts after the item before it,
+            # so whether there's a page before is looked up rather than taken from the cursor
+            before = not backward and bool(
+                cursor
+                and inventory_store.load_page(
+                    session, self.id, cursor + 1, 1, True, backward=True
+                )
+            )
+        if backward:
+            page, before, after = page[1:], True, True
+        else:
+            page, after = page[:limit], len(page) > limit
+        entries = [
+            InventoryEntry(item_id, count, world.items[item_id])
+            for item_id, count in page
+        ]
+        return entries, before, after
+
+
+class QuestState(Enum):
+    """A class that represents the state of a quest for a character."""
+
+    AVAILABLE = "available"
+    ACTIVE = "active"
+    COMPLETABLE = "completable"
+
+
+class InventoryEntry(NamedTuple):
+    """A class that represents a stack of items in a character's inventory."""
+
+    item_id: int
+    count: int
+    item: WorldItem
+
+
+STARTING_INVENTORY = {1: 1, 2: 5}
+"""A constant that defines the counts of the items a new character starts with by item id.
+
+    :meta hide-value:
+"""
+
+
+PLAYER_TABLES = (
+    SchemaMigration.__table__,
+    Protagonist.__table__,
+    Inventory.__table__,
+    PackedInventory.__table__,
+    Journal.__table__,
+)
+"""A constant that defines the tables stored in the player shards.
+
+    :meta hide-value:
+"""
+
+
+# Prebuilt statements of the hot player queries. They are built once at import and executed with
+# bound parameters, so the requests don't pay for constructing the statements again.
+
+SELECT_CHARACTER = select(Protagonist).where(Protagonist.id == bindparam("id"))
+"""A statement that selects a character by id.
+
+    :meta hide-value:
+"""
+
+SELECT_NPC_QUEST = (
+    select(Quest, Journal)
+    .join(
+        Journal,
+        and_(
+            Quest.npc_id == Journal.npc_id,
+            Journal.character_id == bindparam("character_id"),
+        ),
+        isouter=True,
+    )
+    .where(Quest.npc_id == bindparam("npc_id"))
+)
+"""A statement that selects the quest of an NPC and the character's journal entry for it.
+
+    :meta hide-value:
+"""
+
+SELECT_ITEM = select(Item).where(Item.id == bindparam("id"))
+"""A statement that selects an item by id.
+
+    :meta hide-value:
+"""
+
+SELECT_QUEST = select(Quest).where(Quest.npc_id == bindparam("npc_id"))
+"""A statement that selects the quest of an NPC.
+
+    :meta hide-value:
+"""
+
+UPDATE_HP = (
+    update(Protagonist.__table__)
+    .where(Protagonist.id == bindparam("character_id"))
+    .values(hp=Protagonist.hp + bindparam("value"))
+    .returning(Protagonist.hp)
+)
+"""A statement that changes the character's health and returns the new value.
+
+    :meta hide-value:
+"""
+
+UPDATE_LEVEL = (
+    update(Protagonist.__table__)
+    .where(Protagonist.id == bindparam("character_id"))
+    .values(level=Protagonist.level + bindparam("value"))
+    .returning(Protagonist.level)
+)
+"""A statement that changes the character's level and returns the new value.
+
+    :meta hide-value:
+"""
+
+TOUCH_CHARACTER = (
+    update(Protagonist.__table__)
+    .where(Protagonist.id == bindparam("character_id"))
+    .values(last_active=bindparam("now"))
+    .returning(Protagonist.id)
+)
+"""A statement that sets the time the player was last active and returns the character id.
+
+    :meta hide-value:
+"""
+
+SELECT_ARCHIVED = (
+    select(ArchivedCharacter.__table__)
+    .where(ArchivedCharacter.character_id == bindparam("character_id"))
+    .where(ArchivedCharacter.reason == "idle")
+    .order_by(ArchivedCharacter.id.desc())
+    .limit(1)
+)
+"""A statement that selects the latest archive entry of an idle character.
+
+    :meta hide-value:
+"""
+
+_add_item = insert(Inventory.__table__)
+ADD_ITEM = _add_item.on_conflict_do_update(
+    index_elements=["character_id", "item_id"],
+    set_={"count": Inventory.count + _add_item.excluded.count},
+).returning(Inventory.count)
+"""A statement that adds items to the character's inventory and returns their new count, executed with character_id, item_id and count.
+
+    :meta hide-value:
+"""
+
+REMOVE_ITEM = (
+    update(Inventory.__table__)
+    .where(Inventory.character_id == bindparam("b_character_id"))
+    .where(Inventory.item_id == bindparam("b_item_id"))
+    .where(Inventory.count >= bindparam("amount"))
+    .values(count=Inventory.count - bindparam("amount"))
+    .returning(Inventory.count)
+)
+"""A statement that removes items from the character's inventory if there are enough of them.
+
+    :meta hide-value:
+"""
+
+DELETE_EMPTY_ITEM = (
+    delete(Inventory.__table__)
+    .where(Inventory.character_id == bindparam("b_character_id"))
+    .where(Inventory.item_id == bindparam("b_item_id"))
+    .where(Inventory.count <= 0)
+)
+"""A statement that deletes an inventory entry with no items left.
+
+    :meta hide-value:
+"""
+
+ACCEPT_QUEST = (
+    insert(Journal.__table__)
+    .values(completed=False)
+    .on_conflict_do_nothing(index_elements=["character_id", "npc_id"])
+)
+"""A statement that adds an active quest to the character's journal, executed with character_id and npc_id.
+
+    :meta hide-value:
+"""
+
+COMPLETE_QUEST = (
+    update(Journal.__table__)
+    .where(Journal.character_id == bindparam("b_character_id"))
+    .where(Journal.npc_id == bindparam("b_npc_id"))
+    .where(Journal.completed == False)
+    .values(completed=True)
+    .returning(Journal.npc_id)
+)
+"""A statement that marks an active quest as completed and returns its npc id.
+
+    :meta hide-value:
+"""
+
+
+SELECT_INVENTORY = (
+    select(Inventory.item_id, Inventory.count)
+    .where(Inventory.character_id == bindparam("character_id"))
+    .order_by(Inventory.item_id)
+)
+"""A statement that selects the item ids and counts of the character's inventory.
+
+    :meta hide-value:
+"""
+
+SELECT_PACKED_INVENTORY = select(PackedInventory.data).where(
+    PackedInventory.character_id == bindparam("character_id")
+)
+"""A statement that selects the character's packed inventory.
+
+    :meta hide-value:
+"""
+
+_put_packed_inventory = insert(PackedInventory.__table__)
+PUT_PACKED_INVENTORY = _put_packed_inventory.on_conflict_do_update(
+    index_elements=["character_id"],
+    set_={"data": _put_packed_inventory.excluded.data},
+)
+"""A statement that inserts or replaces the character's packed inventory, executed with character_id and data.
+
+    :meta hide-value:
+"""
+
+
+class RowInventoryStore:
+    """A class that stores every stack of items of an inventory in its own row of the inventories table.
+
+    A change is a single statement on one row, loading the inventory reads a row per stack.
+    The methods take a connection or a session of the database that stores the character.
+    """
+
+    def load(self, conn, character_id):
+        """A method that returns the inventory of a character.
+
+        :param Connection conn: The database connection or session.
+        :param int character_id: The id of the character.
+
+        :returns:
+            dict: A dictionary of counts by item id, ordered by item id.
+        """
+        return dict(
+            conn.execute(SELECT_INVENTORY, {"character_id": character_id}).all()
+        )
+
+    def load_page(
+        self, conn, character_id, cursor, limit, usable=False, backward=False
+    ):
+        """A method that returns a page of the inventory of a character with a keyset query.
+
+        :param Connection conn: The database connection or session.
+        :param int character_id: The id of the character.
+        :param int cursor: The item id the page starts after, or ends before if backward is True.
+        :param int limit: The maximum number of stacks on the page.
+        :param bool usable: (optional) Whether the page is made of the usable items only. Defaults to False.
+        :param bool backward: (optional) Whether the page ends before the cursor. Defaults to False.
+
+        :returns:
+            list: A list of (item_id, count) tuples, ordered by item id.
+        """
+        query = select(Inventory.item_id, Inventory.count).where(
+            Inventory.character_id == character_id
+        )
+        if usable:
+            # joined rather than matched against the ids, so the query doesn't grow with the content
+            query = query.join(Item, Item.id == Inventory.item_id).where(Item.usable)
+        if backward:
+            query = query.where(Inventory.item_id < cursor).order_by(
+                Inventory.item_id.desc()
+            )
+        else:
+            query = query.where(Inventory.item_id > cursor).order_by(Inventory.item_id)
+        page = [tuple(row) for row in conn.execute(query.limit(limit))]
+        return page[::-1] if backward else page
+
+    def load_many(self, conn, ids):
+        """A method that returns the inventories of several characters.
+
+        :param Connection conn: The database connection or session.
+        :param list ids: The ids of the characters.
+
+        :returns:
+            dict: A dictionary of inventories, as returned by load, by character id. The characters without items are left out.
+        """
+        inventories = {}
+        for row in conn.execute(
+            select(Inventory.character_id, Inventory.item_id, Inventory.count)
+            .where(Inventory.character_id.in_(ids))
+            .order_by(Inventory.character_id, Inventory.item_id)
+        ):
+            inventories.setdefault(row.character_id, {})[row.item_id] = row.count
+        return inventories
+
+    def add(self, conn, character_id, item_id, count):
+        """A method that adds items to the inventory of a character with a single upsert.
+
+        :param Connection conn: The database connection or session.
+        :param int character_id: The id of the character.
+        :param int item_id: The id of the item.
+        :param int count: The number of items to add.
+
+        :returns:
+            int: The new number of the items.
+        """
+        return conn.execute(
+            ADD_ITEM,
+            {"character_id": character_id, "item_id": item_id, "count": count},
+        ).scalar_one()
+
+    def remove(self, conn, character_id, item_id, count):
+        """A method that removes items from the inventory of a character if there are enough of them.
+
+        :param Connection conn: The database connection or session.
+        :param int character_id: The id of the character.
+        :param int item_id: The id of the item.
+        :param int count: The number of items to remove.
+
+        :returns:
+            int: The number of the items left or None if there weren't enough of them.
+        """
+        params = {"b_character_id": character_id, "b_item_id": item_id}
+        remaining = conn.execute(
+            REMOVE_ITEM, {**params, "amount": count}
+        ).scalar_one_or_none()
+        if remaining == 0:
+            conn.execute(DELETE_EMPTY_ITEM, params)
+        return remaining
+
+    def replace(self, conn, character_id, items):
+        """A method that replaces the whole inventory of a character.
+
+        :param Connection conn: The database connection or session.
+        :param int character_id: The id of the character.
+        :param dict items: A dictionary of counts by item id.
+        """
+        conn.execute(
+            delete(Inventory.__table__).where(Inventory.character_id == character_id)
+        )
+        if items:
+            conn.execute(
+                insert(Inventory.__table__),
+                [
+                    {"character_id": character_id, "item_id": item_id, "count": count}
+                    for item_id, count in items.items()
+                ],
+            )
+
+    def delete(self, conn, ids):
+        """A method that deletes the inventories of several characters.
+
+        :param Connection conn: The database connection or session.
+        :param list ids: The ids of the characters.
+        """
+        conn.execute(delete(Inventory.__table__).where(Inventory.character_id.in_(ids)))
+
+    def character_ids(self, conn, after, limit):
+        """A method that returns the ids of the characters with a stored inventory in order.
+
+        :param Connection conn: The database connection or session.
+        :param int after: The id to start after or None to start from the first one.
+        :param int limit: The maximum number of ids.
+
+        :returns:
+            list: A list of character ids.
+        """
+        query = select(Inventory.character_id).distinct()
+        if after is not None:
+            query = query.where(Inventory.character_id > after)
+        return (
+            conn.execute(query.order_by(Inventory.character_id).limit(limit))
+            .scalars()
+            .all()
+        )
+
+    def rows(self, conn, first, last):
+        """A method that returns the inventories of a range of characters as rows of the inventories table.
+
+        :param Connection conn: The database connection or session.
+        :param int first: The id of the first character.
+        :param int last: The id of the last character.
+
+        :returns:
+            list: A list of (character_id, item_id, count) tuples, ordered by character and item id.
+        """
+        return conn.execute(
+            select(Inventory.character_id, Inventory.item_id, Inventory.count)
+            .where(Inventory.character_id.between(first, last))
+            .order_by(Inventory.character_id, Inventory.item_id)
+        ).all()
+
+
+class PackedInventoryStore(RowInventoryStore):
+    """A class that stores the whole inventory of a character in a single row of the packed_inventories table.
+
+    It has the same methods as RowInventoryStore. Loading the inventory reads one row whatever the number
+    of stacks, a change reads and rewrites the row.
+    """
+
+    def load(self, conn, character_id):
+        data = conn.execute(
+            SELECT_PACKED_INVENTORY, {"character_id": character_id}
+        ).scalar_one_or_none()
+        return unpack_inventory(data) if data else {}
+
+    def load_page(
+        self, conn, character_id, cursor, limit, usable=False, backward=False
+    ):
+        # the whole inventory is one row anyway, the page is cut from it
+        items = self.load(conn, character_id)
+        ids = list(items)
+        if backward:
+            ids = ids[: bisect_left(ids, cursor)][::-1]
+        else:
+            ids = ids[bisect_right(ids, cursor) :]
+        if usable:
+            world_items = get_world().items
+            ids = (item_id for item_id in ids if world_items[item_id].usable)
+        page = [(item_id, items[item_id]) for item_id in islice(ids, limit)]
+        return page[::-1] if backward else page
+
+    def load_many(self, conn, ids):
+        return {
+            row.character_id: unpack_inventory(row.data)
+            for row in conn.execute(
+                select(PackedInventory.__table__)
+                .where(PackedInventory.character_id.in_(ids))
+                .order_by(PackedInventory.character_id)
+            )
+        }
+
+    def _load_for_update(self, conn, character_id):
+        # the row is locked on PostgreSQL, SQLite already has one writer at a time
+        data = conn.execute(
+            SELECT_PACKED_INVENTORY.with_for_update(),
+            {"character_id": character_id},
+        ).scalar_one_or_none()
+        return unpack_inventory(data) if data else {}
+
+    def add(self, conn, character_id, item_id, count):
+        items = self._load_for_update(conn, character_id)
+        items[item_id] = items.get(item_id, 0) + count
+        self.replace(conn, character_id, items)
+        return items[item_id]
+
+    def remove(self, conn, character_id, item_id, count):
+        items = self._load_for_update(conn, character_id)
+        remaining = items.get(item_id, 0) - count
+        if item_id not in items or remaining < 0:
+            return None
+        if remaining:
+            items[item_id] = remaining
+        else:
+            del items[item_id]
+        self.replace(conn, character_id, items)
+        return remaining
+
+    def replace(self, conn, character_id, items):
+        if not items:
+            self.delete(conn, [character_id])
+            return
+        conn.execute(
+            PUT_PACKED_INVENTORY,
+            {"character_id": character_id, "data": pack_inventory(items)},
+        )
+
+    def delete(self, conn, ids):
+        conn.execute(
+            delete(PackedInventory.__table__).where(
+                PackedInventory.character_id.in_(ids)
+            )
+        )
+
+    def character_ids(self, conn, after, limit):
+        query = select(PackedInventory.character_id)
+        if after is not None:
+            query = query.where(PackedInventory.character_id > after)
+        return (
+            conn.execute(query.order_by(PackedInventory.character_id).limit(limit))
+            .scalars()
+            .all()
+        )
+
+    def rows(self, conn, first, last):
+        return [
+            (row.character_id, item_id, count)
+            for row in conn.execute(
+                select(PackedInventory.__table__)
+                .where(PackedInventory.character_id.between(first, last))
+                .order_by(PackedInventory.character_id)
+            )
+            for item_id, count in unpack_inventory(row.data).items()
+        ]
+
+
+def get_inventory_store(layout):
+    """A function that returns the store of the inventories in a layout.
+
+    :param str layout: The layout, "rows" or "packed".
+
+    :returns:
+        RowInventoryStore: The store.
+
+    :raises:
+        ValueError: If the layout is unknown.
+    """
+    if layout not in INVENTORY_LAYOUTS:
+        raise ValueError(
+            f"Unknown inventory layout {layout}, use one of {', '.join(INVENTORY_LAYOUTS)}"
+        )
+    return PackedInventoryStore() if layout == "packed" else RowInventoryStore()
+
+
+inventory_store = get_inventory_store(INVENTORY_LAYOUT)
+"""The store of the inventories in the layout set by INVENTORY_LAYOUT.
+
+    :meta hide-value:
+"""
 
 
 async def get_character(id):
     """A function that returns a character object by id.
 
+    An archived idle character is restored.
+
     :param int id: The id of the character.
 
     :returns:
         Protagonist: The character object or None if not found.
     """
-    with Session() as session:
-        return session.execute(
-            select(Protagonist).where(Protagonist.id == id)
-        ).scalar_one_or_none()
+    with player_session(id, read=True) as session:
+        character = session.execute(SELECT_CHARACTER, {"id": id}).scalar_one_or_none()
+    if character is None:
+        character = await restore_character(id)
+    return character
 
 
 async def create_character(id, name):
@@ -548,7 +1360,163 @@ async def create_character(id, name):
         Protagonist: The new character object.
     """
     new_character = Protagonist(id=id, name=name)
-    with Session() as session:
+    with player_session(id) as session:
+        session.expire_on_commit = False
         session.add(new_character)
+        session.flush()
+        inventory_store.replace(session, id, STARTING_INVENTORY)
+        record(session, EventType.CREATED, id, payload=name.encode())
+        update_ranking(session, id, name, new_character.level)
         session.commit()
     return new_character
+
+
+def utcnow():
+    """A function that returns the current UTC time without the timezone, as it's stored in the database.
+
+    :returns:
+        datetime: The current time.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _archived_row(row):
+    return {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in row.items()
+    }
+
+
+def archive_characters(session, ids, reason):
+    """A function that moves characters with their inventories and journals to the archive.
+
+    The archive entries are committed first and the characters are deleted in the caller's transaction,
+    so a failure in between leaves an extra archive entry rather than losing a character.
+
+    :param Session session: The session of the database that stores the characters.
+    :param list ids: The ids of the characters.
+    :param str reason: The reason of archiving, "idle" for the characters that are restored on return.
+
+    :returns:
+        int: The number of archived characters.
+    """
+    characters = session.execute(
+        select(Protagonist.__table__).where(Protagonist.id.in_(ids))
+    ).mappings()
+    entries = {
+        row["id"]: {"character": _archived_row(row), "inventory": [], "journal": []}
+        for row in characters
+    }
+    if not entries:
+        return 0
+    for character_id, items in inventory_store.load_many(session, ids).items():
+        entries[character_id]["inventory"] = [list(item) for item in items.items()]
+    for row in session.execute(
+        select(Journal.npc_id, Journal.completed, Journal.character_id).where(
+            Journal.character_id.in_(ids)
+        )
+    ):
+        entries[row.character_id]["journal"].append([row.npc_id, row.completed])
+    now = utcnow()
+    with archive_engine.begin() as archive:
+        archive.execute(
+            ArchivedCharacter.__table__.insert(),
+            [
+                {"character_id": id, "reason": reason, "archived_at": now, "data": data}
+                for id, data in entries.items()
+            ],
+        )
+    inventory_store.delete(session, ids)
+    session.execute(delete(Journal.__table__).where(Journal.character_id.in_(ids)))
+    session.execute(delete(Protagonist.__table__).where(Protagonist.id.in_(ids)))
+    for id in entries:
+        record(session, EventType.ARCHIVED, id)
+        update_ranking(session, id)
+    return len(entries)
+
+
+async def restore_character(id):
+    """A function that moves an idle character back from the archive.
+
+    :param int id: The id of the character.
+
+    :returns:
+        Protagonist: The restored character object or None if the character isn't archived.
+    """
+    with archive_engine.connect() as archive:
+        archived = archive.execute(SELECT_ARCHIVED, {"character_id": id}).first()
+    if archived is None:
+        return None
+    data = archived.data
+    with player_session(id) as session:
+        # only one of two concurrent restores inserts the character
+        restored = session.execute(
+            insert(Protagonist.__table__)
+            .values({**data["character"], "last_active": utcnow()})
+            .on_conflict_do_nothing(index_elements=["id"])
+        ).rowcount
+        if restored and data["inventory"]:
+            inventory_store.replace(session, id, dict(data["inventory"]))
+        if restored and data["journal"]:
+            session.execute(
+                insert(Journal.__table__),
+                [
+                    {"character_id": id, "npc_id": npc_id, "completed": completed}
+                    for npc_id, completed in data["journal"]
+                ],
+            )
+        if restored:
+            state = {
+                key: data["character"][key]
+                for key in ("name", "hp", "level", "location_id")
+            }
+            state["inventory"] = sorted(data["inventory"])
+            state["journal"] = sorted(data["journal"])
+            record(
+                session,
+                EventType.RESTORED,
+                id,
+                payload=json.dumps(state, separators=(",", ":")).encode(),
+            )
+        character = session.execute(SELECT_CHARACTER, {"id": id}).scalar_one()
+        update_ranking(session, id, character.name, character.level)
+        session.expire_on_commit = False
+        session.commit()
+    with archive_engine.begin() as archive:
+        archive.execute(
+            delete(ArchivedCharacter.__table__).where(
+                ArchivedCharacter.id == archived.id
+            )
+        )
+    return character
+
+
+def load_character_state(id):
+    """A function that returns the state of a character as it's stored in the event log snapshots.
+
+    :param int id: The id of the character.
+
+    :returns:
+        dict: The name, health, level, location, inventory and journal of the character or None if not found.
+    """
+    with player_session(id, read=True) as session:
+        character = session.execute(SELECT_CHARACTER, {"id": id}).scalar_one_or_none()
+        if character is None:
+            return None
+        return {
+            "name": character.name,
+            "hp": character.hp,
+            "level": character.level,
+            "location_id": character.location_id,
+            "inventory": [
+                list(item) for item in inventory_store.load(session, id).items()
+            ],
+            "journal": sorted(
+                [entry.npc_id, entry.completed] for entry in character.journal
+            ),
+        }
+
+
+for _session_factory in [Session] + [write for write, _ in shard_sessions]:
+    track_events(_session_factory, load_character_state)
+    track_ranking(_session_factory)
@@ -0,0 +1,442 @@
+import atexit
+import json
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from enum import IntEnum
+from typing import NamedTuple
+
+from config import EVENT_FLUSH_INTERVAL, EVENT_LOG_DIR, EVENT_SEGMENT_SIZE
+from sqlalchemy import event
+
+EVENT_LOG_MAGIC = b"TGEL"
+"""A constant that defines the first bytes of an event log segment."""
+
+EVENT_LOG_FORMAT = 1
+"""A constant that defines the version of the event log segment format."""
+
+EVENT_BATCH_SIZE = 256
+"""A constant that defines the number of buffered events that are written without waiting for the flush interval."""
+
+SNAPSHOT_INTERVAL = 100
+"""A constant that defines the number of events of a player between two snapshots of the player's state."""
+
+_HEADER = struct.Struct("<4sH")
+# every batch is a frame of its length and checksum, so a batch torn by a crash is detected
+_FRAME = struct.Struct("<II")
+# type, character id, time in ms, two arguments and the length of the payload that follows
+_RECORD = struct.Struct("<BqqiiH")
+
+
+class EventType(IntEnum):
+    """A class that represents the types of the player events.
+
+    The events that change the state carry the new values rather than the differences,
+    so applying an event twice gives the same state.
+    """
+
+    CREATED = 1
+    MOVED = 2
+    FOUGHT = 3
+    HP = 4
+    LEVEL = 5
+    ITEM = 6
+    USED = 7
+    QUEST_ACCEPTED = 8
+    QUEST_COMPLETED = 9
+    DIED = 10
+    SNAPSHOT = 11
+    ARCHIVED = 12
+    RESTORED = 13
+
+
+_FULL_STATE = (EventType.SNAPSHOT, EventType.RESTORED)
+
+
+class Event(NamedTuple):
+    """A class that represents an event of a player."""
+
+    type: EventType
+    character_id: int
+    time: int
+    a: int = 0
+    b: int = 0
+    payload: bytes = b""
+
+    def describe(self):
+        """A method that returns the description of the event for people."""
+        at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(self.time / 1000))
+        details = {
+            EventType.CREATED: lambda: f"created as {self.payload.decode()}",
+            EventType.MOVED: lambda: f"moved to location {self.a}",
+            EventType.FOUGHT: lambda: f"{'won' if self.b else 'lost'} against enemy {self.a}",
+            EventType.HP: lambda: f"health is {self.a}",
+            EventType.LEVEL: lambda: f"level is {self.a}",
+            EventType.ITEM: lambda: f"has {self.b} of item {self.a}",
+            EventType.USED: lambda: f"used item {self.a}",
+            EventType.QUEST_ACCEPTED: lambda: f"accepted the quest of NPC {self.a}",
+            EventType.QUEST_COMPLETED: lambda: f"completed the quest of NPC {self.a}",
+            EventType.DIED: lambda: "died",
+            EventType.SNAPSHOT: lambda: f"snapshot {self.payload.decode()}",
+            EventType.ARCHIVED: lambda: "archived",
+            EventType.RESTORED: lambda: f"restored as {self.payload.decode()}",
+        }[self.type]()
+        return f"{at} {details}"
+
+
+def encode_events(events):
+    """A function that encodes events into the records of a frame.
+
+    :param list events: A list of Event objects.
+
+    :returns:
+        bytes: The encoded records.
+    """
+    return b"".join(
+        _RECORD.pack(e.type, e.character_id, e.time, e.a, e.b, len(e.payload))
+        + e.payload
+        for e in events
+    )
+
+
+def read_segment(path, character_id=None):
+    """A function that reads the events of a segment up to the first damaged frame.
+
+    :param str path: The path of the segment file.
+    :param int character_id: (optional) The id of the character to read the events of. Defaults to all characters.
+
+    :returns:
+        list: A list of Event objects in the order they were written.
+
+    :raises:
+        ValueError: If the file is not an event log segment of the supported format.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if len(data) < _HEADER.size or _HEADER.unpack_from(data) != (
+        EVENT_LOG_MAGIC,
+        EVENT_LOG_FORMAT,
+    ):
+        raise ValueError(
+            f"'{path}' is not an event log segment of format {EVENT_LOG_FORMAT}"
+        )
+    events = []
+    offset = _HEADER.size
+    while offset + _FRAME.size <= len(data):
+        length, checksum = _FRAME.unpack_from(data, offset)
+        frame = data[offset + _FRAME.size : offset + _FRAME.size + length]
+        if len(frame) < length or zlib.crc32(frame) != checksum:
+            logging.warning(
+                f"'{path}' has a damaged frame at {offset}, the rest is skipped"
+            )
+            break
+        position = 0
+        while position < length:
+            type, owner, at, a, b, size = _RECORD.unpack_from(frame, position)
+            position += _RECORD.size + size
+            if character_id is None or owner == character_id:
+                payload = frame[position - size : position]
+                events.append(Event(EventType(type), owner, at, a, b, payload))
+        offset += _FRAME.size + length
+    return events
+
+
+def get_segments(directory=EVENT_LOG_DIR):
+    """A function that returns the segment files of the event log from the oldest to the newest.
+
+    :param str directory: (optional) The directory of the event log. Defaults to EVENT_LOG_DIR.
+
+    :returns:
+        list: A list of file paths.
+    """
+    if not directory or not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.endswith(".log")
+    ]
+
+
+class EventLog:
+    """A class that represents the append-only log of the player events.
+
+    The events are buffered and written in batches, by the thread that fills a batch or by a background
+    thread every EVENT_FLUSH_INTERVAL seconds. Every process writes its own segments, a segment is closed
+    and a new one is started once it's larger than EVENT_SEGMENT_SIZE.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = EVENT_SEGMENT_SIZE,
+        flush_interval: float = EVENT_FLUSH_INTERVAL,
+    ):
+        """A method that initializes the log.
+
+        :param str directory: The directory of the segment files.
+        :param int segment_size: (optional) The size in bytes after which a new segment is started. Defaults to EVENT_SEGMENT_SIZE.
+        :param float flush_interval: (optional) The number of seconds between the background writes. Defaults to EVENT_FLUSH_INTERVAL.
+        """
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.counts = Counter()
+        self.file = None
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.thread = None
+        self.pid = None
+
+    def append(self, events):
+        """A method that adds events to the buffer.
+
+        :param list events: A list of Event objects.
+        """
+        with self.lock:
+            self.buffer.extend(events)
+            full = len(self.buffer) >= EVENT_BATCH_SIZE
+            if self.pid != os.getpid():
+                # the process is started or forked, so it gets its own segment and flush thread
+                self.pid = os.getpid()
+                self.file = None
+                self.thread = threading.Thread(
+                    target=self._flush_periodically, daemon=True
+                )
+                self.thread.start()
+                atexit.register(self.flush)
+        if full:
+            self.flush()
+
+    def needs_snapshot(self, character_id):
+        """A method that counts an event of a player and returns whether it's time for a snapshot.
+
+        The first event of every player in a process is followed by a snapshot too, so the players who
+        started before the log get one, and the state can be rebuilt from the latest segments.
+
+        :param int character_id: The id of the character.
+
+        :returns:
+            bool: True if a snapshot has to be taken.
+        """
+        with self.lock:
+            count = self.counts[character_id]
+            self.counts[character_id] = count + 1
+        return count % SNAPSHOT_INTERVAL == 0
+
+    def flush(self):
+        """A method that writes the buffered events to the current segment as one frame."""
+        with self.write_lock:
+            with self.lock:
+                events, self.buffer = self.buffer, []
+            if not events:
+                return
+            frame = encode_events(events)
+            if self.file is None or self.file.tell() >= self.segment_size:
+                self._rotate()
+            self.file.write(_FRAME.pack(len(frame), zlib.crc32(frame)) + frame)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def _rotate(self):
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns():020d}-{os.getpid()}.log"
+        self.file = open(os.path.join(self.directory, name), "ab")
+        self.file.write(_HEADER.pack(EVENT_LOG_MAGIC, EVENT_LOG_FORMAT))
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Couldn't write the events: {e}")
+
+
+event_log = EventLog(EVENT_LOG_DIR) if EVENT_LOG_DIR else None
+"""The event log of the process or None if EVENT_LOG_DIR isn't set."""
+
+
+def record(session, type, character_id, a=0, b=0, payload=b""):
+    """A function that records an event of a player, it's written to the log only if the session commits.
+
+    :param Session session: The database session the change is made in.
+    :param EventType type: The type of the event.
+    :param int character_id: The id of the character.
+    :param int a: (optional) The first argument of the event. Defaults to 0.
+    :param int b: (optional) The second argument of the event. Defaults to 0.
+    :param bytes payload: (optional) The payload of the event. Defaults to b"".
+    """
+    if event_log is None:
+        return
+    session.info.setdefault("events", []).append(
+        Event(type, character_id, time.time_ns() // 1_000_000, a, b, payload)
+    )
+
+
+def track_events(session_factory, load_state):
+    """A function that makes the sessions of a factory write their recorded events to the log on commit.
+
+    :param sessionmaker session_factory: The session factory.
+    :param function load_state: The function that returns the state of a character for a snapshot.
+    """
+    if event_log is None:
+        return
+
+    @event.listens_for(session_factory, "after_commit")
+    def after_commit(session):
+        events = session.info.pop("events", None)
+        if not events:
+            return
+        now = events[-1].time
+        for character_id in dict.fromkeys(e.character_id for e in events):
+            died = any(
+                e.type == EventType.DIED and e.character_id == character_id
+                for e in events
+            )
+            if event_log.needs_snapshot(character_id) and not died:
+                state = load_state(character_id)
+                if state:
+                    payload = json.dumps(state, separators=(",", ":")).encode()
+                    events.append(
+                        Event(EventType.SNAPSHOT, character_id, now, payload=payload)
+                    )
+        event_log.append(events)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def after_rollback(session):
+        session.info.pop("events", None)
+
+
+def apply_event(state, e):
+    """A function that applies an event to the state of a character.
+
+    :param dict state: The state of the character or None if the character doesn't exist.
+    :param Event e: The event.
+
+    :returns:
+        dict: The new state or None if the character died or was archived.
+    """
+    # a restored character is recorded with its whole state, like a snapshot
+    if e.type in _FULL_STATE:
+        return json.loads(e.payload)
+    if e.type in (EventType.DIED, EventType.ARCHIVED):
+        return None
+    if state is None:
+        return None
+    if e.type == EventType.MOVED:
+        state["location_id"] = e.a
+    elif e.type == EventType.HP:
+        state["hp"] = e.a
+    elif e.type == EventType.LEVEL:
+        state["level"] = e.a
+    elif e.type == EventType.ITEM:
+        inventory = [item for item in state["inventory"] if item[0] != e.a]
+        if e.b > 0:
+            inventory.append([e.a, e.b])
+        state["inventory"] = sorted(inventory)
+    elif e.type == EventType.QUEST_ACCEPTED:
+        if e.a not in (npc_id for npc_id, _ in state["journal"]):
+            state["journal"] = sorted(state["journal"] + [[e.a, False]])
+    elif e.type == EventType.QUEST_COMPLETED:
+        state["journal"] = [
+            [npc_id, completed or npc_id == e.a]
+            for npc_id, completed in state["journal"]
+        ]
+    return state
+
+
+def get_history(character_id, directory=EVENT_LOG_DIR, since_snapshot=False):
+    """A function that returns the events of a player.
+
+    :param int character_id: The id of the character.
+    :param str directory: (optional) The directory of the event log. Defaults to EVENT_LOG_DIR.
+    :param bool since_snapshot: (optional) Whether to read the segments from the newest one back only until
+        a snapshot of the player is found. Defaults to False.
+
+    :returns:
+        list: A list of Event objects in the order they happened.
+    """
+    history = []
+    for path in reversed(get_segments(directory)):
+        events = read_segment(path, character_id)
+        history = events + history
+        if since_snapshot and any(e.type in _FULL_STATE for e in events):
+            break
+    # the segments of different processes overlap in time, a sort by time keeps the order within a segment
+    history.sort(key=lambda e: e.time)
+    if since_snapshot:
+        snapshots = [i for i, e in enumerate(history) if e.type in _FULL_STATE]
+        if snapshots:
+            history = history[snapshots[-1] :]
+    return history
+
+
+def rebuild_state(character_id, directory=EVENT_LOG_DIR):
+    """A function that rebuilds the state of a character from the latest snapshot and the events after it.
+
+    :param int character_id: The id of the character.
+    :param str directory: (optional) The directory of the event log. Defaults to EVENT_LOG_DIR.
+
+    :returns:
+        dict: The state of the character or None if the character is dead or has no snapshot.
+    """
+    state = None
+    for e in get_history(character_id, directory, since_snapshot=True):
+        state = apply_event(state, e)
+    return state
+
+
+def verify(directory=EVENT_LOG_DIR):
+    """A function that rebuilds the state of every player in the event log and compares it with the database.
+
+    :param str directory: (optional) The directory of the event log. Defaults to EVENT_LOG_DIR.
+
+    :returns:
+        tuple: A tuple of (the number of checked players, a list of the ids of the players whose state differs).
+    """
+    from db.db import load_character_state
+
+    states = {}
+    for path in get_segments(directory):
+        for e in read_segment(path):
+            states[e.character_id] = apply_event(states.get(e.character_id), e)
+    mismatches = [
+        character_id
+        for character_id, state in states.items()
+        if state != load_character_state(character_id)
+    ]
+    return len(states), mismatches
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    directory = EVENT_LOG_DIR or "events"
+    if len(sys.argv) > 2 and sys.argv[1] == "history":
+        for e in get_history(int(sys.argv[2]), directory):
+            print(e.describe())
+    elif len(sys.argv) > 1 and sys.argv[1] == "verify":
+        checked, mismatches = verify(directory)
+        print(
+            f"{checked} players rebuilt from the log, {len(mismatches)} differ from the database"
+        )
+        for character_id in mismatches:
+            print(f"    {character_id}")
+        sys.exit(1 if mismatches else 0)
+    else:
+        segments = get_segments(directory)
+        types = Counter(e.type.name for path in segments for e in read_segment(path))
+        size = sum(os.path.getsize(path) for path in segments)
+        print(
+            f"{len(segments)} segments, {size / 1024:.0f} KiB, {sum(types.values())} events"
+        )
+        for name, count in types.most_common():
+            print(f"    {name:<16}{count:>10}")
@@ -0,0 +1,236 @@
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+from config import EXPORT_DIR
+from sqlalchemy import select
+
+import db.db as db
+
+try:
+    import resource
+except ImportError:
+    # the resource module is Unix only, the memory isn't reported on Windows
+    resource = None
+
+EXPORT_BATCH_SIZE = 1000
+"""A constant that defines the number of characters exported in one read transaction."""
+
+EXPORT_FORMATS = ("jsonl", "csv")
+"""A constant that defines the formats the player data can be exported to."""
+
+EXPORT_TABLES = (
+    (db.Protagonist.__table__, db.Protagonist.id),
+    (db.Inventory.__table__, db.Inventory.character_id),
+    (db.Journal.__table__, db.Journal.character_id),
+)
+"""A constant that defines the exported tables with the column that holds the character id.
+
+    :meta hide-value:
+"""
+
+EXPORT_ARCHIVE = "archive"
+"""A constant that defines the name the archive database is saved under in the progress of the export."""
+
+EXPORT_STATE_FILE = "export.json"
+"""A constant that defines the name of the file in the export directory that the progress is saved to."""
+
+
+def get_export_engines():
+    """A function that returns the read engines of the databases with the player tables.
+
+    :returns:
+        list: A list of (name, Engine) tuples, the main database or every player shard.
+    """
+    if db.shard_engines:
+        return [
+            (os.path.basename(read.url.database), read) for _, read in db.shard_engines
+        ]
+    return [("main", db.read_engine)]
+
+
+def _begin_snapshot(conn):
+    # the three tables of a batch are read from one snapshot, so the inventories and journal
+    # entries match the characters, the sqlite3 module doesn't start a transaction for queries
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN")
+        return conn
+    return conn.execution_options(isolation_level="REPEATABLE READ")
+
+
+def _read_table(conn, table, character_id, first, last):
+    # the inventories are exported as rows in either layout, so the files don't depend on it
+    if table is db.Inventory.__table__:
+        return [column.name for column in table.columns], [
+            db.inventory_store.rows(conn, first, last)
+        ]
+    result = conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(
+        select(table)
+        .where(character_id.between(first, last))
+        .order_by(*table.primary_key.columns)
+    )
+    return list(result.keys()), result.partitions()
+
+
+def _encode(rows, columns, fmt):
+    buffer = io.StringIO()
+    if fmt == "csv":
+        csv.writer(buffer).writerows(rows)
+    else:
+        for row in rows:
+            buffer.write(json.dumps(dict(zip(columns, row)), default=str) + "\n")
+    return buffer.getvalue().encode()
+
+
+def _write_batch(file, rows, columns, fmt):
+    # every batch is a separate gzip member, so a partly written batch can be cut off
+    header = fmt == "csv" and file.tell() == 0
+    with gzip.GzipFile(fileobj=file, mode="wb") as member:
+        if header:
+            member.write(_encode([columns], columns, fmt))
+        member.write(_encode(rows, columns, fmt))
+
+
+def _load_state(path, fmt):
+    if not os.path.exists(path):
+        return {"format": fmt, "databases": {}, "files": {}}
+    with open(path) as file:
+        state = json.load(file)
+    if state["format"] != fmt:
+        raise ValueError(
+            f"The export in progress is in {state['format']}, finish it or start over"
+        )
+    return state
+
+
+def _save_state(path, state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(state, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def _save_progress(path, state, files, name, last_id):
+    for file in files.values():
+        file.flush()
+        os.fsync(file.fileno())
+    state["databases"][name] = last_id
+    state["files"] = {table_name: file.tell() for table_name, file in files.items()}
+    _save_state(path, state)
+
+
+def export_players(directory=EXPORT_DIR, fmt="jsonl", restart=False):
+    """A function that streams the characters, their inventories, journal entries and the archive to compressed files.
+
+    The characters are exported in batches of EXPORT_BATCH_SIZE ordered by id. Every batch is read in its
+    own short transaction on the read pool with a streaming cursor, so the memory stays bounded and the bot
+    keeps working, and every batch is appended to the files as a separate gzip member. After every batch
+    the last exported id and the sizes of the files are saved, so an interrupted export continues from
+    where it stopped, and the partly written batch is cut off. A finished export is started over.
+
+    :param str directory: (optional) The directory to write the files to. Defaults to EXPORT_DIR.
+    :param str fmt: (optional) The format of the files, "jsonl" or "csv". Defaults to "jsonl".
+    :param bool restart: (optional) Whether to start over instead of continuing the export. Defaults to False.
+
+    :returns:
+        dict: A dictionary of the number of rows exported in this run by table name.
+
+    :raises:
+        ValueError: If the format is unknown or differs from the one of the export in progress.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(
+            f"Unknown format {fmt}, use one of {', '.join(EXPORT_FORMATS)}"
+        )
+    os.makedirs(directory, exist_ok=True)
+    state_path = os.path.join(directory, EXPORT_STATE_FILE)
+    if restart and os.path.exists(state_path):
+        os.remove(state_path)
+    state = _load_state(state_path, fmt)
+
+    files = {}
+    tables = [table for table, _ in EXPORT_TABLES] + [db.ArchivedCharacter.__table__]
+    for table in tables:
+        path = os.path.join(directory, f"{table.name}.{fmt}.gz")
+        file = open(path, "ab")
+        file.truncate(state["files"].get(table.name, 0))
+        file.seek(0, os.SEEK_END)
+        files[table.name] = file
+    exported = {table.name: 0 for table in tables}
+    try:
+        for name, engine in get_export_engines():
+            last_id = state["databases"].get(name)
+            while True:
+                with engine.connect() as conn:
+                    conn = _begin_snapshot(conn)
+                    ids = select(db.Protagonist.id).order_by(db.Protagonist.id)
+                    if last_id is not None:
+                        ids = ids.where(db.Protagonist.id > last_id)
+                    ids = conn.execute(ids.limit(EXPORT_BATCH_SIZE)).scalars().all()
+                    if not ids:
+                        break
+                    for table, character_id in EXPORT_TABLES:
+                        columns, partitions = _read_table(
+                            conn, table, character_id, ids[0], ids[-1]
+                        )
+                        for rows in partitions:
+                            _write_batch(files[table.name], rows, columns, fmt)
+                            exported[table.name] += len(rows)
+                last_id = ids[-1]
+                _save_progress(state_path, state, files, name, last_id)
+        # the archived characters aren't in the player tables, their entries are exported as they are
+        archive = db.ArchivedCharacter.__table__
+        last_id = state["databases"].get(EXPORT_ARCHIVE, 0)
+        while True:
+            with db.archive_engine.connect() as conn:
+                result = conn.execute(
+                    select(archive)
+                    .where(archive.c.id > last_id)
+                    .order_by(archive.c.id)
+                    .limit(EXPORT_BATCH_SIZE)
+                )
+                columns, rows = list(result.keys()), result.all()
+            if not rows:
+                break
+            if fmt == "csv":
+                rows = [(*row[:-1], json.dumps(row.data)) for row in rows]
+            _write_batch(files[archive.name], rows, columns, fmt)
+            exported[archive.name] += len(rows)
+            last_id = rows[-1][0]
+            _save_progress(state_path, state, files, EXPORT_ARCHIVE, last_id)
+    finally:
+        for file in files.values():
+            file.close()
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return exported
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    fmt = "csv" if "--csv" in sys.argv else "jsonl"
+    started = time.perf_counter()
+    try:
+        exported = export_players(
+            args[0] if args else EXPORT_DIR, fmt, restart="--restart" in sys.argv
+        )
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+    for table, count in exported.items():
+        print(f"{table:<20}{count:>10} rows")
+    if resource:
+        print(
+            f"Exported in {elapsed:.2f} s, max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MiB"
+        )
+    else:
+        print(f"Exported in {elapsed:.2f} s")
@@ -0,0 +1,437 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from db.content import CONTENT_NAMES, START_LOCATION_ID
+from db.world import World
+
+GENERATE_SIZES = (1000, 10000, 30000)
+"""A constant that defines the numbers of locations of the worlds in the generator benchmark."""
+
+GENERATE_ITEMS_RATIO = 0.1
+"""A constant that defines the number of items per location of a generated world."""
+
+GENERATE_NPC_CHANCE = 0.5
+"""A constant that defines the chance of a location of a generated world to have an NPC."""
+
+GENERATE_QUEST_CHANCE = 0.3
+"""A constant that defines the chance of an NPC of a generated world to give a quest."""
+
+GENERATE_MAX_ENEMIES = 3
+"""A constant that defines the maximum number of enemies in a location of a generated world."""
+
+GENERATE_DIALOG_DEPTH = 8
+"""A constant that defines the number of stages of the main line of every dialog of a generated world."""
+
+BENCHMARK_USERS = 20
+"""A constant that defines the number of users whose updates are measured in the generator benchmark."""
+
+PATH_BENCHMARK_SIZES = (100, 1000, 2000)
+"""A constant that defines the numbers of locations of the generated graphs in the path benchmark."""
+
+PATH_BENCHMARK_DEGREE = 3
+"""A constant that defines the average number of directions of a location in the generated graphs."""
+
+PATH_BENCHMARK_DESTINATIONS = 100
+"""A constant that defines the number of destinations the paths are looked up to in the path benchmark, like the locations of the quests."""
+
+_PLACES = ("Forest", "Cave", "Village", "Ruins", "Swamp", "Tower", "Camp", "Valley")
+_ADJECTIVES = ("Dark", "Quiet", "Ancient", "Misty", "Burning", "Frozen", "Hidden")
+_CREATURES = ("Wolf", "Spider", "Goblin", "Skeleton", "Bandit", "Troll", "Wraith")
+_MATERIALS = ("Iron", "Silver", "Bone", "Crystal", "Oak", "Obsidian", "Golden")
+_THINGS = ("Dagger", "Ring", "Amulet", "Shield", "Pelt", "Fang", "Scroll", "Map")
+_NAMES = ("Ella", "Bran", "Mira", "Tovin", "Asha", "Gorrim", "Lysa", "Edric")
+_TRADES = ("healer", "smith", "hunter", "scout", "sage", "merchant", "guard")
+
+
+def generate_locations(count, degree=PATH_BENCHMARK_DEGREE, seed=0):
+    """A function that generates a random connected map of locations for benchmarks.
+
+    The locations form a ring with two-way directions, so every one can be reached, and random one-way
+    directions are added up to the average degree.
+
+    :param int count: The number of locations.
+    :param int degree: (optional) The average number of directions of a location. Defaults to PATH_BENCHMARK_DEGREE.
+    :param int seed: (optional) The seed of the random generator. Defaults to 0.
+
+    :returns:
+        list: A list of locations as they are stored in the content file.
+    """
+    rnd = random.Random(seed)
+    directions = {
+        id: {id % count + 1, (id - 2) % count + 1} - {id} for id in range(1, count + 1)
+    }
+    for id in directions:
+        while len(directions[id]) < min(degree, count - 1):
+            directions[id].add(rnd.randint(1, count))
+            directions[id].discard(id)
+    return [
+        {
+            "id": id,
+            "name": f"Location {id}",
+            "description": "",
+            "directions": sorted(directions[id]),
+        }
+        for id in directions
+    ]
+
+
+def _get_distances(locations):
+    distances = {START_LOCATION_ID: 0}
+    directions = {location["id"]: location["directions"] for location in locations}
+    queue = [START_LOCATION_ID]
+    for location_id in queue:
+        for direction in directions[location_id]:
+            if direction not in distances:
+                distances[direction] = distances[location_id] + 1
+                queue.append(direction)
+    return distances
+
+
+def _generate_dialog(npc_id, name, depth):
+    # the main line goes through every stage, and every stage has a side question that leads back to it
+    dialogs = []
+    for stage in range(1, depth + 1):
+        next_stage = stage + 1 if stage < depth else None
+        dialogs.append(
+            {
+                "npc_id": npc_id,
+                "stage_id": stage,
+                "npc_text": f"{name} tells you the part {stage} of the story.",
+                "responses": [
+                    {"text": "Go on.", "next_stage_id": next_stage},
+                    {"text": "What do you mean?", "next_stage_id": depth + stage},
+                ],
+            }
+        )
+        dialogs.append(
+            {
+                "npc_id": npc_id,
+                "stage_id": depth + stage,
+                "npc_text": f"{name} explains the part {stage} again.",
+                "responses": [{"text": "I see.", "next_stage_id": stage}],
+            }
+        )
+    return dialogs
+
+
+def generate_world(
+    locations,
+    seed=0,
+    dialog_depth=GENERATE_DIALOG_DEPTH,
+):
+    """A function that generates a world with the given number of locations in the format of the content files.
+
+    The locations form a connected map reachable from the start location. The enemies get stronger with the
+    distance from the start and drop the items the quests of the NPCs nearby ask for. The same seed always
+    generates the same world.
+
+    :param int locations: The number of locations.
+    :param int seed: (optional) The seed of the random generator. Defaults to 0.
+    :param int dialog_depth: (optional) The number of stages of the main line of every dialog. Defaults to GENERATE_DIALOG_DEPTH.
+
+    :returns:
+        dict: A dictionary of the data of each content file by its name.
+    """
+    rnd = random.Random(seed)
+    content = {name: [] for name in CONTENT_NAMES}
+
+    content["locations"] = generate_locations(locations, seed=seed)
+    for location in content["locations"]:
+        place = f"{rnd.choice(_ADJECTIVES)} {rnd.choice(_PLACES)}"
+        location["name"] = f"{place} {location['id']}"
+        location["description"] = f"A {place.lower()} far from home."
+    distances = _get_distances(content["locations"])
+
+    # the first two items are the ones every character starts with
+    content["items"] = [
+        {"id": 1, "name": "🗡️ Rusty Sword", "usable": False},
+        {"id": 2, "name": "🧪 Potion of Health", "usable": True},
+    ]
+    for item_id in range(3, max(int(locations * GENERATE_ITEMS_RATIO), 10) + 1):
+        content["items"].append(
+            {
+                "id": item_id,
+                "name": f"{rnd.choice(_MATERIALS)} {rnd.choice(_THINGS)} {item_id}",
+                "usable": False,
+            }
+        )
+    loot_ids = [item["id"] for item in content["items"][2:]]
+
+    loot_by_distance = defaultdict(list)
+    for location in content["locations"]:
+        distance = distances[location["id"]]
+        for _ in range(rnd.randint(0, GENERATE_MAX_ENEMIES)):
+            enemy = {
+                "id": len(content["enemies"]) + 1,
+                "name": f"{rnd.choice(_ADJECTIVES)} {rnd.choice(_CREATURES)}",
+                "location_id": location["id"],
+                "level": 1 + distance + rnd.randint(0, 2),
+                "loot_id": rnd.choice(loot_ids) if rnd.random() < 0.7 else None,
+            }
+            content["enemies"].append(enemy)
+            if enemy["loot_id"]:
+                loot_by_distance[distance].append(enemy["loot_id"])
+
+        if location["id"] != START_LOCATION_ID and rnd.random() > GENERATE_NPC_CHANCE:
+            continue
+        npc_id = len(content["npcs"]) + 1
+        name = f"{rnd.choice(_NAMES)}, the {rnd.choice(_TRADES)} {npc_id}"
+        content["npcs"].append(
+            {"id": npc_id, "name": name, "location_id": location["id"]}
+        )
+        content["dialogs"].extend(_generate_dialog(npc_id, name, dialog_depth))
+        if rnd.random() < GENERATE_QUEST_CHANCE:
+            nearby = loot_by_distance.get(distance) or loot_ids
+            content["quests"].append(
+                {
+                    "npc_id": npc_id,
+                    "task": f"Bring me what the creatures around the {location['name']} carry.",
+                    "required_level": 1 + distance,
+                    "required_item_id": rnd.choice(nearby),
+                    "required_count": rnd.randint(1, 3),
+                    "reward_item_id": rnd.choice(loot_ids),
+                    "reward_count": 1,
+                }
+            )
+    return content
+
+
+def write_world(content, directory):
+    """A function that writes a world to the content files in a directory.
+
+    :param dict content: The data of each content file by its name.
+    :param str directory: The directory, it's created if it doesn't exist.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name in CONTENT_NAMES:
+        with open(os.path.join(directory, f"{name}.json"), "w") as file:
+            json.dump(content[name], file, ensure_ascii=False)
+
+
+def _pick_actions(content):
+    # the users travel to a location with an NPC and enemies and press everything there
+    npcs = {npc["location_id"]: npc["id"] for npc in content["npcs"]}
+    enemies = {enemy["location_id"] for enemy in content["enemies"]}
+    location_id = max(
+        (location_id for location_id in npcs if location_id in enemies),
+        key=lambda location_id: (location_id * 7919) % len(content["locations"]),
+        default=START_LOCATION_ID,
+    )
+    npc_id = npcs.get(location_id, 1)
+    return (
+        "get_location",
+        "change_location",
+        f"travel:{location_id}",
+        "get_npcs",
+        f"interact_with_npc:{npc_id}",
+        f"npc_dialog:{npc_id}:1",
+        f"npc_dialog:{npc_id}:2",
+        f"npc_quest:{npc_id}",
+        "get_enemies",
+        "get_quests",
+        "get_inventory",
+        "get_stats",
+    )
+
+
+async def _measure_handlers(actions, users):
+    from aiogram import types
+
+    from api.workers import NullSession, make_benchmark_updates
+    from bot import bot, dp
+    from bot.handlers import router
+
+    dp.include_router(router)
+    bot.session = NullSession()
+    latencies = defaultdict(list)
+    for update in make_benchmark_updates(users, actions):
+        query = update.get("callback_query")
+        action = query["data"].split(":")[0] if query else "message"
+        started = time.perf_counter()
+        await dp.feed_update(bot, types.Update(**update))
+        latencies[action].append((time.perf_counter() - started) * 1000)
+    return {action: statistics.median(values) for action, values in latencies.items()}
+
+
+def measure(users=BENCHMARK_USERS):
+    """A function that measures the loading time and the handler latency with the world in CONTENT_DIR.
+
+    It has to run in a new process with CONTENT_DIR and GAME_DB_PATH pointing to the world and an empty database.
+
+    :param int users: (optional) The number of users whose updates are measured. Defaults to BENCHMARK_USERS.
+
+    :returns:
+        dict: The time to load the content into the database and to build the world snapshot in s,
+        and the median latency of every handler in ms.
+    """
+    import bot.kb  # noqa: F401, registers the keyboards built with the snapshot
+    from db.content import read_content
+    from db.utils import check_db
+    from db.world import reload_world
+
+    started = time.perf_counter()
+    check_db()
+    loaded = time.perf_counter()
+    asyncio.run(reload_world())
+    built = time.perf_counter()
+    content = {name: data for name, (_, data) in read_content().items()}
+    handlers = asyncio.run(_measure_handlers(_pick_actions(content), users))
+    return {"load": loaded - started, "build": built - loaded, "handlers": handlers}
+
+
+def benchmark(sizes=GENERATE_SIZES, seed=0):
+    """A function that generates worlds of growing size and measures every one in a new process.
+
+    :param tuple sizes: (optional) The numbers of locations. Defaults to GENERATE_SIZES.
+    :param int seed: (optional) The seed of the worlds. Defaults to 0.
+
+    :returns:
+        list: A list of (number of locations, number of content rows, result of measure) tuples.
+    """
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            content = generate_world(size, seed)
+            write_world(content, directory)
+            env = {
+                **os.environ,
+                "CONTENT_DIR": directory,
+                "GAME_DB_PATH": os.path.join(directory, "game.db"),
+                "EVENT_LOG_DIR": os.path.join(directory, "events"),
+                "DB_URL": "",
+                "WORLD_SNAPSHOT_PATH": "",
+                "PLAYER_SHARDS": "0",
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "db.generate", "--measure"],
+                env=env,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            rows = sum(len(data) for data in content.values())
+            results.append((size, rows, json.loads(output.splitlines()[-1])))
+    return results
+
+
+def _bfs_path(locations, from_id, to_id):
+    parents = {from_id: None}
+    queue = [from_id]
+    for location_id in queue:
+        if location_id == to_id:
+            break
+        for direction in locations[location_id].directions:
+            if direction not in parents:
+                parents[direction] = location_id
+                queue.append(direction)
+    path = []
+    while to_id != from_id:
+        path.append(to_id)
+        to_id = parents[to_id]
+    return path[::-1]
+
+
+def benchmark_paths(sizes=PATH_BENCHMARK_SIZES, lookups=1000):
+    """A function that measures the shortest path table on generated maps against a search on every request.
+
+    The paths are looked up from random locations to PATH_BENCHMARK_DESTINATIONS destinations, so in the maps
+    bigger than PATH_TABLE_MAX_LOCATIONS the first lookup of every destination computes its paths.
+
+    :param tuple sizes: (optional) The numbers of locations. Defaults to PATH_BENCHMARK_SIZES.
+    :param int lookups: (optional) The number of random paths looked up. Defaults to 1000.
+
+    :returns:
+        list: A list of dictionaries with the number of locations, the build time in ms, the table size
+        in bytes, the median path length and the median lookup time in µs with the table and with a search.
+    """
+    results = []
+    for count in sizes:
+        content = {
+            name: [] for name in ("items", "npcs", "enemies", "quests", "dialogs")
+        }
+        content["locations"] = generate_locations(count)
+        started = time.perf_counter()
+        world = World(content, "benchmark")
+        build = time.perf_counter() - started
+        rnd = random.Random(count)
+        destinations = rnd.sample(
+            range(1, count + 1), min(count, PATH_BENCHMARK_DESTINATIONS)
+        )
+        pairs = [
+            (rnd.randint(1, count), rnd.choice(destinations)) for _ in range(lookups)
+        ]
+        table, search, lengths = [], [], []
+        for from_id, to_id in pairs:
+            started = time.perf_counter()
+            path = world.get_path(from_id, to_id)
+            table.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            searched = _bfs_path(world.locations, from_id, to_id)
+            search.append(time.perf_counter() - started)
+            if len(path) != len(searched):
+                raise ValueError(f"Path from {from_id} to {to_id} isn't the shortest")
+            lengths.append(len(path))
+        results.append(
+            {
+                "locations": count,
+                "build": build * 1000,
+                "size": world.paths.get_size(),
+                "length": statistics.median(lengths),
+                "table": statistics.median(table) * 1e6,
+                "search": statistics.median(search) * 1e6,
+            }
+        )
+    return results
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    if "--measure" in sys.argv:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(measure()))
+    elif "--paths" in sys.argv:
+        sizes = tuple(int(arg) for arg in args) or PATH_BENCHMARK_SIZES
+        print(
+            f"{'locations':>10}{'build ms':>10}{'table KiB':>11}{'hops':>6}"
+            f"{'table µs':>10}{'search µs':>11}"
+        )
+        for result in benchmark_paths(sizes):
+            print(
+                f"{result['locations']:>10}{result['build']:>10.0f}"
+                f"{result['size'] / 1024:>11.0f}{result['length']:>6.0f}"
+                f"{result['table']:>10.1f}{result['search']:>11.1f}"
+            )
+    elif "--bench" in sys.argv:
+        results = benchmark(tuple(int(arg) for arg in args) or GENERATE_SIZES)
+        actions = list(results[0][2]["handlers"])
+        print(
+            f"{'locations':>10}{'rows':>9}{'load s':>8}{'build s':>9}  "
+            + "  ".join(f"{action:>{max(len(action), 6)}}" for action in actions)
+        )
+        for size, rows, result in results:
+            print(
+                f"{size:>10}{rows:>9}{result['load']:>8.1f}{result['build']:>9.2f}  "
+                + "  ".join(
+                    f"{result['handlers'][action]:>{max(len(action), 6)}.2f}"
+                    for action in actions
+                )
+            )
+        print("handler latency is the median in ms")
+    else:
+        locations = int(args[0]) if args else GENERATE_SIZES[0]
+        seed = int(args[1]) if len(args) > 1 else 0
+        directory = args[2] if len(args) > 2 else "generated"
+        write_world(generate_world(locations, seed), directory)
+        print(
+            f"A world of {locations} locations is written to {directory}, "
+            f"run the bot with CONTENT_DIR={directory}"
+        )
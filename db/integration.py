@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import sys
+
+from sqlalchemy import func, select
+
+import db.db as db
+from db.content import read_content
+from db.load_all import CONTENT_LOADERS, load_all
+from db.migrations import migrate_all
+
+INTEGRATION_CHARACTER_ID = 2**40 + 1
+"""A constant that defines the id of the character created by the integration check.
+
+    It doesn't fit into a 32-bit integer, like the ids of many telegram users.
+"""
+
+
+class Checker:
+    """A class that collects the results of the integration checks."""
+
+    def __init__(self):
+        """A method that initializes the checker."""
+        self.failures = []
+
+    def check(self, name, ok):
+        """A method that records and prints the result of a check.
+
+        :param str name: The name of the check.
+        :param bool ok: Whether the check passed.
+        """
+        print(f"{'ok' if ok else 'FAIL':<6}{name}")
+        if not ok:
+            self.failures.append(name)
+
+
+def check_schema_and_content(checker):
+    """A function that checks the migrations and the content loader on the configured database.
+
+    :param Checker checker: The checker to record the results in.
+    """
+    migrate_all()
+    for url, pending in migrate_all(dry_run=True).items():
+        checker.check(f"migrations are applied to {url}", pending == [])
+    load_all(force=True)
+    expected = {}
+    for name, (_, data) in read_content().items():
+        for table, rows in CONTENT_LOADERS[name](data).items():
+            expected[table] = len(rows)
+    with db.engine.connect() as conn:
+        for table, count in expected.items():
+            stored = conn.execute(select(func.count()).select_from(table)).scalar()
+            checker.check(f"{table.name} has {count} rows", stored == count)
+
+
+async def check_character(checker, world):
+    """A function that runs the character operations on the configured database and checks their results.
+
+    :param Checker checker: The checker to record the results in.
+    :param World world: The world snapshot to take the NPCs and enemies from.
+    """
+    old = await db.get_character(INTEGRATION_CHARACTER_ID)
+    if old:
+        await old.die()
+    await db.create_character(INTEGRATION_CHARACTER_ID, "integration")
+    character = await db.get_character(INTEGRATION_CHARACTER_ID)
+    checker.check("character is created", character is not None)
+    checker.check("starting inventory", len(await character.get_inventory()) == 2)
+    location = await character.whereami()
+    checker.check("character is in the start location", location.id == 1)
+
+    quest = next(iter(world.quests.values()))
+    npc = world.npcs[quest.npc_id]
+    await character.accept_npc_quest(npc)
+    await character.accept_npc_quest(npc)
+    checker.check(
+        "quest is accepted once", len(await character.get_active_quests()) == 1
+    )
+    _, journal = await character.get_npc_quest(npc)
+    checker.check("journal entry is found", journal and not journal.completed)
+    checker.check(
+        "quest isn't completed without items",
+        not await character.complete_npc_quest(npc),
+    )
+    with db.player_session(character.id) as session:
+        session.expire_on_commit = False
+        session.add(character)
+        await character.add_item(session, quest.required_item_id, quest.required_count)
+        session.commit()
+    checker.check("quest is completed", await character.complete_npc_quest(npc))
+    checker.check(
+        "quest isn't completed twice", not await character.complete_npc_quest(npc)
+    )
+    checker.check("no active quests left", not await character.get_active_quests())
+
+    hp = character.hp
+    usable = await character.get_usable_inventory()
+    await character.use_item(usable[0].item_id)
+    checker.check("potion heals", character.hp == hp + 1)
+
+    enemy = next(enemy for enemy in world.enemies.values() if enemy.loot_id)
+    level, hp = character.level, character.hp
+    win, _ = await character.attack(enemy)
+    checker.check(
+        "attack changes level or health",
+        (character.level, character.hp)
+        == ((level + 1, hp) if win else (level, hp - 1)),
+    )
+
+    inventory = await character.get_inventory()
+    with db.player_session(character.id) as session:
+        db.archive_characters(session, [character.id], "idle")
+        session.commit()
+    with db.player_session(character.id, read=True) as session:
+        stored = session.execute(
+            db.SELECT_CHARACTER, {"id": character.id}
+        ).scalar_one_or_none()
+    checker.check("character is archived", stored is None)
+    character = await db.get_character(INTEGRATION_CHARACTER_ID)
+    checker.check(
+        "archived character is restored",
+        character is not None and await character.get_inventory() == inventory,
+    )
+
+    direction = world.get_directions(character.location_id)[0]
+    await character.go(direction.id)
+    character = await db.get_character(INTEGRATION_CHARACTER_ID)
+    checker.check("character moves", character.location_id == direction.id)
+
+    await character.die()
+    checker.check(
+        "character is deleted",
+        await db.get_character(INTEGRATION_CHARACTER_ID) is None,
+    )
+
+
+def run_checks():
+    """A function that runs all integration checks on the configured database.
+
+    :returns:
+        list: A list of the names of the failed checks.
+    """
+    from db.world import build_world
+
+    checker = Checker()
+    check_schema_and_content(checker)
+    asyncio.run(check_character(checker, build_world()))
+    return checker.failures
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    print(f"Database: {db.engine.url.render_as_string(hide_password=True)}")
+    failures = run_checks()
+    if failures:
+        print(f"{len(failures)} checks failed")
+        sys.exit(1)
+    print("All checks passed")
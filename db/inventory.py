@@ -0,0 +1,203 @@
+import logging
+import os
+import sys
+import tempfile
+from array import array
+
+from config import INVENTORY_LAYOUT
+import db.bench as bench
+
+INVENTORY_LAYOUTS = ("rows", "packed")
+"""A constant that defines the layouts the inventories can be stored in."""
+
+BENCHMARK_SIZES = (10, 100, 1000)
+"""A constant that defines the numbers of distinct items in the inventory benchmark."""
+
+BENCHMARK_REPEATS = 200
+"""A constant that defines how many times every operation is measured in the inventory benchmark."""
+
+CONVERT_BATCH_SIZE = 500
+"""A constant that defines the number of characters converted to another inventory layout in one transaction."""
+
+
+def pack_inventory(items):
+    """A function that packs an inventory into bytes, pairs of 32-bit item ids and counts ordered by item id.
+
+    :param dict items: A dictionary of counts by item id.
+
+    :returns:
+        bytes: The packed inventory.
+    """
+    packed = array("i")
+    for item_id in sorted(items):
+        packed.append(item_id)
+        packed.append(items[item_id])
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_inventory(data):
+    """A function that unpacks an inventory packed by pack_inventory.
+
+    :param bytes data: The packed inventory.
+
+    :returns:
+        dict: A dictionary of counts by item id, ordered by item id.
+    """
+    packed = array("i")
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return dict(zip(packed[::2], packed[1::2]))
+
+
+def convert(layout=INVENTORY_LAYOUT):
+    """A function that moves the inventories stored in the other layout to the given one in batches.
+
+    :param str layout: (optional) The layout to move the inventories to. Defaults to INVENTORY_LAYOUT.
+
+    :returns:
+        int: The number of converted characters.
+    """
+    import db.db as db
+    from db.maintenance import get_player_engines
+
+    target = db.get_inventory_store(layout)
+    source = db.get_inventory_store(
+        next(name for name in INVENTORY_LAYOUTS if name != layout)
+    )
+    converted = 0
+    for engine, _ in get_player_engines():
+        last_id = None
+        while True:
+            with engine.begin() as conn:
+                ids = source.character_ids(conn, last_id, CONVERT_BATCH_SIZE)
+                if not ids:
+                    break
+                for character_id, items in source.load_many(conn, ids).items():
+                    target.replace(conn, character_id, items)
+                source.delete(conn, ids)
+            converted += len(ids)
+            last_id = ids[-1]
+    return converted
+
+
+def check_layout(layout=INVENTORY_LAYOUT):
+    """A function that refuses to run with inventories left in the layout other than the given one.
+
+    The bot reads only the inventories in its layout, so the players with the others would find them empty.
+
+    :param str layout: (optional) The layout the bot runs with. Defaults to INVENTORY_LAYOUT.
+
+    :raises:
+        ValueError: If some inventories are stored in the other layout.
+    """
+    import db.db as db
+    from db.maintenance import get_player_engines
+
+    other = next(name for name in INVENTORY_LAYOUTS if name != layout)
+    source = db.get_inventory_store(other)
+    for _, read_engine in get_player_engines():
+        with read_engine.connect() as conn:
+            if source.character_ids(conn, None, 1):
+                raise ValueError(
+                    f"Some inventories are stored in the {other} layout, but INVENTORY_LAYOUT is {layout}, "
+                    f"move them with `python -m db.inventory convert` first"
+                )
+
+
+def _measure(operation):
+    return bench.measure(operation, BENCHMARK_REPEATS)
+
+
+def benchmark(sizes=BENCHMARK_SIZES):
+    """A function that compares the latency of the inventory operations in both layouts on a scratch database.
+
+    Every layout is measured on a character with the given number of distinct items, the item names are
+    taken from memory as the bot takes them from the world snapshot. Loading the rows with the ORM and
+    the names joined from the items table, as the bot did before the stores, is measured as the baseline.
+
+    :param tuple sizes: (optional) The numbers of distinct items. Defaults to BENCHMARK_SIZES.
+
+    :returns:
+        list: A list of (layout, size, load µs, add µs, remove µs) tuples, the medians of BENCHMARK_REPEATS runs.
+    """
+    from sqlalchemy import create_engine, insert, select
+    from sqlalchemy.orm import sessionmaker
+
+    import db.db as db
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine("sqlite:///" + os.path.join(tmp_dir, "inventory.db"))
+        db.Base.metadata.create_all(engine)
+        items = {
+            id: db.WorldItem(id, f"item{id}", id % 3 == 0)
+            for id in range(1, max(sizes) + 2)
+        }
+        with engine.begin() as conn:
+            conn.execute(
+                insert(db.Item.__table__), [item._asdict() for item in items.values()]
+            )
+        for size in sizes:
+            character_id = size
+            inventory = {id: 1 for id in range(1, size + 1)}
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(db.Protagonist.__table__),
+                    {"id": character_id, "name": "bench", "hp": 10, "level": 1},
+                )
+            for layout in INVENTORY_LAYOUTS:
+                store = db.get_inventory_store(layout)
+                with engine.begin() as conn:
+                    store.replace(conn, character_id, inventory)
+                with engine.connect() as conn:
+
+                    def load():
+                        return [
+                            (items[id].name, count)
+                            for id, count in store.load(conn, character_id).items()
+                        ]
+
+                    def add():
+                        store.add(conn, character_id, size + 1, 1)
+
+                    def remove():
+                        store.remove(conn, character_id, size + 1, 1)
+
+                    results.append(
+                        (layout, size, _measure(load), _measure(add), _measure(remove))
+                    )
+                    conn.rollback()
+                if layout == "rows":
+                    Session = sessionmaker(bind=engine)
+                    query = select(db.Inventory).where(
+                        db.Inventory.character_id == character_id
+                    )
+
+                    def load_orm():
+                        with Session() as session:
+                            return [
+                                (item.item.name, item.count)
+                                for item in session.execute(query).scalars()
+                            ]
+
+                    results.append(("rows, orm", size, _measure(load_orm), None, None))
+                with engine.begin() as conn:
+                    store.delete(conn, [character_id])
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "convert":
+        layout = sys.argv[2] if len(sys.argv) > 2 else INVENTORY_LAYOUT
+        print(f"{convert(layout)} inventories are moved to the {layout} layout")
+        sys.exit(0)
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or BENCHMARK_SIZES
+    print(f"{'layout':<12}{'items':>8}{'load µs':>10}{'add µs':>10}{'remove µs':>11}")
+    for layout, size, load, add, remove in benchmark(sizes):
+        add = f"{add:>10.0f}" if add is not None else f"{'':>10}"
+        remove = f"{remove:>11.0f}" if remove is not None else f"{'':>11}"
+        print(f"{layout:<12}{size:>8}{load:>10.0f}{add}{remove}")
@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from config import LEADERBOARD_SIZE
+from sqlalchemy import event, select
+import db.bench as bench
+
+BENCHMARK_PLAYERS = (1000, 10000, 100000)
+"""A constant that defines the numbers of characters in the leaderboard benchmark."""
+
+BENCHMARK_REPEATS = 200
+"""A constant that defines how many times every operation is measured in the leaderboard benchmark."""
+
+
+class Leaderboard:
+    """A class that represents the ranking of the characters by level.
+
+    A Fenwick tree keeps the number of characters at every level, so the rank of a character,
+    one more than the number of characters above its level, and the next occupied level below
+    a level are found in logarithmic time of the highest level. The characters of a level share
+    its rank and are listed in the order they reached it.
+    """
+
+    def __init__(self):
+        """A method that initializes an empty leaderboard."""
+        self.size = 64
+        self.tree = [0] * (self.size + 1)
+        self.levels = {}
+        self.players = {}
+
+    def __len__(self):
+        return len(self.players)
+
+    def _add(self, level, delta):
+        if level > self.size:
+            self._grow(level)
+        while level <= self.size:
+            self.tree[level] += delta
+            level += level & -level
+
+    def _grow(self, level):
+        # the size stays a power of two for _find, the tree is built again for the new size
+        while self.size < level:
+            self.size *= 2
+        self.tree = [0] * (self.size + 1)
+        for occupied, names in self.levels.items():
+            index = occupied
+            while index <= self.size:
+                self.tree[index] += len(names)
+                index += index & -index
+
+    def _count_up_to(self, level):
+        count = 0
+        level = min(level, self.size)
+        while level > 0:
+            count += self.tree[level]
+            level -= level & -level
+        return count
+
+    def _find(self, count):
+        # the lowest level with at least count characters at or below it
+        level, step = 0, self.size
+        while step:
+            if level + step <= self.size and self.tree[level + step] < count:
+                level += step
+                count -= self.tree[level]
+            step //= 2
+        return level + 1
+
+    def set(self, character_id, name, level):
+        """A method that adds a character or moves it to a new level.
+
+        :param int character_id: The id of the character.
+        :param str name: The name of the character.
+        :param int level: The level of the character, at least 1.
+        """
+        previous = self.players.get(character_id)
+        if previous == level:
+            self.levels[level][character_id] = name
+            return
+        if previous is not None:
+            self.remove(character_id)
+        # the tree is grown before the character is added to the level it's rebuilt from
+        self._add(level, 1)
+        self.players[character_id] = level
+        self.levels.setdefault(level, {})[character_id] = name
+
+    def remove(self, character_id):
+        """A method that removes a character if it's on the leaderboard.
+
+        :param int character_id: The id of the character.
+        """
+        level = self.players.pop(character_id, None)
+        if level is None:
+            return
+        names = self.levels[level]
+        del names[character_id]
+        if not names:
+            del self.levels[level]
+        self._add(level, -1)
+
+    def get_rank(self, character_id):
+        """A method that returns the rank of a character.
+
+        :param int character_id: The id of the character.
+
+        :returns:
+            int: The rank from 1 or None if the character isn't on the leaderboard.
+        """
+        level = self.players.get(character_id)
+        if level is None:
+            return None
+        return len(self.players) - self._count_up_to(level) + 1
+
+    def get_top(self, count=LEADERBOARD_SIZE):
+        """A method that returns the characters with the highest levels.
+
+        Every occupied level is found with one search of the tree, so the time depends on the number
+        of returned characters and not on the number of characters on the leaderboard.
+
+        :param int count: (optional) The maximum number of characters. Defaults to LEADERBOARD_SIZE.
+
+        :returns:
+            list: A list of (rank, character_id, name, level) tuples from the highest level.
+        """
+        top = []
+        remaining = len(self.players)
+        while remaining and len(top) < count:
+            level = self._find(remaining)
+            rank = len(self.players) - remaining + 1
+            for character_id, name in self.levels[level].items():
+                top.append((rank, character_id, name, level))
+                if len(top) == count:
+                    break
+            remaining -= len(self.levels[level])
+        return top
+
+
+_leaderboard = None
+
+
+def load_leaderboard():
+    """A function that builds the leaderboard from the characters in the database and swaps it in.
+
+    :returns:
+        Leaderboard: The new leaderboard.
+    """
+    global _leaderboard
+    from db.maintenance import get_player_engines
+
+    import db.db as db
+
+    started = time.perf_counter()
+    leaderboard = Leaderboard()
+    query = select(db.Protagonist.id, db.Protagonist.name, db.Protagonist.level)
+    for _, read_engine in get_player_engines():
+        with read_engine.connect() as conn:
+            for row in conn.execute(query.order_by(db.Protagonist.id)):
+                leaderboard.set(row.id, row.name, row.level)
+    _leaderboard = leaderboard
+    logging.info(
+        f"The leaderboard of {len(leaderboard)} characters is built "
+        f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    return leaderboard
+
+
+def get_leaderboard():
+    """A function that returns the leaderboard, it's built from the database on the first call.
+
+    :returns:
+        Leaderboard: The leaderboard.
+    """
+    if _leaderboard is None:
+        return load_leaderboard()
+    return _leaderboard
+
+
+async def refresh_leaderboard_periodically(interval):
+    """A function that builds the leaderboard from the database again every interval seconds.
+
+    A worker process only changes the leaderboard for its own players, so with several workers
+    this is how it learns about the players of the others.
+
+    :param int interval: The number of seconds between the rebuilds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(load_leaderboard)
+        except Exception as e:
+            logging.error(f"Couldn't rebuild the leaderboard: {e}")
+
+
+def update_ranking(session, character_id, name=None, level=None):
+    """A function that changes a character on the leaderboard once the session commits.
+
+    :param Session session: The database session the change is made in.
+    :param int character_id: The id of the character.
+    :param str name: (optional) The name of the character. Defaults to None.
+    :param int level: (optional) The new level of the character. Defaults to None, which removes the character.
+    """
+    session.info.setdefault("ranking", {})[character_id] = (name, level)
+
+
+def track_ranking(session_factory):
+    """A function that makes the sessions of a factory apply their leaderboard changes on commit.
+
+    :param sessionmaker session_factory: The session factory.
+    """
+
+    @event.listens_for(session_factory, "after_commit")
+    def after_commit(session):
+        changes = session.info.pop("ranking", None)
+        if not changes or _leaderboard is None:
+            return
+        for character_id, (name, level) in changes.items():
+            if level is None:
+                _leaderboard.remove(character_id)
+            else:
+                _leaderboard.set(character_id, name, level)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def after_rollback(session):
+        session.info.pop("ranking", None)
+
+
+def _measure(operation):
+    return bench.measure(operation, BENCHMARK_REPEATS)
+
+
+def benchmark(sizes=BENCHMARK_PLAYERS, seed=0):
+    """A function that compares the leaderboard queries in memory with the queries on a scratch database.
+
+    The update is the work the leaderboard adds to every level up, the database is updated anyway.
+
+    :param tuple sizes: (optional) The numbers of characters. Defaults to BENCHMARK_PLAYERS.
+    :param int seed: (optional) The seed of the random levels. Defaults to 0.
+
+    :returns:
+        list: A list of (characters, way, top µs, rank µs, update µs) tuples, the medians of BENCHMARK_REPEATS runs.
+        The update is None for the database.
+    """
+    from sqlalchemy import bindparam, create_engine, func, insert
+
+    import db.db as db
+
+    rnd = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            levels = {id: int(rnd.expovariate(0.2)) + 1 for id in range(1, size + 1)}
+            ids = [rnd.randint(1, size) for _ in range(BENCHMARK_REPEATS)]
+
+            leaderboard = Leaderboard()
+            for id, level in levels.items():
+                leaderboard.set(id, f"hero{id}", level)
+            picks = iter(ids * 2)
+
+            def level_up():
+                id = next(picks)
+                leaderboard.set(id, f"hero{id}", leaderboard.players[id] + 1)
+
+            results.append(
+                (
+                    size,
+                    "memory",
+                    _measure(leaderboard.get_top),
+                    _measure(lambda: leaderboard.get_rank(next(picks))),
+                    _measure(level_up),
+                )
+            )
+
+            engine = create_engine(
+                "sqlite:///" + os.path.join(tmp_dir, f"leaderboard{size}.db")
+            )
+            db.Protagonist.__table__.create(engine)
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(db.Protagonist.__table__),
+                    [
+                        {"id": id, "name": f"hero{id}", "hp": 10, "level": level}
+                        for id, level in levels.items()
+                    ],
+                )
+            character = db.Protagonist.__table__.c
+            top = select(character.id, character.name, character.level).order_by(
+                character.level.desc(), character.id
+            )
+            level_of = select(character.level).where(character.id == bindparam("id"))
+            picks = iter(ids)
+            with engine.connect() as conn:
+
+                def rank():
+                    level = conn.execute(level_of, {"id": next(picks)}).scalar_one()
+                    return conn.execute(
+                        select(func.count()).where(character.level > level)
+                    ).scalar_one()
+
+                results.append(
+                    (
+                        size,
+                        "database",
+                        _measure(
+                            lambda: conn.execute(top.limit(LEADERBOARD_SIZE)).all()
+                        ),
+                        _measure(rank),
+                        None,
+                    )
+                )
+    return results
+
+
+if __name__ == "__main__":
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or BENCHMARK_PLAYERS
+    print(
+        f"{'characters':>10}  {'way':<10}{'top µs':>10}{'rank µs':>10}{'update µs':>11}"
+    )
+    for size, way, top, rank, update in benchmark(sizes):
+        update = f"{update:>11.1f}" if update is not None else ""
+        print(f"{size:>10}  {way:<10}{top:>10.1f}{rank:>10.1f}{update}")
@@ -1,9 +1,18 @@
 import json
+import logging
 import os
+import subprocess
+import sys
+import tempfile
+import time
 
+from sqlalchemy import delete, select, tuple_
+
+from db.content import CONTENT_NAMES, check_content, read_content
 from db.db import (
     NPC,
     Base,
+    ContentVersion,
     Dialog,
     Direction,
     Enemy,
@@ -14,136 +23,348 @@ from db.db import (
     Session,
     engine,
 )
+from db.storage import get_insert
+
+CHUNK_SIZE = 500
+"""A constant that defines the number of rows sent to the database in one statement."""
+
+BENCHMARK_SCALE = 100
+"""A constant that defines how many copies of the content are loaded in the loader benchmark."""
 
 
-def get_json_data(filename):
-    """A function that reads a JSON file and returns its data.
+def load_npcs(data):
+    """A function that converts the NPC data from the JSON file to table rows.
 
-    :param str filename: The name of the JSON file without the extension.
+    :param list data: The data from the JSON file.
 
     :returns:
-        dict: The data from the JSON file.
+        dict: The rows for each table.
     """
-    try:
-        with open(
-            os.path.join(os.path.dirname(__file__), f"data/{filename}.json"), "r"
-        ) as file:
-            return json.load(file)
-    except Exception as e:
-        print(f"Couldn't read the json file '{filename}': {e}")
-        return []
+    return {NPC.__table__: data}
 
 
-def load_npcs(session):
-    """A function that loads the NPC data from the JSON file and adds them to the database.
+def load_enemies(data):
+    """A function that converts the enemy data from the JSON file to table rows.
 
-    :param Session session: The database session object.
-    """
-    for npc_data in get_json_data("npcs"):
-        session.add(NPC(**npc_data))
-    session.commit()
+    :param list data: The data from the JSON file.
 
+    :returns:
+        dict: The rows for each table.
+    """
+    return {Enemy.__table__: data}
 
-def load_enemies(session):
-    """A function that loads the enemy data from the JSON file and adds them to the database.
 
-    :param Session session: The database session object.
-    """
-    for enemy_data in get_json_data("enemies"):
-        session.add(Enemy(**enemy_data))
-    session.commit()
+def load_dialogs(data):
+    """A function that converts the dialog data from the JSON file to table rows.
 
+    The responses don't have ids in the JSON file, so they are numbered in the file order.
 
-def load_dialogs(session):
-    """A function that loads the dialog data from the JSON file and adds them to the database.
+    :param list data: The data from the JSON file.
 
-    :param Session session: The database session object.
+    :returns:
+        dict: The rows for each table.
     """
-    for dialog in get_json_data("dialogs"):
-        session.add(
-            Dialog(
-                npc_id=dialog["npc_id"],
-                stage_id=dialog["stage_id"],
-                npc_text=dialog["npc_text"],
-            )
+    dialogs, responses = [], []
+    for dialog in data:
+        dialogs.append(
+            {
+                "npc_id": dialog["npc_id"],
+                "stage_id": dialog["stage_id"],
+                "npc_text": dialog["npc_text"],
+            }
         )
-
         for response in dialog["responses"]:
-            session.add(
-                PlayerResponse(
-                    **response, npc_id=dialog["npc_id"], stage_id=dialog["stage_id"]
-                )
+            responses.append(
+                {
+                    "id": len(responses) + 1,
+                    "npc_id": dialog["npc_id"],
+                    "stage_id": dialog["stage_id"],
+                    "text": response["text"],
+                    "next_stage_id": response.get("next_stage_id"),
+                }
             )
+    return {Dialog.__table__: dialogs, PlayerResponse.__table__: responses}
+
 
-    session.commit()
+def load_locations(data):
+    """A function that converts the location data from the JSON file to table rows.
 
+    :param list data: The data from the JSON file.
 
-def load_locations(session):
-    """A function that loads the location data from the JSON file and adds them to the database.
+    :returns:
+        dict: The rows for each table.
+    """
+    return {
+        Location.__table__: [
+            {
+                "id": location["id"],
+                "name": location["name"],
+                "description": location["description"],
+            }
+            for location in data
+        ],
+        Direction.__table__: [
+            {"location_from_id": location["id"], "location_to_id": direction}
+            for location in data
+            for direction in location["directions"]
+        ],
+    }
+
+
+def load_items(data):
+    """A function that converts the item data from the JSON file to table rows.
+
+    :param list data: The data from the JSON file.
 
-    :param Session session: The database session object.
+    :returns:
+        dict: The rows for each table.
     """
-    locations = get_json_data("locations")
-    for location in locations:
-        session.add(
-            Location(
-                id=location["id"],
-                name=location["name"],
-                description=location["description"],
-            )
-        )
+    return {Item.__table__: data}
 
-    for location in locations:
-        for direction in location["directions"]:
-            session.add(
-                Direction(location_from_id=location["id"], location_to_id=direction)
-            )
-    session.commit()
 
+def load_quests(data):
+    """A function that converts the quest data from the JSON file to table rows.
 
-def load_items(session):
-    """A function that loads the item data from the JSON file and adds them to the database.
+    :param list data: The data from the JSON file.
 
-    :param Session session: The database session object.
+    :returns:
+        dict: The rows for each table.
     """
-    for item_data in get_json_data("items"):
-        session.add(Item(**item_data))
-    session.commit()
+    return {Quest.__table__: data}
+
+
+CONTENT_LOADERS = {
+    "items": load_items,
+    "npcs": load_npcs,
+    "enemies": load_enemies,
+    "dialogs": load_dialogs,
+    "quests": load_quests,
+    "locations": load_locations,
+}
+"""A dictionary that maps the content file names to the functions that convert them to table rows."""
 
 
-def load_quests(session):
-    """A function that loads the quest data from the JSON file and adds them to the database.
+def sync_table(conn, table, rows):
+    """A function that makes the table contain exactly the given rows.
 
-    :param Session session: The database session object.
+    Only the rows that differ from the stored ones are upserted and only the stale rows are deleted.
+
+    :param Connection conn: The database connection.
+    :param Table table: The table to sync.
+    :param list rows: The rows the table should contain.
+
+    :returns:
+        tuple: A tuple of (upserted, deleted) row counts.
     """
-    for quest_data in get_json_data("quests"):
-        session.add(Quest(**quest_data))
-    session.commit()
-
-
-def load_all():
-    tables_to_drop = [
-        Location.__table__,
-        NPC.__table__,
-        Enemy.__table__,
-        Dialog.__table__,
-        PlayerResponse.__table__,
-        Direction.__table__,
-        Item.__table__,
-        Quest.__table__,
-    ]
-    Base.metadata.drop_all(bind=engine, tables=tables_to_drop)
+    pk = [column.name for column in table.primary_key.columns]
+    columns = [column.name for column in table.columns]
+    rows = {
+        tuple(row[name] for name in pk): {name: row.get(name) for name in columns}
+        for row in rows
+    }
+    existing = {
+        tuple(row[name] for name in pk): dict(row)
+        for row in conn.execute(select(table)).mappings()
+    }
+    changed = [row for key, row in rows.items() if existing.get(key) != row]
+    stale = [key for key in existing if key not in rows]
+
+    if changed:
+        stmt = get_insert(conn.engine)(table)
+        update_columns = {
+            name: stmt.excluded[name] for name in columns if name not in pk
+        }
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(index_elements=pk, set_=update_columns)
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=pk)
+        for i in range(0, len(changed), CHUNK_SIZE):
+            conn.execute(stmt, changed[i : i + CHUNK_SIZE])
+    pk_columns = tuple_(*(table.c[name] for name in pk))
+    for i in range(0, len(stale), CHUNK_SIZE):
+        conn.execute(delete(table).where(pk_columns.in_(stale[i : i + CHUNK_SIZE])))
+    return len(changed), len(stale)
+
+
+def load_all(force=False):
+    """A function that brings the world tables up to date with the content.
+
+    Every content file is hashed and compared with the version stored in the database, only the changed
+    files are diffed against the tables. Everything is applied in a single transaction, the player
+    tables are never touched.
+
+    :param bool force: (optional) Whether to diff all files regardless of their hashes. Defaults to False.
+
+    :raises:
+        ValueError: If the content can't be read or is not valid, nothing is changed then.
+    """
+    content = read_content()
+    check_content({name: data for name, (_, data) in content.items()})
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        versions = dict(
+            conn.execute(select(ContentVersion.name, ContentVersion.hash)).all()
+        )
+        for name, (content_hash, data) in content.items():
+            if not force and versions.get(name) == content_hash:
+                continue
+            for table, rows in CONTENT_LOADERS[name](data).items():
+                upserted, deleted = sync_table(conn, table, rows)
+                logging.info(
+                    f"Content '{name}': {table.name} upserted {upserted}, deleted {deleted}"
+                )
+            conn.execute(
+                get_insert(engine)(ContentVersion.__table__)
+                .values(name=name, hash=content_hash)
+                .on_conflict_do_update(
+                    index_elements=["name"], set_={"hash": content_hash}
+                )
+            )
+
+
+def scale_content(content, scale):
+    """A function that makes a bigger content of several copies of the given one for benchmarks.
 
+    Every copy gets its own ids, and the references of a copy point to the same copy.
+
+    :param dict content: The data of each content file by its name.
+    :param int scale: The number of copies.
+
+    :returns:
+        dict: The data of each content file by its name.
+    """
+    item_step = max(item["id"] for item in content["items"])
+    npc_step = max(npc["id"] for npc in content["npcs"])
+    enemy_step = max(enemy["id"] for enemy in content["enemies"])
+    location_step = max(location["id"] for location in content["locations"])
+    scaled = {name: [] for name in CONTENT_NAMES}
+    for copy in range(scale):
+        items, npcs = copy * item_step, copy * npc_step
+        locations = copy * location_step
+        scaled["items"] += [
+            {**item, "id": item["id"] + items} for item in content["items"]
+        ]
+        scaled["npcs"] += [
+            {
+                **npc,
+                "id": npc["id"] + npcs,
+                "location_id": npc["location_id"] + locations,
+            }
+            for npc in content["npcs"]
+        ]
+        scaled["enemies"] += [
+            {
+                **enemy,
+                "id": enemy["id"] + copy * enemy_step,
+                "location_id": enemy["location_id"] + locations,
+                "loot_id": enemy["loot_id"] and enemy["loot_id"] + items,
+            }
+            for enemy in content["enemies"]
+        ]
+        scaled["dialogs"] += [
+            {**dialog, "npc_id": dialog["npc_id"] + npcs}
+            for dialog in content["dialogs"]
+        ]
+        scaled["quests"] += [
+            {
+                **quest,
+                "npc_id": quest["npc_id"] + npcs,
+                "required_item_id": quest["required_item_id"] + items,
+                "reward_item_id": quest["reward_item_id"] + items,
+            }
+            for quest in content["quests"]
+        ]
+        scaled["locations"] += [
+            {
+                **location,
+                "id": location["id"] + locations,
+                "directions": [
+                    direction + locations for direction in location["directions"]
+                ],
+            }
+            for location in content["locations"]
+        ]
+    return scaled
+
+
+def _drop_and_reload(content):
+    # the loader before the incremental one, for comparison
+    models = {mapper.local_table: mapper.class_ for mapper in Base.registry.mappers}
+    tables = [table for loader in CONTENT_LOADERS.values() for table in loader([])]
+    Base.metadata.drop_all(bind=engine, tables=tables)
     Base.metadata.create_all(engine)
+    with Session() as session:
+        for name in CONTENT_NAMES:
+            for table, rows in CONTENT_LOADERS[name](content[name]).items():
+                for row in rows:
+                    session.add(models[table](**row))
+            session.commit()
+
+
+def measure():
+    """A function that measures the ways to load the content into the configured database, which should be empty.
+
+    :returns:
+        dict: A dictionary of load times in seconds by way.
+    """
+    content = {name: data for name, (_, data) in read_content().items()}
+    timings = {}
+    for way, load in (
+        ("new, empty database", load_all),
+        ("new, no files changed", load_all),
+        ("new, forced full diff", lambda: load_all(force=True)),
+        ("old drop-and-reload", lambda: _drop_and_reload(content)),
+    ):
+        started = time.perf_counter()
+        load()
+        timings[way] = time.perf_counter() - started
+    return timings
 
-    session = Session()
-    load_items(session)
-    load_npcs(session)
-    load_enemies(session)
-    load_dialogs(session)
-    load_quests(session)
-    load_locations(session)
+
+def benchmark(scale=BENCHMARK_SCALE):
+    """A function that loads a scaled copy of the content into a scratch database in a new process.
+
+    :param int scale: (optional) The number of copies of the content. Defaults to BENCHMARK_SCALE.
+
+    :returns:
+        tuple: A tuple of (row counts by content name, load times in seconds by way).
+    """
+    content = scale_content(
+        {name: data for name, (_, data) in read_content().items()}, scale
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in content.items():
+            with open(os.path.join(directory, f"{name}.json"), "w") as file:
+                json.dump(data, file)
+        env = {
+            **os.environ,
+            "CONTENT_DIR": directory,
+            "GAME_DB_PATH": os.path.join(directory, "game.db"),
+            "EVENT_LOG_DIR": os.path.join(directory, "events"),
+            "DB_URL": "",
+            "WORLD_SNAPSHOT_PATH": "",
+            "PLAYER_SHARDS": "0",
+        }
+        output = subprocess.run(
+            [sys.executable, "-m", "db.load_all", "--measure"],
+            env=env,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+    counts = {name: len(data) for name, data in content.items()}
+    return counts, json.loads(output.splitlines()[-1])
 
 
 if __name__ == "__main__":
-    load_all()
+    if "--measure" in sys.argv:
+        print(json.dumps(measure()))
+    elif "--bench" in sys.argv:
+        args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+        counts, timings = benchmark(int(args[0]) if args else BENCHMARK_SCALE)
+        print(", ".join(f"{count} {name}" for name, count in counts.items()))
+        for way, seconds in timings.items():
+            print(f"  {way:<28}{seconds:>6.2f} s")
+    else:
+        load_all()
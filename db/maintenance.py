@@ -0,0 +1,267 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from datetime import timedelta
+
+from config import ARCHIVE_IDLE_DAYS
+from sqlalchemy import bindparam, func, select
+
+import db.bench as bench
+import db.db as db
+
+ARCHIVE_BATCH_SIZE = 500
+"""A constant that defines the number of characters archived in one transaction."""
+
+ARCHIVE_PAUSE = 0.01
+"""A constant that defines the pause in seconds between archive transactions, so writers aren't starved."""
+
+VACUUM_PAGES = 256
+"""A constant that defines the number of free pages returned to the file system in one step of the vacuum."""
+
+VACUUM_PAUSE = 0.01
+"""A constant that defines the pause in seconds between the steps of the vacuum."""
+
+LATENCY_SAMPLES = 1000
+"""A constant that defines the number of characters the hot query latency is measured on."""
+
+SELECT_IDLE = (
+    select(db.Protagonist.id)
+    .where(db.Protagonist.last_active < bindparam("cutoff"))
+    .order_by(db.Protagonist.last_active)
+    .limit(bindparam("limit"))
+)
+"""A statement that selects the ids of the characters that haven't been active since the cutoff.
+
+    :meta hide-value:
+"""
+
+
+def get_player_engines():
+    """A function that returns the engines of the databases with the player tables.
+
+    :returns:
+        list: A list of (write engine, read engine) tuples, the main database or every player shard.
+    """
+    return db.shard_engines or [(db.engine, db.read_engine)]
+
+
+def archive_idle(engine, cutoff):
+    """A function that moves the characters idle since the cutoff to the archive in small batches.
+
+    :param Engine engine: The write engine of the database.
+    :param datetime cutoff: The time the characters have to be active after to stay.
+
+    :returns:
+        int: The number of archived characters.
+    """
+    archived = 0
+    while True:
+        # a session of the main factory on the shard engine, so the events are written on commit
+        with db.Session(bind=engine) as session:
+            ids = (
+                session.execute(
+                    SELECT_IDLE, {"cutoff": cutoff, "limit": ARCHIVE_BATCH_SIZE}
+                )
+                .scalars()
+                .all()
+            )
+            if not ids:
+                return archived
+            archived += db.archive_characters(session, ids, "idle")
+            session.commit()
+        time.sleep(ARCHIVE_PAUSE)
+
+
+def get_file_size(engine):
+    """A function that returns the size of a SQLite database in bytes, including its WAL.
+
+    :param Engine engine: The database engine.
+
+    :returns:
+        int: The size of the files.
+    """
+    path = engine.url.database
+    return sum(
+        os.path.getsize(file) for file in (path, f"{path}-wal") if os.path.exists(file)
+    )
+
+
+def _pragma(engine, statement):
+    with engine.connect() as conn:
+        result = conn.exec_driver_sql(f"PRAGMA {statement}")
+        row = result.first() if result.returns_rows else None
+        conn.commit()
+    return row[0] if row else None
+
+
+def vacuum_step(engine, pages=VACUUM_PAGES):
+    """A function that returns up to a number of free pages of a SQLite database to the file system in one transaction.
+
+    :param Engine engine: The write engine of the database.
+    :param int pages: (optional) The maximum number of pages to return. Defaults to VACUUM_PAGES.
+
+    :returns:
+        int: The number of free pages left.
+    """
+    with engine.connect() as conn:
+        # incremental_vacuum frees a page per step of the statement, but the sqlite3 module steps
+        # a statement without result columns only once, executescript steps it to the end
+        conn.connection.driver_connection.executescript(
+            f"PRAGMA incremental_vacuum({pages})"
+        )
+    return _pragma(engine, "freelist_count")
+
+
+def vacuum(engine):
+    """A function that returns the free pages of a SQLite database to the file system in small steps.
+
+    Every step is a short transaction, so the writers only wait for one step at a time.
+    Only the pages that are entirely free are returned, the space left in the pages of the deleted
+    rows is reused by new rows. The database has to be in the incremental auto vacuum mode, see full_vacuum.
+
+    :param Engine engine: The write engine of the database.
+
+    :returns:
+        int: The number of bytes reclaimed.
+    """
+    if _pragma(engine, "auto_vacuum") != 2:
+        logging.warning(
+            f"{engine.url.database} isn't in the incremental vacuum mode, "
+            "run `python -m db.maintenance --full-vacuum` once"
+        )
+        return 0
+    pages = _pragma(engine, "page_count")
+    # the connection is returned to the pool after every step, so the writers get it in between
+    free = _pragma(engine, "freelist_count")
+    while free:
+        free = vacuum_step(engine)
+        time.sleep(VACUUM_PAUSE)
+    reclaimed = pages - _pragma(engine, "page_count")
+    _pragma(engine, "wal_checkpoint(TRUNCATE)")
+    return reclaimed * _pragma(engine, "page_size")
+
+
+def full_vacuum():
+    """A function that rebuilds the player databases with VACUUM and switches them to the incremental auto vacuum mode.
+
+    It packs the rows into as few pages as possible, but blocks the writers until it's done, so it's
+    only run by hand. The databases created by the bot are in the incremental mode already.
+
+    :returns:
+        dict: A dictionary of the file sizes after the vacuum by database url.
+    """
+    sizes = {}
+    for engine, _ in get_player_engines():
+        if engine.dialect.name != "sqlite":
+            continue
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        sizes[engine.url.render_as_string(hide_password=True)] = get_file_size(engine)
+    return sizes
+
+
+def measure_hot_queries(engine, ids):
+    """A function that measures the latency of loading characters with their inventories.
+
+    :param Engine engine: The read engine of the database.
+    :param list ids: The ids of the characters to load.
+
+    :returns:
+        dict: The median, p99 and max latency in µs.
+    """
+    latencies = []
+    with engine.connect() as conn:
+        for id in ids:
+            started = time.perf_counter()
+            conn.execute(db.SELECT_CHARACTER, {"id": id}).all()
+            db.inventory_store.load(conn, id)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return bench.summarize(latencies)
+
+
+def maintain(idle_days=ARCHIVE_IDLE_DAYS):
+    """A function that archives the idle characters and compacts the player databases.
+
+    :param int idle_days: (optional) The number of days without activity after which a character is archived.
+        Defaults to ARCHIVE_IDLE_DAYS.
+
+    :returns:
+        dict: The report with the number of archived characters, the reclaimed bytes, the file sizes
+        and the hot query latency before and after, by database url.
+    """
+    cutoff = db.utcnow() - timedelta(days=idle_days)
+    reports = {}
+    for engine, read_engine in get_player_engines():
+        sqlite = engine.dialect.name == "sqlite"
+        with read_engine.connect() as conn:
+            ids = (
+                conn.execute(
+                    select(db.Protagonist.id)
+                    .where(db.Protagonist.last_active >= cutoff)
+                    .order_by(func.random())
+                    .limit(LATENCY_SAMPLES)
+                )
+                .scalars()
+                .all()
+            )
+        report = {
+            "latency_before": measure_hot_queries(read_engine, ids),
+            "size_before": get_file_size(engine) if sqlite else None,
+        }
+        started = time.perf_counter()
+        report["archived"] = archive_idle(engine, cutoff)
+        # PostgreSQL reclaims the space of the deleted rows with its own autovacuum
+        report["reclaimed"] = vacuum(engine) if sqlite else 0
+        report["duration"] = time.perf_counter() - started
+        report["size_after"] = get_file_size(engine) if sqlite else None
+        report["latency_after"] = measure_hot_queries(read_engine, ids)
+        logging.info(
+            f"{engine.url.render_as_string(hide_password=True)}: "
+            f"archived {report['archived']} characters, "
+            f"reclaimed {report['reclaimed'] / 1024:.0f} KiB in {report['duration']:.2f} s, "
+            f"hot query p50 {report['latency_before']['p50']:.0f} -> "
+            f"{report['latency_after']['p50']:.0f} µs"
+        )
+        reports[engine.url.render_as_string(hide_password=True)] = report
+    return reports
+
+
+async def maintain_periodically(interval):
+    """A function that runs the maintenance every interval seconds.
+
+    :param int interval: The number of seconds between the runs.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception as e:
+            logging.error(f"Couldn't maintain the database: {e}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    reports = maintain(int(args[0]) if args else ARCHIVE_IDLE_DAYS)
+    for url, report in reports.items():
+        print(url)
+        print(f"    archived characters  {report['archived']}")
+        print(f"    reclaimed            {report['reclaimed'] / 1024:.0f} KiB")
+        if report["size_before"] is not None:
+            print(
+                f"    file size            {report['size_before'] / 1024:.0f} -> "
+                f"{report['size_after'] / 1024:.0f} KiB"
+            )
+        print(
+            f"    hot query p50/p99    {report['latency_before']['p50']:.0f}/"
+            f"{report['latency_before']['p99']:.0f} -> "
+            f"{report['latency_after']['p50']:.0f}/"
+            f"{report['latency_after']['p99']:.0f} µs"
+        )
+    if "--full-vacuum" in sys.argv:
+        for url, size in full_vacuum().items():
+            print(f"{url} after VACUUM: {size / 1024:.0f} KiB")
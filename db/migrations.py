@@ -0,0 +1,384 @@
+import logging
+import sys
+import time
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+from db.db import (
+    PLAYER_TABLES,
+    ArchiveBase,
+    Base,
+    SchemaMigration,
+    archive_engine,
+    engine,
+    shard_engines,
+)
+
+BACKFILL_BATCH_SIZE = 1000
+"""A constant that defines the number of rows updated in one backfill transaction."""
+
+BACKFILL_PAUSE = 0.01
+"""A constant that defines the pause in seconds between backfill transactions, so writers aren't starved."""
+
+
+class CreateIndex:
+    """A class that represents a migration step that creates an index."""
+
+    def __init__(self, name: str, table: str, columns: list, unique: bool = False):
+        """A method that initializes the step.
+
+        :param str name: The name of the index.
+        :param str table: The name of the table.
+        :param list columns: The names of the indexed columns.
+        :param bool unique: (optional) Whether the index is unique. Defaults to False.
+        """
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.unique = unique
+
+    def describe(self):
+        """A method that returns the description of the step."""
+        return f"create index {self.name} on {self.table}({', '.join(self.columns)})"
+
+    def estimate(self, conn):
+        """A method that returns the number of rows the step reads or writes.
+
+        :param Connection conn: The database connection.
+        """
+        return conn.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+
+    def apply(self, engine):
+        """A method that applies the step in its own transaction.
+
+        :param Engine engine: The database engine.
+        """
+        unique = "UNIQUE " if self.unique else ""
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"CREATE {unique}INDEX IF NOT EXISTS {self.name} "
+                    f"ON {self.table} ({', '.join(self.columns)})"
+                )
+            )
+
+
+class CreateTable:
+    """A class that represents a migration step that creates a table from its model."""
+
+    def __init__(self, name: str, next_to: str = "characters"):
+        """A method that initializes the step.
+
+        :param str name: The name of the table.
+        :param str next_to: (optional) The table the new one is created next to, the step is skipped on the databases without it. Defaults to "characters".
+        """
+        self.name = name
+        self.table = next_to
+
+    def describe(self):
+        """A method that returns the description of the step."""
+        return f"create table {self.name}"
+
+    def estimate(self, conn):
+        """A method that returns the number of rows the step reads or writes.
+
+        :param Connection conn: The database connection.
+        """
+        return 0
+
+    def apply(self, engine):
+        """A method that applies the step in its own transaction.
+
+        :param Engine engine: The database engine.
+        """
+        Base.metadata.tables[self.name].create(engine, checkfirst=True)
+
+
+class AddColumn:
+    """A class that represents a migration step that adds a column."""
+
+    def __init__(self, table: str, name: str, definition: str):
+        """A method that initializes the step.
+
+        :param str table: The name of the table.
+        :param str name: The name of the column.
+        :param str definition: The type and constraints of the column.
+        """
+        self.table = table
+        self.name = name
+        self.definition = definition
+
+    def describe(self):
+        """A method that returns the description of the step."""
+        return f"add column {self.table}.{self.name} {self.definition}"
+
+    def estimate(self, conn):
+        """A method that returns the number of rows the step reads or writes.
+
+        Adding a column only changes the schema, the rows are not rewritten.
+
+        :param Connection conn: The database connection.
+        """
+        return 0
+
+    def apply(self, engine):
+        """A method that applies the step in its own transaction.
+
+        :param Engine engine: The database engine.
+        """
+        columns = [column["name"] for column in inspect(engine).get_columns(self.table)]
+        if self.name in columns:
+            return
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f"ALTER TABLE {self.table} ADD COLUMN {self.name} {self.definition}"
+                )
+            )
+
+
+class Backfill:
+    """A class that represents a migration step that updates existing rows in small batches.
+
+    Every batch is a separate short transaction, so the write lock is never held for long.
+    The condition has to exclude the rows that are already updated, so the step can be resumed.
+    """
+
+    def __init__(self, table: str, values: str, where: str, key: str):
+        """A method that initializes the step.
+
+        :param str table: The name of the table.
+        :param str values: The SET clause of the update.
+        :param str where: The condition that selects the rows to update.
+        :param str key: The unique integer column the batches are ordered by. The tables with a composite
+            primary key, like inventories and journals, need a unique column added for the backfill.
+        """
+        self.table = table
+        self.values = values
+        self.where = where
+        self.key = key
+
+    def describe(self):
+        """A method that returns the description of the step."""
+        return f"backfill {self.table} set {self.values} where {self.where}"
+
+    def estimate(self, conn):
+        """A method that returns the number of rows the step reads or writes.
+
+        :param Connection conn: The database connection.
+        """
+        try:
+            return conn.execute(
+                text(f"SELECT count(*) FROM {self.table} WHERE {self.where}")
+            ).scalar()
+        except DBAPIError:
+            # the condition refers to a column added by an earlier step, so every row is updated
+            conn.rollback()
+            return conn.execute(text(f"SELECT count(*) FROM {self.table}")).scalar()
+
+    def apply(self, engine):
+        """A method that applies the step in batches of BACKFILL_BATCH_SIZE rows.
+
+        :param Engine engine: The database engine.
+        """
+        last_key = None
+        while True:
+            with engine.begin() as conn:
+                after = f"{self.key} > :last_key AND " if last_key is not None else ""
+                keys = (
+                    conn.execute(
+                        text(
+                            f"SELECT {self.key} FROM {self.table} "
+                            f"WHERE {after}({self.where}) "
+                            f"ORDER BY {self.key} LIMIT :limit"
+                        ),
+                        {"last_key": last_key, "limit": BACKFILL_BATCH_SIZE},
+                    )
+                    .scalars()
+                    .all()
+                )
+                if not keys:
+                    return
+                conn.execute(
+                    text(
+                        f"UPDATE {self.table} SET {self.values} "
+                        f"WHERE {self.key} BETWEEN :first AND :last "
+                        f"AND ({self.where})"
+                    ),
+                    {"first": keys[0], "last": keys[-1]},
+                )
+            last_key = keys[-1]
+            time.sleep(BACKFILL_PAUSE)
+
+
+class Migration(NamedTuple):
+    """A class that represents a versioned schema migration."""
+
+    version: int
+    description: str
+    steps: tuple
+
+
+MIGRATIONS = (
+    Migration(1, "Initial schema", ()),
+    Migration(
+        2,
+        "Indexes for player queries",
+        (
+            CreateIndex(
+                "ix_journals_character_id_completed",
+                "journals",
+                ["character_id", "completed"],
+            ),
+            CreateIndex("ix_characters_location_id", "characters", ["location_id"]),
+            CreateIndex("ix_npcs_location_id", "npcs", ["location_id"]),
+            CreateIndex("ix_enemies_location_id", "enemies", ["location_id"]),
+            CreateIndex(
+                "ix_player_responses_npc_id_stage_id",
+                "player_responses",
+                ["npc_id", "stage_id"],
+            ),
+        ),
+    ),
+    Migration(
+        3,
+        "Character activity for archival",
+        (
+            AddColumn("characters", "last_active", "TIMESTAMP"),
+            Backfill(
+                "characters",
+                "last_active = CURRENT_TIMESTAMP",
+                "last_active IS NULL",
+                key="id",
+            ),
+            CreateIndex("ix_characters_last_active", "characters", ["last_active"]),
+        ),
+    ),
+    Migration(4, "Packed inventories", (CreateTable("packed_inventories"),)),
+)
+"""A tuple of all migrations in the order of their versions.
+
+    Every step has to be idempotent, so a migration interrupted midway can be applied again.
+    New tables are created from the models in a new database, the existing ones get them with CreateTable.
+"""
+
+
+def get_applied_versions(conn):
+    """A function that returns the versions of the applied migrations.
+
+    :param Connection conn: The database connection.
+
+    :returns:
+        set: A set of versions.
+    """
+    return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def migrate(dry_run=False, engine=engine, tables=None):
+    """A function that brings the database schema up to date.
+
+    A new database gets the latest schema from the models and all migrations are marked as applied.
+    The steps on the tables that the database doesn't have are skipped.
+
+    :param bool dry_run: (optional) Whether to only report the pending migrations. Defaults to False.
+    :param Engine engine: (optional) The database engine. Defaults to the main database.
+    :param list tables: (optional) The tables a new database is created with. Defaults to all tables.
+
+    :returns:
+        list: A list of (migration, [(step description, estimated rows)]) tuples of the pending migrations.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table("characters"):
+        if not dry_run:
+            Base.metadata.create_all(engine, tables=tables)
+            with engine.begin() as conn:
+                conn.execute(
+                    SchemaMigration.__table__.insert(),
+                    [
+                        {
+                            "version": migration.version,
+                            "description": migration.description,
+                            "applied_at": datetime.now(timezone.utc),
+                        }
+                        for migration in MIGRATIONS
+                    ],
+                )
+        return []
+
+    has_versions = inspector.has_table("schema_migrations")
+    if not has_versions and not dry_run:
+        Base.metadata.create_all(engine, tables=[SchemaMigration.__table__])
+        has_versions = True
+    existing = set(inspector.get_table_names())
+    with engine.connect() as conn:
+        applied = get_applied_versions(conn) if has_versions else set()
+        pending = [
+            (
+                migration,
+                [
+                    (step.describe(), step.estimate(conn))
+                    for step in migration.steps
+                    if step.table in existing
+                ],
+            )
+            for migration in MIGRATIONS
+            if migration.version not in applied
+        ]
+    if dry_run:
+        return pending
+
+    for migration, _ in pending:
+        logging.info(f"Applying migration {migration.version}: {migration.description}")
+        started = time.perf_counter()
+        for step in migration.steps:
+            if step.table in existing:
+                step.apply(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc),
+                )
+            )
+        logging.info(
+            f"Migration {migration.version} is applied in {time.perf_counter() - started:.2f} s"
+        )
+    return pending
+
+
+def migrate_all(dry_run=False):
+    """A function that brings the schema of the main database and all player shards up to date.
+
+    The archive has no migrations yet, its table is only created.
+
+    :param bool dry_run: (optional) Whether to only report the pending migrations. Defaults to False.
+
+    :returns:
+        dict: A dictionary of the pending migrations by database url, as returned by migrate.
+    """
+    pending = {str(engine.url): migrate(dry_run=dry_run)}
+    for shard_engine, _ in shard_engines:
+        pending[str(shard_engine.url)] = migrate(
+            dry_run=dry_run, engine=shard_engine, tables=PLAYER_TABLES
+        )
+    if not dry_run:
+        ArchiveBase.metadata.create_all(archive_engine)
+    return pending
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    dry_run = "--dry-run" in sys.argv
+    for url, pending in migrate_all(dry_run=dry_run).items():
+        print(url)
+        if not pending:
+            print("    The database schema is up to date.")
+        for migration, steps in pending:
+            status = "pending" if dry_run else "applied"
+            print(f"    {migration.version}: {migration.description} ({status})")
+            for description, rows in steps:
+                print(f"        {description} (~{rows} rows)")
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from config import PRESENCE_SHOWN, PRESENCE_TIMEOUT, WORKERS
+import db.bench as bench
+
+BENCHMARK_PLAYERS = (1000, 10000, 100000)
+"""A constant that defines the numbers of active players in the presence benchmark."""
+
+BENCHMARK_LOCATIONS = 100
+"""A constant that defines the number of locations the players of the presence benchmark are spread over."""
+
+BENCHMARK_REPEATS = 1000
+"""A constant that defines how many times every operation is measured in the presence benchmark."""
+
+
+class Presence:
+    """A class that represents the index of the players recently active in every location.
+
+    The players of a location are kept in an OrderedDict in the order they were last seen, so the idle
+    ones are always at the front and expire one by one, and the latest ones are read from the back.
+    Every operation takes time in the number of players it returns or expires, whatever the number
+    of players in the game.
+    """
+
+    def __init__(self, timeout=PRESENCE_TIMEOUT, enabled=True):
+        """A method that initializes an empty index.
+
+        :param float timeout: (optional) The number of seconds a player stays in the index after the last update. Defaults to PRESENCE_TIMEOUT.
+        :param bool enabled: (optional) Whether the players are recorded, a disabled index is always empty. Defaults to True.
+        """
+        self.timeout = timeout
+        self.enabled = enabled
+        self.locations = {}
+        self.players = {}
+
+    def _expire(self, location_id, now):
+        present = self.locations.get(location_id)
+        if not present:
+            return
+        cutoff = now - self.timeout
+        while present:
+            character_id = next(iter(present))
+            if present[character_id][1] >= cutoff:
+                break
+            del present[character_id]
+            del self.players[character_id]
+        if not present:
+            del self.locations[location_id]
+
+    def see(self, character_id, name, location_id, now=None):
+        """A method that records that a player is active in a location.
+
+        :param int character_id: The id of the character.
+        :param str name: The name of the character.
+        :param int location_id: The id of the location the character is in.
+        :param float now: (optional) The time in seconds of time.monotonic. Defaults to None, which takes the current time.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic() if now is None else now
+        self.leave(character_id)
+        self.players[character_id] = location_id
+        self.locations.setdefault(location_id, OrderedDict())[character_id] = (
+            name,
+            now,
+        )
+        self._expire(location_id, now)
+
+    def sweep(self, now=None):
+        """A method that removes the idle players of every location, including the ones nobody looks at.
+
+        :param float now: (optional) The time in seconds of time.monotonic. Defaults to None, which takes the current time.
+
+        :returns:
+            int: The number of removed players.
+        """
+        now = time.monotonic() if now is None else now
+        count = len(self.players)
+        for location_id in list(self.locations):
+            self._expire(location_id, now)
+        return count - len(self.players)
+
+    def leave(self, character_id):
+        """A method that removes a player from the index.
+
+        :param int character_id: The id of the character.
+        """
+        location_id = self.players.pop(character_id, None)
+        if location_id is None:
+            return
+        present = self.locations[location_id]
+        del present[character_id]
+        if not present:
+            del self.locations[location_id]
+
+    def get_nearby(self, location_id, character_id=None, limit=PRESENCE_SHOWN):
+        """A method that returns the players recently active in a location, the latest first.
+
+        :param int location_id: The id of the location.
+        :param int character_id: (optional) The id of the character to leave out. Defaults to None.
+        :param int limit: (optional) The maximum number of returned names. Defaults to PRESENCE_SHOWN.
+
+        :returns:
+            tuple: A list of the names of the players and the number of all players in the location except the character.
+        """
+        self._expire(location_id, time.monotonic())
+        present = self.locations.get(location_id, {})
+        names = []
+        for other_id in reversed(present):
+            if len(names) == limit:
+                break
+            if other_id != character_id:
+                names.append(present[other_id][0])
+        return names, len(present) - (character_id in present)
+
+
+presence = Presence(enabled=WORKERS <= 1)
+"""The presence index of the process, disabled with several workers as each of them would see only its own players.
+
+    :meta hide-value:
+"""
+
+
+async def sweep_presence_periodically(interval=PRESENCE_TIMEOUT):
+    """A function that removes the idle players from the presence index every interval seconds.
+
+    The players are otherwise expired only when their location is looked at or entered,
+    so the players of the locations nobody visits would stay in memory.
+
+    :param float interval: (optional) The number of seconds between the sweeps. Defaults to PRESENCE_TIMEOUT.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = presence.sweep()
+        except Exception as e:
+            logging.error(f"Couldn't sweep the presence index: {e}")
+        else:
+            logging.debug(f"{removed} idle players are removed from the presence index")
+
+
+def _measure(operation):
+    return bench.measure(operation, BENCHMARK_REPEATS)
+
+
+def benchmark(sizes=BENCHMARK_PLAYERS, seed=0):
+    """A function that compares the presence index with the query of the characters by location on a scratch database.
+
+    :param tuple sizes: (optional) The numbers of active players. Defaults to BENCHMARK_PLAYERS.
+    :param int seed: (optional) The seed of the random locations. Defaults to 0.
+
+    :returns:
+        list: A list of (players, index nearby µs, index update µs, database nearby µs) tuples, the medians of BENCHMARK_REPEATS runs.
+    """
+    from sqlalchemy import bindparam, create_engine, insert, select
+
+    import db.db as db
+
+    rnd = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            locations = {
+                id: rnd.randint(1, BENCHMARK_LOCATIONS) for id in range(1, size + 1)
+            }
+            index = Presence(timeout=3600)
+            for id, location_id in locations.items():
+                index.see(id, f"hero{id}", location_id)
+            picks = [rnd.randint(1, size) for _ in range(BENCHMARK_REPEATS)]
+
+            nearby = iter(picks)
+            moves = iter(picks)
+
+            def move():
+                id = next(moves)
+                index.see(id, f"hero{id}", rnd.randint(1, BENCHMARK_LOCATIONS))
+
+            index_nearby = _measure(
+                lambda: index.get_nearby(locations[next(nearby)], 0)
+            )
+            index_update = _measure(move)
+
+            engine = create_engine(
+                "sqlite:///" + os.path.join(tmp_dir, f"presence{size}.db")
+            )
+            db.Protagonist.__table__.create(engine)
+            now = db.utcnow()
+            with engine.begin() as conn:
+                conn.execute(
+                    insert(db.Protagonist.__table__),
+                    [
+                        {
+                            "id": id,
+                            "name": f"hero{id}",
+                            "hp": 10,
+                            "level": 1,
+                            "location_id": location_id,
+                            "last_active": now,
+                        }
+                        for id, location_id in locations.items()
+                    ],
+                )
+            character = db.Protagonist.__table__.c
+            query = (
+                select(character.name)
+                .where(character.location_id == bindparam("location_id"))
+                .where(character.last_active >= bindparam("cutoff"))
+                .order_by(character.last_active.desc())
+                .limit(PRESENCE_SHOWN)
+            )
+            nearby = iter(picks)
+            with engine.connect() as conn:
+                database_nearby = _measure(
+                    lambda: conn.execute(
+                        query,
+                        {"location_id": locations[next(nearby)], "cutoff": now},
+                    ).all()
+                )
+            results.append((size, index_nearby, index_update, database_nearby))
+    return results
+
+
+if __name__ == "__main__":
+    sizes = tuple(int(arg) for arg in sys.argv[1:]) or BENCHMARK_PLAYERS
+    print(f"{'players':>10}{'index µs':>10}{'update µs':>11}{'database µs':>13}")
+    for size, index_nearby, index_update, database_nearby in benchmark(sizes):
+        print(
+            f"{size:>10}{index_nearby:>10.1f}{index_update:>11.1f}{database_nearby:>13.1f}"
+        )
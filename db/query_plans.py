@@ -0,0 +1,237 @@
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from random import Random
+
+from sqlalchemy import and_, create_engine, event, insert, select
+from sqlalchemy.orm import Session
+
+import db.db as db
+from db.content import read_content
+from db.load_all import CONTENT_LOADERS, sync_table
+
+SYNTHETIC_CHARACTERS = 20000
+"""A constant that defines the number of characters in the synthetic database."""
+
+BENCHMARK_CALLS = 2000
+"""A constant that defines how many times every query is run in the statement benchmark."""
+
+
+def build_synthetic_db(engine, characters=SYNTHETIC_CHARACTERS, seed=0):
+    """A function that fills an empty database with the world content and a lot of characters.
+
+    :param Engine engine: The database engine.
+    :param int characters: (optional) The number of characters. Defaults to SYNTHETIC_CHARACTERS.
+    :param int seed: (optional) The seed of the random generator. Defaults to 0.
+    """
+    rnd = Random(seed)
+    db.Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        content = read_content()
+        for name, (_, data) in content.items():
+            for table, rows in CONTENT_LOADERS[name](data).items():
+                sync_table(conn, table, rows)
+        locations = [location["id"] for location in content["locations"][1]]
+        items = [item["id"] for item in content["items"][1]]
+        npcs = [quest["npc_id"] for quest in content["quests"][1]]
+        conn.execute(
+            insert(db.Protagonist.__table__),
+            [
+                {
+                    "id": id,
+                    "name": f"player{id}",
+                    "hp": 10,
+                    "level": rnd.randint(1, 50),
+                    "location_id": rnd.choice(locations),
+                }
+                for id in range(1, characters + 1)
+            ],
+        )
+        conn.execute(
+            insert(db.Inventory.__table__),
+            [
+                {"character_id": id, "item_id": item_id, "count": rnd.randint(1, 5)}
+                for id in range(1, characters + 1)
+                for item_id in rnd.sample(items, rnd.randint(1, len(items)))
+            ],
+        )
+        conn.execute(
+            insert(db.Journal.__table__),
+            [
+                {"character_id": id, "npc_id": npc_id, "completed": rnd.random() < 0.5}
+                for id in range(2, characters + 1)
+                for npc_id in rnd.sample(npcs, rnd.randint(0, len(npcs)))
+            ],
+        )
+
+
+async def run_player_actions(world):
+    """A function that calls every database operation of a character once.
+
+    :param World world: The world snapshot to take the NPCs and enemies from.
+    """
+    character = await db.get_character(1)
+    npc = world.npcs[next(iter(world.quests))]
+    enemy = next(enemy for enemy in world.enemies.values() if enemy.loot_id)
+    character.hp = 1000
+    character.last_active = None
+
+    await character.touch()
+    await character.whereami()
+    await character.get_inventory()
+    await character.get_usable_inventory()
+    await character.get_usable_inventory_page(1)
+    await character.get_active_quests()
+    await character.get_npc_quest(npc)
+    await character.accept_npc_quest(npc)
+    await character.complete_npc_quest(npc)
+    await character.attack(enemy)
+    usable = await character.get_usable_inventory()
+    if usable:
+        await character.use_item(usable[0].item_id)
+    await character.go(world.get_directions(character.location_id)[0].id)
+    await character.die()
+    await db.create_character(1, "player1")
+
+
+def find_full_scans(engine, statements):
+    """A function that returns the statements whose query plan scans a whole table.
+
+    :param Engine engine: The database engine.
+    :param list statements: A list of (sql, parameters) tuples.
+
+    :returns:
+        list: A list of (sql, plan) tuples of the statements with full scans.
+    """
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            plan = [
+                row[3]
+                for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            if any(detail.startswith("SCAN") for detail in plan):
+                scans.append((statement, plan))
+    return scans
+
+
+def check_query_plans():
+    """A function that runs all character operations on a large synthetic database and checks their query plans.
+
+    :returns:
+        list: A list of (sql, plan) tuples of the statements with full scans.
+    """
+    from db.world import build_world
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine("sqlite:///" + os.path.join(tmp_dir, "plans.db"))
+        build_synthetic_db(engine)
+        statements = []
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def collect(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+                statements.append((statement, parameters))
+
+        db.Session.configure(bind=engine)
+        db.ReadSession.configure(bind=engine)
+        shard_sessions, db.shard_sessions = db.shard_sessions, []
+        try:
+            asyncio.run(run_player_actions(build_world()))
+        finally:
+            db.Session.configure(bind=db.engine)
+            db.ReadSession.configure(bind=db.read_engine)
+            db.shard_sessions = shard_sessions
+        scans = find_full_scans(engine, statements)
+        engine.dispose()
+    return scans
+
+
+def _build_character_query(id):
+    return select(db.Protagonist).where(db.Protagonist.id == id)
+
+
+def _build_npc_quest_query(character_id, npc_id):
+    return (
+        select(db.Quest, db.Journal)
+        .join(
+            db.Journal,
+            and_(
+                db.Quest.npc_id == db.Journal.npc_id,
+                db.Journal.character_id == character_id,
+            ),
+            isouter=True,
+        )
+        .where(db.Quest.npc_id == npc_id)
+    )
+
+
+def benchmark_statements(calls=BENCHMARK_CALLS, seed=0):
+    """A function that compares the prebuilt statements of the hot queries with statements built on every call.
+
+    Both ways run the same queries with a new session per call, like the handlers do, on a synthetic database.
+
+    :param int calls: (optional) The number of calls of every query. Defaults to BENCHMARK_CALLS.
+    :param int seed: (optional) The seed of the random characters and NPCs. Defaults to 0.
+
+    :returns:
+        list: A list of (query, µs per call with a built statement, µs per call with the prebuilt one) tuples, the medians of the calls.
+    """
+    rnd = Random(seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine("sqlite:///" + os.path.join(tmp_dir, "statements.db"))
+        build_synthetic_db(engine, characters=1000)
+        with Session(engine) as session:
+            npcs = session.scalars(select(db.Quest.npc_id)).all()
+        picks = [(rnd.randint(1, 1000), rnd.choice(npcs)) for _ in range(calls)]
+        queries = (
+            (
+                "get_character",
+                lambda id, _: (_build_character_query(id), None),
+                lambda id, _: (db.SELECT_CHARACTER, {"id": id}),
+            ),
+            (
+                "get_npc_quest",
+                lambda id, npc_id: (_build_npc_quest_query(id, npc_id), None),
+                lambda id, npc_id: (
+                    db.SELECT_NPC_QUEST,
+                    {"character_id": id, "npc_id": npc_id},
+                ),
+            ),
+        )
+        results = []
+        for name, *ways in queries:
+            medians = []
+            for make in ways:
+                latencies = []
+                for id, npc_id in picks:
+                    started = time.perf_counter()
+                    with Session(engine) as session:
+                        session.execute(*make(id, npc_id)).first()
+                    latencies.append((time.perf_counter() - started) * 1e6)
+                medians.append(statistics.median(latencies))
+            results.append((name, *medians))
+        engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        print(f"{'query':<16}{'built µs':>10}{'prebuilt µs':>13}")
+        for name, built, prebuilt in benchmark_statements():
+            print(f"{name:<16}{built:>10.0f}{prebuilt:>13.0f}")
+    else:
+        scans = check_query_plans()
+        for statement, plan in scans:
+            print(" ".join(statement.split()))
+            for detail in plan:
+                print(f"    {detail}")
+        if scans:
+            print(f"{len(scans)} statements scan a whole table")
+            sys.exit(1)
+        print("No statements scan a whole table")
@@ -1,14 +1,64 @@
+import asyncio
 import logging
 import os
 
-from config import GAME_DB_PATH
+from config import DB_URL, GAME_DB_PATH
 
+from db.content import content_sources
+from db.inventory import check_layout
 from db.load_all import load_all
+from db.migrations import migrate_all
+from db.world import reload_world
 
 
 def check_db() -> None:
-    if not os.path.exists(GAME_DB_PATH):
+    if DB_URL:
+        logging.info(
+            f"Using database {DB_URL.split('@')[-1]}, checking schema and content ..."
+        )
+    elif not os.path.exists(GAME_DB_PATH):
         logging.info(f"Database not found, creating {GAME_DB_PATH} ...")
-        load_all()
     else:
-        logging.info(f"Database found: {GAME_DB_PATH}")
+        logging.info(f"Database found: {GAME_DB_PATH}, checking schema and content ...")
+    migrate_all()
+    check_layout()
+    load_all()
+
+
+async def reload_content():
+    """A function that applies the changed content to the database and swaps the world snapshot in all workers.
+
+    :returns:
+        World: The new world snapshot.
+    """
+    await asyncio.to_thread(load_all)
+    return await reload_world(broadcast=True)
+
+
+def _content_mtimes():
+    """A function that returns the modification times of the content files."""
+    mtimes = {}
+    for path in content_sources():
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+async def watch_content(interval: int) -> None:
+    """A function that reloads the content whenever one of the content files changes.
+
+    :param int interval: The number of seconds between the checks.
+    """
+    mtimes = _content_mtimes()
+    while True:
+        await asyncio.sleep(interval)
+        current = _content_mtimes()
+        if current == mtimes:
+            continue
+        mtimes = current
+        try:
+            await reload_content()
+        except Exception as e:
+            logging.error(f"Couldn't reload the content: {e}")
@@ -0,0 +1,452 @@
+import asyncio
+import hashlib
+import logging
+import time
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from typing import NamedTuple
+
+from db.content import check_content, read_content
+
+
+class WorldItem(NamedTuple):
+    """A class that represents an item in the world snapshot."""
+
+    id: int
+    name: str
+    usable: bool
+
+
+class WorldLocation(NamedTuple):
+    """A class that represents a location in the world snapshot."""
+
+    id: int
+    name: str
+    description: str
+    directions: tuple
+
+
+class WorldNPC(NamedTuple):
+    """A class that represents an NPC in the world snapshot."""
+
+    id: int
+    name: str
+    location_id: int
+
+
+class WorldEnemy(NamedTuple):
+    """A class that represents an enemy in the world snapshot."""
+
+    id: int
+    name: str
+    location_id: int
+    level: int
+    loot_id: int
+
+
+class WorldResponse(NamedTuple):
+    """A class that represents a player's response to a dialog in the world snapshot."""
+
+    text: str
+    next_stage_id: int
+
+
+class WorldDialog(NamedTuple):
+    """A class that represents a dialog stage in the world snapshot."""
+
+    npc_id: int
+    stage_id: int
+    npc_text: str
+    responses: tuple
+
+
+class WorldQuest(NamedTuple):
+    """A class that represents a quest in the world snapshot."""
+
+    npc_id: int
+    task: str
+    required_level: int
+    required_item_id: int
+    required_count: int
+    reward_item_id: int
+    reward_count: int
+
+
+PATH_TABLE_MAX_LOCATIONS = 2000
+"""A constant that defines the number of locations up to which the paths between all pairs are computed with the snapshot.
+
+    In bigger worlds the table would take too long to build and too much memory, so the paths to a destination
+    are computed the first time it's looked up.
+"""
+
+PATH_ROWS_CACHED = 1024
+"""A constant that defines the number of destinations whose paths are kept in the worlds that are too big to compute all of them."""
+
+
+class PathTable:
+    """A class that represents the shortest paths between the locations along the directions.
+
+    For a destination a breadth-first search runs backwards along the directions, and every location it
+    reaches gets the next location on its shortest path to the destination. The next hops of a destination
+    are an array of location indexes, four bytes per location, and a path is read by following them.
+    """
+
+    def __init__(self, locations: dict, precompute: int = PATH_TABLE_MAX_LOCATIONS):
+        """A method that builds the table.
+
+        :param dict locations: A dictionary of WorldLocation objects by id.
+        :param int precompute: (optional) The number of locations up to which the paths to every destination are computed at once. Defaults to PATH_TABLE_MAX_LOCATIONS.
+        """
+        self.ids = list(locations)
+        self.index = {location_id: i for i, location_id in enumerate(self.ids)}
+        self.incoming = [[] for _ in self.ids]
+        for location in locations.values():
+            for direction in location.directions:
+                if direction in self.index:
+                    self.incoming[self.index[direction]].append(self.index[location.id])
+        self.rows = {}
+        self.precomputed = len(self.ids) <= precompute
+        if self.precomputed:
+            for target in range(len(self.ids)):
+                self.rows[target] = self._search(target)
+
+    def _search(self, target):
+        next_hops = array("i", [-1]) * len(self.ids)
+        next_hops[target] = target
+        queue = [target]
+        for node in queue:
+            for source in self.incoming[node]:
+                if next_hops[source] < 0:
+                    next_hops[source] = node
+                    queue.append(source)
+        return next_hops
+
+    def _get_row(self, target):
+        row = self.rows.get(target)
+        if row is None:
+            row = self._search(target)
+            if len(self.rows) >= PATH_ROWS_CACHED:
+                del self.rows[next(iter(self.rows))]
+            self.rows[target] = row
+        return row
+
+    def get_path(self, from_id, to_id):
+        """A method that returns the shortest path between two locations.
+
+        :param int from_id: The id of the starting location.
+        :param int to_id: The id of the destination.
+
+        :returns:
+            list: A list of the location ids after the start up to the destination, or None if the destination can't be reached.
+        """
+        source = self.index.get(from_id)
+        target = self.index.get(to_id)
+        if source is None or target is None:
+            return None
+        row = self._get_row(target)
+        if row[source] < 0:
+            return None
+        path = []
+        while source != target:
+            source = row[source]
+            path.append(self.ids[source])
+        return path
+
+    def get_size(self):
+        """A method that returns the memory taken by the computed next hops.
+
+        :returns:
+            int: The size in bytes.
+        """
+        return sum(row.itemsize * len(row) for row in self.rows.values())
+
+
+class World:
+    """A class that represents an immutable snapshot of the world content.
+
+    Handlers take the current snapshot once per update and read everything from it,
+    so a reload never changes the world in the middle of an update.
+    """
+
+    def __init__(self, content: dict, version: str):
+        """A method that builds the world indexes from the content files.
+
+        :param dict content: The data of each content file by its name.
+        :param str version: The version of the content.
+        """
+        self.version = version
+        self.cache = {}
+        self.items = {item["id"]: WorldItem(**item) for item in content["items"]}
+        self.locations = {
+            location["id"]: WorldLocation(
+                id=location["id"],
+                name=location["name"],
+                description=location["description"],
+                directions=tuple(location["directions"]),
+            )
+            for location in content["locations"]
+        }
+        self.npcs = {npc["id"]: WorldNPC(**npc) for npc in content["npcs"]}
+        self.enemies = {
+            enemy["id"]: WorldEnemy(**{"loot_id": None, **enemy})
+            for enemy in content["enemies"]
+        }
+        self.quests = {
+            quest["npc_id"]: WorldQuest(**quest) for quest in content["quests"]
+        }
+        self.dialogs = {
+            (dialog["npc_id"], dialog["stage_id"]): WorldDialog(
+                npc_id=dialog["npc_id"],
+                stage_id=dialog["stage_id"],
+                npc_text=dialog["npc_text"],
+                responses=tuple(
+                    WorldResponse(
+                        text=response["text"],
+                        next_stage_id=response.get("next_stage_id"),
+                    )
+                    for response in dialog["responses"]
+                ),
+            )
+            for dialog in content["dialogs"]
+        }
+
+        location_npcs = defaultdict(list)
+        for npc in sorted(self.npcs.values()):
+            location_npcs[npc.location_id].append(npc)
+        self.location_npcs = {k: tuple(v) for k, v in location_npcs.items()}
+        location_enemies = defaultdict(list)
+        for enemy in sorted(self.enemies.values()):
+            location_enemies[enemy.location_id].append(enemy)
+        self.location_enemies = {k: tuple(v) for k, v in location_enemies.items()}
+        location_quests = defaultdict(list)
+        for quest in sorted(
+            self.quests.values(), key=lambda quest: (quest.required_level, quest.npc_id)
+        ):
+            location_quests[self.npcs[quest.npc_id].location_id].append(quest)
+        self.location_quests = {k: tuple(v) for k, v in location_quests.items()}
+        self.location_quest_levels = {
+            k: tuple(quest.required_level for quest in v)
+            for k, v in self.location_quests.items()
+        }
+        self.paths = PathTable(self.locations)
+
+    def get_location(self, location_id):
+        """A method that returns a location by id.
+
+        :param int location_id: The id of the location.
+
+        :returns:
+            WorldLocation: The location or None if not found.
+        """
+        return self.locations.get(int(location_id))
+
+    def get_directions(self, location_id):
+        """A method that returns the locations reachable from a location.
+
+        :param int location_id: The id of the location.
+
+        :returns:
+            list: A list of WorldLocation objects.
+        """
+        location = self.get_location(location_id)
+        if not location:
+            return []
+        return [self.locations[direction] for direction in location.directions]
+
+    def get_path(self, from_id, to_id):
+        """A method that returns the shortest path between two locations along the directions.
+
+        :param int from_id: The id of the starting location.
+        :param int to_id: The id of the destination.
+
+        :returns:
+            list: A list of WorldLocation objects after the start up to the destination, or None if the destination can't be reached.
+        """
+        path = self.paths.get_path(int(from_id), int(to_id))
+        if path is None:
+            return None
+        return [self.locations[location_id] for location_id in path]
+
+    def get_npcs(self, location_id):
+        """A method that returns the NPCs in a location.
+
+        :param int location_id: The id of the location.
+
+        :returns:
+            tuple: A tuple of WorldNPC objects.
+        """
+        return self.location_npcs.get(int(location_id), ())
+
+    def get_enemies(self, location_id):
+        """A method that returns the enemies in a location.
+
+        :param int location_id: The id of the location.
+
+        :returns:
+            tuple: A tuple of WorldEnemy objects.
+        """
+        return self.location_enemies.get(int(location_id), ())
+
+    def get_location_quests(self, location_id, level=None):
+        """A method that returns the quests given by the NPCs in a location.
+
+        The quests of every location are indexed by the required level, so the ones open to a level
+        are a prefix of the index.
+
+        :param int location_id: The id of the location.
+        :param int level: (optional) The highest required level of the quests. Defaults to None, which returns every quest.
+
+        :returns:
+            tuple: A tuple of WorldQuest objects ordered by the required level.
+        """
+        location_id = int(location_id)
+        quests = self.location_quests.get(location_id, ())
+        if level is None:
+            return quests
+        return quests[: bisect_right(self.location_quest_levels[location_id], level)]
+
+    def get_npc(self, location_id, npc_id):
+        """A method that returns an NPC if it is in the given location.
+
+        :param int location_id: The id of the location.
+        :param int npc_id: The id of the NPC.
+
+        :returns:
+            WorldNPC: The NPC or None if it's not in the location.
+        """
+        npc = self.npcs.get(int(npc_id))
+        return npc if npc and npc.location_id == int(location_id) else None
+
+    def get_enemy(self, location_id, enemy_id):
+        """A method that returns an enemy if it is in the given location.
+
+        :param int location_id: The id of the location.
+        :param int enemy_id: The id of the enemy.
+
+        :returns:
+            WorldEnemy: The enemy or None if it's not in the location.
+        """
+        enemy = self.enemies.get(int(enemy_id))
+        return enemy if enemy and enemy.location_id == int(location_id) else None
+
+    def get_dialog(self, npc_id, stage_id):
+        """A method that returns a dialog stage of an NPC.
+
+        :param int npc_id: The id of the NPC.
+        :param int stage_id: The id of the stage.
+
+        :returns:
+            WorldDialog: The dialog stage or None if not found.
+        """
+        return self.dialogs.get((int(npc_id), int(stage_id)))
+
+
+WORLD_POLL_INTERVAL = 1.0
+"""A constant that defines how often in seconds a worker checks whether another worker has reloaded the world."""
+
+_world = None
+_cache_builders = []
+_shared_generation = None
+_generation = 0
+
+
+def register_cache_builder(builder):
+    """A function that registers a function that fills the cache of every new world snapshot.
+
+    :param function builder: The function that takes a World and fills its cache.
+    """
+    _cache_builders.append(builder)
+
+
+def share_world_generation(generation):
+    """A function that shares a reload counter between the worker processes.
+
+    When one worker reloads the world, the others rebuild their snapshots in follow_world_generation.
+
+    :param multiprocessing.Value generation: The counter shared by all workers.
+    """
+    global _shared_generation, _generation
+    _shared_generation = generation
+    _generation = generation.value
+
+
+def build_world():
+    """A function that builds a new world snapshot from the content, including its caches.
+
+    :returns:
+        World: The new world snapshot.
+
+    :raises:
+        ValueError: If the content can't be read or is not valid.
+    """
+    started = time.perf_counter()
+    content, hashes = {}, []
+    for name, (content_hash, data) in read_content().items():
+        content[name] = data
+        hashes.append(content_hash)
+    check_content(content)
+    version = hashlib.sha256("".join(hashes).encode()).hexdigest()[:12]
+    world = World(content, version)
+    for builder in _cache_builders:
+        builder(world)
+    logging.info(
+        f"World snapshot {version} is built in {(time.perf_counter() - started) * 1000:.1f} ms"
+    )
+    return world
+
+
+def get_world():
+    """A function that returns the current world snapshot.
+
+    The bot builds the snapshot at startup, the scripts that don't get it built on the first call.
+
+    :returns:
+        World: The current world snapshot.
+    """
+    global _world
+    if _world is None:
+        _world = build_world()
+    return _world
+
+
+async def reload_world(broadcast=False):
+    """A function that builds a new world snapshot in a background thread and swaps it in.
+
+    If the snapshot can't be built, the error is raised and the current snapshot stays in use.
+
+    :param bool broadcast: (optional) Whether to make the other worker processes rebuild their snapshots too. Defaults to False.
+
+    :returns:
+        World: The new world snapshot.
+    """
+    global _world, _generation
+    world = await asyncio.to_thread(build_world)
+    _world = world
+    if broadcast and _shared_generation is not None:
+        with _shared_generation.get_lock():
+            _shared_generation.value += 1
+            _generation = _shared_generation.value
+    return world
+
+
+async def follow_world_generation(interval=WORLD_POLL_INTERVAL):
+    """A function that rebuilds the world snapshot in the background whenever another worker reloads it.
+
+    The new snapshot is built in a thread and swapped in, so the handlers keep using the current one
+    in the meantime and never build it themselves.
+
+    :param float interval: (optional) The number of seconds between the checks of the shared counter. Defaults to WORLD_POLL_INTERVAL.
+    """
+    global _generation
+    while True:
+        await asyncio.sleep(interval)
+        generation = _shared_generation.value
+        if generation == _generation:
+            continue
+        # a reload during the build changes the counter again and is picked up by the next check
+        _generation = generation
+        try:
+            await reload_world()
+        except Exception as e:
+            logging.error(f"Couldn't rebuild the world snapshot: {e}")
@@ -1,11 +1,50 @@
+import importlib
 import logging
+import sys
+import time
+
+STARTUP_MODULES = (
+    "config",
+    "db.content",
+    "db.db",
+    "db.utils",
+    "bot",
+    "bot.msg_text",
+    "bot.kb",
+    "bot.handlers",
+    "fastapi",
+    "api",
+    "uvicorn",
+)
+"""A constant that defines the modules imported on startup in the order they are imported."""
+
+
+def profile_imports():
+    """A function that imports the startup modules one by one and prints how long each of them took.
+
+    The time of a module includes its dependencies that weren't imported by the previous modules.
+    """
+    started = time.perf_counter()
+    for name in STARTUP_MODULES:
+        module_started = time.perf_counter()
+        importlib.import_module(name)
+        print(f"{name:<16}{(time.perf_counter() - module_started) * 1000:>10.1f} ms")
+    print(f"{'total':<16}{(time.perf_counter() - started) * 1000:>10.1f} ms")
+
+
+def main():
+    """A function that checks the database and runs the webhook server."""
+    import uvicorn
+    from api import app
+    from bot import dp
+    from bot.handlers import router
+    from config import HOST, PORT
+    from db.utils import check_db
+
+    check_db()
+    dp.include_router(router)
+    uvicorn.run(app, host=HOST, port=PORT)
 
-import uvicorn
-from api import app
-from bot import dp
-from bot.handlers import router
-from config import HOST, PORT
-from db.utils import check_db
 
 if __name__ == "__main__":
     logging.basicConfig(
@@ -13,6 +52,7 @@ if __name__ == "__main__":
         format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     )
     logger = logging.getLogger(__name__)
-    check_db()
-    dp.include_router(router)
-    uvicorn.run(app, host=HOST, port=PORT)
+    if "--profile-imports" in sys.argv:
+        profile_imports()
+    else:
+        main()
@@ -0,0 +1,53 @@
+import asyncio
+import itertools
+import os
+import tempfile
+
+import pytest
+
+# the configuration is read when the modules are imported, so the scratch database is set up first
+TMP_DIR = tempfile.mkdtemp(prefix="tg-bot-adventure-")
+TEST_ENV = {
+    "BOT_TOKEN": "1:test",
+    "BASE_URL": "http://localhost",
+    "GAME_DB_PATH": os.path.join(TMP_DIR, "game.db"),
+    "EVENT_LOG_DIR": os.path.join(TMP_DIR, "events"),
+    "DB_URL": "",
+    "PLAYER_SHARDS": "0",
+    "WORKERS": "1",
+    "WORLD_SNAPSHOT_PATH": "",
+    "CONTENT_DIR": "",
+    "INVENTORY_LAYOUT": "rows",
+}
+os.environ.update(TEST_ENV)
+
+_character_ids = itertools.count(1000)
+
+
+@pytest.fixture(scope="session")
+def database():
+    """A fixture that creates the scratch database with the schema and the content."""
+    from db.utils import check_db
+
+    check_db()
+
+
+@pytest.fixture
+def world(database):
+    """A fixture that returns the world snapshot of the scratch database."""
+    from db.world import get_world
+
+    return get_world()
+
+
+@pytest.fixture
+def character(database):
+    """A fixture that creates a new character and deletes it after the test."""
+    import db.db as db
+
+    id = next(_character_ids)
+    character = asyncio.run(db.create_character(id, f"hero{id}"))
+    yield character
+    character = asyncio.run(db.get_character(id))
+    if character:
+        asyncio.run(character.die())
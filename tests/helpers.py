@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+from tests.conftest import TEST_ENV
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+"""A constant that defines the root directory of the repository."""
+
+
+def run_python(*args, env=None, timeout=300):
+    """A function that runs Python in a new process in the repository with the scratch configuration.
+
+    :param str args: The arguments of the interpreter, like "-m" and the name of a module.
+    :param dict env: (optional) The variables that override the scratch configuration. Defaults to None.
+    :param int timeout: (optional) The number of seconds to wait for the process. Defaults to 300.
+
+    :returns:
+        CompletedProcess: The finished process with its output.
+    """
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT_DIR,
+        env={**os.environ, **TEST_ENV, **(env or {})},
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
@@ -0,0 +1,24 @@
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from db import backup
+
+
+def test_backups_in_the_same_moment_get_their_own_directories(
+    database, tmp_path, monkeypatch
+):
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(backup, "datetime", FrozenDatetime)
+    directory = str(tmp_path / "backups")
+    paths = [backup.backup(directory, keep=2)["path"] for _ in range(3)]
+    assert len(set(paths)) == 3
+    # the suffixed names sort after the first one, so the oldest is rotated
+    assert sorted(os.listdir(directory)) == [os.path.basename(p) for p in paths[1:]]
+    for path in paths[1:]:
+        with sqlite3.connect(os.path.join(path, "game.db")) as conn:
+            assert conn.execute("PRAGMA integrity_check").fetchone() == ("ok",)
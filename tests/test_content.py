@@ -0,0 +1,63 @@
+import struct
+
+import pytest
+
+from db.content import (
+    CONTENT_NAMES,
+    SNAPSHOT_FORMAT,
+    SNAPSHOT_MAGIC,
+    compile_snapshot,
+    get_json_data,
+    load_snapshot,
+    validate_content,
+)
+
+
+def test_shipped_content_is_valid():
+    assert (
+        validate_content({name: get_json_data(name)[1] for name in CONTENT_NAMES}) == []
+    )
+
+
+def test_validation_finds_broken_references():
+    data = {name: get_json_data(name)[1] for name in CONTENT_NAMES}
+    data["locations"].append(
+        {"id": 999, "name": "Island", "description": "", "directions": [998]}
+    )
+    data["quests"][0]["reward_item_id"] = 997
+    errors = validate_content(data)
+    assert "Location 999 leads to unknown location 998" in errors
+    assert "Location 999 is unreachable" in errors
+    assert any("uses unknown item 997" in error for error in errors)
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "world.bin")
+    compile_snapshot(path)
+    assert load_snapshot(path) == {name: get_json_data(name) for name in CONTENT_NAMES}
+
+
+@pytest.mark.parametrize(
+    "header, error",
+    [
+        (b"", "is not a world snapshot"),
+        (struct.pack("<4sHBB", b"JUNK", SNAPSHOT_FORMAT, 3, 11), "of format"),
+        (
+            struct.pack("<4sHBB", SNAPSHOT_MAGIC, SNAPSHOT_FORMAT + 1, 3, 11),
+            "of format",
+        ),
+        (
+            struct.pack("<4sHBB", SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, 2, 7),
+            "compiled by Python 2.7",
+        ),
+    ],
+)
+def test_foreign_snapshot_is_refused(tmp_path, header, error):
+    path = str(tmp_path / "world.bin")
+    compile_snapshot(path)
+    with open(path, "rb") as file:
+        payload = file.read()[struct.calcsize("<4sHBB") :]
+    with open(path, "wb") as file:
+        file.write(header + (payload if header else b"x"))
+    with pytest.raises(ValueError, match=error):
+        load_snapshot(path)
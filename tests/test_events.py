@@ -0,0 +1,94 @@
+import asyncio
+
+import db.db as db
+from db.events import (
+    Event,
+    EventLog,
+    EventType,
+    apply_event,
+    event_log,
+    get_history,
+    read_segment,
+    rebuild_state,
+    verify,
+)
+
+
+def play(character, world):
+    enemy = next(enemy for enemy in world.enemies.values() if enemy.loot_id)
+    npc = world.npcs[next(iter(world.quests))]
+    character.hp = 1000
+
+    async def actions():
+        await character.attack(enemy)
+        await character.accept_npc_quest(npc)
+        direction = world.get_directions(character.location_id)[0]
+        await character.go(direction.id)
+        usable = await character.get_usable_inventory()
+        if usable:
+            await character.use_item(usable[0].item_id)
+
+    asyncio.run(actions())
+
+
+def test_state_is_rebuilt_from_the_log(character, world):
+    play(character, world)
+    event_log.flush()
+    assert rebuild_state(character.id) == db.load_character_state(character.id)
+    history = get_history(character.id)
+    assert history[0].type == EventType.CREATED
+    assert {EventType.MOVED, EventType.QUEST_ACCEPTED} <= {e.type for e in history}
+
+
+def test_archived_and_restored_players_match(character, world):
+    play(character, world)
+    with db.player_session(character.id) as session:
+        db.archive_characters(session, [character.id], "idle")
+        session.commit()
+    event_log.flush()
+    assert rebuild_state(character.id) is None
+    assert character.id not in verify()[1]
+
+    asyncio.run(db.restore_character(character.id))
+    event_log.flush()
+    assert get_history(character.id)[-1].type == EventType.RESTORED
+    assert rebuild_state(character.id) == db.load_character_state(character.id)
+    assert character.id not in verify()[1]
+
+
+def test_dead_players_are_rebuilt_as_none(character):
+    asyncio.run(character.die())
+    event_log.flush()
+    assert rebuild_state(character.id) is None
+
+
+def test_events_apply_idempotently():
+    state = {
+        "name": "hero",
+        "hp": 10,
+        "level": 1,
+        "location_id": 1,
+        "inventory": [[1, 1]],
+        "journal": [],
+    }
+    for e in (
+        Event(EventType.ITEM, 1, 0, 2, 3),
+        Event(EventType.QUEST_ACCEPTED, 1, 0, 5),
+        Event(EventType.QUEST_COMPLETED, 1, 0, 5),
+    ):
+        once = apply_event(dict(state), e)
+        assert apply_event(dict(once), e) == once
+        state = once
+    assert state["inventory"] == [[1, 1], [2, 3]]
+    assert state["journal"] == [[5, True]]
+
+
+def test_damaged_frame_is_skipped(tmp_path):
+    log = EventLog(str(tmp_path))
+    log.append([Event(EventType.MOVED, 1, 0, 2)])
+    log.flush()
+    log.append([Event(EventType.MOVED, 1, 1, 3)])
+    log.flush()
+    (path,) = tmp_path.iterdir()
+    path.write_bytes(path.read_bytes()[:-1])
+    assert [e.a for e in read_segment(str(path))] == [2]
@@ -0,0 +1,35 @@
+import asyncio
+import gzip
+import json
+
+import db.db as db
+from db.export import export_players
+
+
+def read_jsonl(path):
+    with gzip.open(path, "rt") as file:
+        return [json.loads(line) for line in file]
+
+
+def test_export_includes_the_archive(character, tmp_path):
+    active = asyncio.run(db.create_character(character.id + 10**6, "active"))
+    with db.player_session(character.id) as session:
+        db.archive_characters(session, [character.id], "idle")
+        session.commit()
+    try:
+        exported = export_players(str(tmp_path), "jsonl")
+        characters = read_jsonl(tmp_path / "characters.jsonl.gz")
+        archived = read_jsonl(tmp_path / "archived_characters.jsonl.gz")
+        assert active.id in {row["id"] for row in characters}
+        assert character.id not in {row["id"] for row in characters}
+        entry = next(row for row in archived if row["character_id"] == character.id)
+        assert entry["data"]["character"]["name"] == character.name
+        assert exported["archived_characters"] == len(archived)
+        assert not (tmp_path / "export.json").exists()
+
+        export_players(str(tmp_path / "csv"), "csv")
+        with gzip.open(tmp_path / "csv" / "archived_characters.csv.gz", "rt") as file:
+            assert file.readline().strip() == "id,character_id,reason,archived_at,data"
+    finally:
+        asyncio.run(db.restore_character(character.id))
+        asyncio.run(active.die())
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from tests.helpers import run_python
+
+
+def run_integration(env):
+    result = run_python("-m", "db.integration", env=env)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "All checks passed" in result.stdout
+
+
+@pytest.mark.parametrize("shards", ["0", "4"])
+@pytest.mark.parametrize("layout", ["rows", "packed"])
+def test_sqlite(tmp_path, layout, shards):
+    run_integration(
+        {
+            "GAME_DB_PATH": str(tmp_path / "game.db"),
+            "INVENTORY_LAYOUT": layout,
+            "PLAYER_SHARDS": shards,
+        }
+    )
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DB_URL"),
+    reason="TEST_DB_URL isn't set to a PostgreSQL database",
+)
+@pytest.mark.parametrize("layout", ["rows", "packed"])
+def test_postgresql(layout):
+    run_integration({"DB_URL": os.environ["TEST_DB_URL"], "INVENTORY_LAYOUT": layout})
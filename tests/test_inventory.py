@@ -0,0 +1,75 @@
+import pytest
+
+import db.db as db
+from db.inventory import (
+    INVENTORY_LAYOUTS,
+    check_layout,
+    convert,
+    pack_inventory,
+    unpack_inventory,
+)
+
+
+@pytest.fixture(params=INVENTORY_LAYOUTS)
+def store(request):
+    """A fixture that returns the inventory store of every layout."""
+    return db.get_inventory_store(request.param)
+
+
+def test_pack_round_trip():
+    items = {7: 1, 2: 2**31 - 1, 100: 3}
+    assert unpack_inventory(pack_inventory(items)) == dict(sorted(items.items()))
+    assert unpack_inventory(b"") == {}
+
+
+def test_unknown_layout_is_refused():
+    with pytest.raises(ValueError, match="Unknown inventory layout"):
+        db.get_inventory_store("columns")
+
+
+def test_store_operations(store, character):
+    id = character.id
+    with db.Session() as session:
+        store.delete(session, [id])
+        assert store.add(session, id, 3, 2) == 2
+        assert store.add(session, id, 3, 1) == 3
+        assert store.add(session, id, 1, 5) == 5
+        assert store.remove(session, id, 3, 4) is None
+        assert store.remove(session, id, 3, 3) == 0
+        assert store.remove(session, id, 9, 1) is None
+        assert store.load(session, id) == {1: 5}
+
+        store.replace(session, id, {4: 1, 2: 2, 6: 3})
+        assert list(store.load(session, id).items()) == [(2, 2), (4, 1), (6, 3)]
+        assert store.load_many(session, [id, -1]) == {id: {2: 2, 4: 1, 6: 3}}
+        assert store.rows(session, id, id) == [(id, 2, 2), (id, 4, 1), (id, 6, 3)]
+        assert id in store.character_ids(session, id - 1, 1)
+
+        assert store.load_page(session, id, 2, 1) == [(4, 1)]
+        assert store.load_page(session, id, 6, 2, backward=True) == [(2, 2), (4, 1)]
+        assert store.load_page(session, id, 6, 1) == []
+
+        store.delete(session, [id])
+        assert store.load(session, id) == {}
+        session.rollback()
+
+
+def test_convert_moves_inventories_between_layouts(character):
+    with db.player_session(character.id, read=True) as session:
+        items = db.inventory_store.load(session, character.id)
+    assert items
+    check_layout("rows")
+    with pytest.raises(ValueError, match="stored in the rows layout"):
+        check_layout("packed")
+    try:
+        assert convert("packed") >= 1
+        check_layout("packed")
+        with db.player_session(character.id, read=True) as session:
+            assert db.get_inventory_store("rows").load(session, character.id) == {}
+            packed = db.get_inventory_store("packed").load(session, character.id)
+        assert packed == items
+    finally:
+        convert("rows")
+    check_layout("rows")
+    with db.player_session(character.id, read=True) as session:
+        assert db.inventory_store.load(session, character.id) == items
@@ -0,0 +1,94 @@
+import asyncio
+import random
+from datetime import datetime
+
+import db.db as db
+from db.leaderboard import Leaderboard, get_leaderboard, load_leaderboard
+from db.maintenance import archive_idle
+
+
+def naive_top(levels, count):
+    ordered = sorted(levels.items(), key=lambda item: -item[1])
+    return [
+        (1 + sum(other > level for other in levels.values()), id, level)
+        for id, level in ordered[:count]
+    ]
+
+
+def test_ranks_match_a_sort():
+    rnd = random.Random(0)
+    leaderboard, levels = Leaderboard(), {}
+    for _ in range(2000):
+        id = rnd.randint(1, 300)
+        if rnd.random() < 0.2:
+            leaderboard.remove(id)
+            levels.pop(id, None)
+        else:
+            # levels above the initial size of the tree make it grow
+            levels[id] = rnd.randint(1, 200)
+            leaderboard.set(id, f"hero{id}", levels[id])
+    assert len(leaderboard) == len(levels)
+    for id, level in levels.items():
+        assert leaderboard.get_rank(id) == 1 + sum(
+            other > level for other in levels.values()
+        )
+    top = [(rank, id, level) for rank, id, _, level in leaderboard.get_top(20)]
+    assert [(rank, level) for rank, _, level in top] == [
+        (rank, level) for rank, _, level in naive_top(levels, 20)
+    ]
+    assert leaderboard.get_rank(-1) is None
+
+
+def test_characters_of_a_level_are_listed_in_the_order_they_reached_it():
+    leaderboard = Leaderboard()
+    leaderboard.set(1, "first", 2)
+    leaderboard.set(2, "second", 2)
+    leaderboard.set(3, "third", 1)
+    assert leaderboard.get_top() == [
+        (1, 1, "first", 2),
+        (1, 2, "second", 2),
+        (3, 3, "third", 1),
+    ]
+
+
+def level_up(character, levels, commit=True):
+    with db.player_session(character.id) as session:
+        session.expire_on_commit = False
+        session.add(character)
+        asyncio.run(character.advance_level(session, levels))
+        if commit:
+            session.commit()
+        else:
+            session.rollback()
+
+
+def test_commits_update_the_leaderboard(character):
+    id = character.id
+    leaderboard = load_leaderboard()
+    rank = leaderboard.get_rank(id)
+    assert rank is not None
+    level_up(character, 100, commit=False)
+    assert leaderboard.get_rank(id) == rank
+    # the rolled back session expires the character
+    character = asyncio.run(db.get_character(id))
+    level_up(character, 100)
+    assert leaderboard.get_rank(id) == 1
+
+    asyncio.run(character.die())
+    assert leaderboard.get_rank(id) is None
+
+
+def test_archived_characters_leave_the_leaderboard(character):
+    leaderboard = load_leaderboard()
+    with db.player_session(character.id) as session:
+        session.execute(
+            db.Protagonist.__table__.update()
+            .where(db.Protagonist.id == character.id)
+            .values(last_active=datetime(2000, 1, 1))
+        )
+        session.commit()
+    archive_idle(db.engine, datetime(2001, 1, 1))
+    assert leaderboard.get_rank(character.id) is None
+
+    asyncio.run(db.restore_character(character.id))
+    assert get_leaderboard().get_rank(character.id) is not None
@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from db import content
+import db.db as db
+from db.load_all import load_all, sync_table
+
+
+@pytest.fixture
+def content_dir(database, tmp_path, monkeypatch):
+    """A fixture that points the content to a copy of db/data and loads the original content after the test."""
+    directory = tmp_path / "data"
+    shutil.copytree(content.DATA_DIR, directory)
+    monkeypatch.setattr(content, "DATA_DIR", str(directory))
+    yield directory
+    monkeypatch.undo()
+    load_all()
+
+
+def edit_items(directory, edit):
+    path = os.path.join(directory, "items.json")
+    with open(path) as file:
+        items = json.load(file)
+    edit(items)
+    with open(path, "w") as file:
+        json.dump(items, file)
+
+
+def get_items():
+    with db.engine.connect() as conn:
+        return {
+            row.id: (row.name, row.usable)
+            for row in conn.execute(select(db.Item.__table__))
+        }
+
+
+def test_sync_table_changes_only_the_differing_rows():
+    engine = create_engine("sqlite://")
+    table = db.Item.__table__
+    table.create(engine)
+    rows = [{"id": id, "name": f"item{id}", "usable": False} for id in range(1, 6)]
+    with engine.begin() as conn:
+        assert sync_table(conn, table, rows) == (5, 0)
+        assert sync_table(conn, table, rows) == (0, 0)
+        rows[0]["name"] = "renamed"
+        assert sync_table(conn, table, rows[:4]) == (1, 1)
+        stored = conn.execute(select(table).order_by(table.c.id)).all()
+    assert [tuple(row) for row in stored] == [
+        (row["id"], row["name"], row["usable"]) for row in rows[:4]
+    ]
+
+
+def test_load_all_applies_the_changed_file(content_dir):
+    items = get_items()
+    first_id = min(items)
+    edit_items(content_dir, lambda data: data[0].update(name="Shiny Sword"))
+    edit_items(
+        content_dir,
+        lambda data: data.append({"id": 999, "name": "Pebble", "usable": True}),
+    )
+    load_all()
+    assert get_items() == {
+        **items,
+        first_id: ("Shiny Sword", items[first_id][1]),
+        999: ("Pebble", True),
+    }
+
+    edit_items(content_dir, lambda data: data.pop())
+    load_all()
+    assert 999 not in get_items()
+
+
+def test_load_all_changes_nothing_on_invalid_content(content_dir):
+    items = get_items()
+    with open(os.path.join(content_dir, "enemies.json")) as file:
+        enemies = json.load(file)
+    enemies[0]["loot_id"] = 12345
+    with open(os.path.join(content_dir, "enemies.json"), "w") as file:
+        json.dump(enemies, file)
+    edit_items(content_dir, lambda data: data[0].update(name="Broken Sword"))
+    with pytest.raises(ValueError, match="unknown item 12345"):
+        load_all()
+    assert get_items() == items
+
+
+def test_load_all_reports_malformed_json(content_dir):
+    with open(os.path.join(content_dir, "npcs.json"), "w") as file:
+        file.write("[{")
+    with pytest.raises(ValueError, match="Couldn't read the json file 'npcs'"):
+        load_all()
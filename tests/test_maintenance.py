@@ -0,0 +1,38 @@
+from sqlalchemy import create_engine, text
+
+from db.maintenance import VACUUM_PAGES, vacuum, vacuum_step
+
+
+def make_free_pages(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, data BLOB)"))
+        conn.execute(
+            text("INSERT INTO t (data) VALUES (zeroblob(4000))"),
+            [{}] * rows,
+        )
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM t"))
+    with engine.connect() as conn:
+        return engine, conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+
+
+def test_vacuum_step_returns_a_batch_of_pages(tmp_path):
+    engine, free = make_free_pages(tmp_path / "big.db", VACUUM_PAGES * 3)
+    assert free > VACUUM_PAGES
+    assert vacuum_step(engine) == free - VACUUM_PAGES
+
+    engine, free = make_free_pages(tmp_path / "small.db", VACUUM_PAGES // 4)
+    assert 0 < free < VACUUM_PAGES
+    assert vacuum_step(engine) == 0
+
+
+def test_vacuum_returns_every_free_page(tmp_path):
+    engine, free = make_free_pages(tmp_path / "game.db", VACUUM_PAGES * 2)
+    with engine.connect() as conn:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+    assert vacuum(engine) == free * page_size
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
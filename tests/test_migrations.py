@@ -0,0 +1,62 @@
+from sqlalchemy import create_engine, inspect, text
+
+from db.migrations import MIGRATIONS, get_applied_versions, migrate
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE characters (id INTEGER PRIMARY KEY, name VARCHAR, hp INTEGER, level INTEGER, location_id INTEGER)",
+    "CREATE TABLE journals (character_id INTEGER, npc_id INTEGER, completed BOOLEAN, PRIMARY KEY (character_id, npc_id))",
+    "CREATE TABLE inventories (character_id INTEGER, item_id INTEGER, count INTEGER, PRIMARY KEY (character_id, item_id))",
+)
+
+
+def get_versions(engine):
+    with engine.connect() as conn:
+        return get_applied_versions(conn)
+
+
+def test_new_database_gets_the_latest_schema(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrate(engine=engine) == []
+    assert get_versions(engine) == {migration.version for migration in MIGRATIONS}
+    assert migrate(engine=engine) == []
+
+
+def test_dry_run_reports_without_changes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+    pending = migrate(dry_run=True, engine=engine)
+    assert [migration.version for migration, _ in pending] == [
+        migration.version for migration in MIGRATIONS
+    ]
+    assert not inspect(engine).has_table("schema_migrations")
+
+
+def test_legacy_database_is_upgraded(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.execute(text(statement))
+        conn.execute(
+            text("INSERT INTO characters VALUES (:id, 'hero', 10, 1, 1)"),
+            [{"id": id} for id in range(1, 2501)],
+        )
+    pending = migrate(engine=engine)
+    assert [migration.version for migration, _ in pending] == [
+        migration.version for migration in MIGRATIONS
+    ]
+    inspector = inspect(engine)
+    assert inspector.has_table("packed_inventories")
+    assert "last_active" in {c["name"] for c in inspector.get_columns("characters")}
+    indexes = {index["name"] for index in inspector.get_indexes("characters")}
+    assert {"ix_characters_location_id", "ix_characters_last_active"} <= indexes
+    with engine.connect() as conn:
+        assert (
+            conn.execute(
+                text("SELECT count(*) FROM characters WHERE last_active IS NULL")
+            ).scalar()
+            == 0
+        )
+    assert get_versions(engine) == {migration.version for migration in MIGRATIONS}
+    assert migrate(engine=engine) == []
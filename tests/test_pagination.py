@@ -0,0 +1,95 @@
+import asyncio
+import json
+import shutil
+
+import pytest
+
+import db.db as db
+from bot import kb
+from db import content
+from db.load_all import load_all
+from db.world import reload_world
+
+PAGE = 2
+
+
+@pytest.fixture
+def usable_items(database, tmp_path, monkeypatch):
+    """A fixture that makes every item with an even id usable and returns their ids."""
+    directory = tmp_path / "data"
+    shutil.copytree(content.DATA_DIR, directory)
+    items = json.loads((directory / "items.json").read_text())
+    for item in items:
+        item["usable"] = item["id"] % 2 == 0
+    (directory / "items.json").write_text(json.dumps(items))
+    monkeypatch.setattr(content, "DATA_DIR", str(directory))
+    load_all()
+    asyncio.run(reload_world())
+    yield [item["id"] for item in items if item["usable"]]
+    monkeypatch.undo()
+    load_all()
+    asyncio.run(reload_world())
+
+
+@pytest.fixture(params=["rows", "packed"])
+def stocked_character(request, character, usable_items, monkeypatch):
+    """A fixture that returns a character with one of every item in both inventory layouts."""
+    store = db.get_inventory_store(request.param)
+    monkeypatch.setattr(db, "inventory_store", store)
+    with db.player_session(character.id) as session:
+        db.get_inventory_store("rows").delete(session, [character.id])
+        store.replace(session, character.id, {id: 1 for id in range(1, 16)})
+        session.commit()
+    yield character
+    with db.player_session(character.id) as session:
+        store.delete(session, [character.id])
+        session.commit()
+
+
+def get_page(character, cursor=0, backward=False):
+    entries, before, after = asyncio.run(
+        character.get_usable_inventory_page(cursor, backward, limit=PAGE)
+    )
+    return [entry.item_id for entry in entries], before, after
+
+
+def test_pages_go_forward_and_back(stocked_character, usable_items):
+    pages, cursor, after = [], 0, True
+    while after:
+        ids, before, after = get_page(stocked_character, cursor)
+        assert before == bool(pages)
+        pages.append(ids)
+        cursor = ids[-1]
+    assert [id for page in pages for id in page] == usable_items
+    assert all(len(page) == PAGE for page in pages[:-1])
+
+    ids, before, after = get_page(stocked_character, pages[-1][0], backward=True)
+    assert (ids, before, after) == (pages[-2], len(pages) > 2, True)
+    assert get_page(stocked_character, pages[1][0], backward=True) == (
+        pages[0],
+        False,
+        True,
+    )
+
+
+def test_page_shown_again_after_use(stocked_character, usable_items):
+    # the handler shows the page again from the item before its first one
+    assert get_page(stocked_character, usable_items[0] - 1)[1] is False
+    assert get_page(stocked_character, usable_items[PAGE] - 1)[1] is True
+
+
+def test_used_up_page_falls_back_to_the_first(stocked_character, usable_items):
+    assert get_page(stocked_character, usable_items[-1]) == (
+        usable_items[:PAGE],
+        False,
+        True,
+    )
+
+
+def test_page_menu_has_navigation_only_where_there_are_pages():
+    assert len(kb.build_page_menu([], "view", back=False).inline_keyboard) == 0
+    menu = kb.build_page_menu([], "view", "<3", ">5", back=False)
+    assert [button.callback_data for button in menu.inline_keyboard[0]] == [
+        "view:<3",
+        "view:>5",
+    ]
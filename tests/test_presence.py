@@ -0,0 +1,47 @@
+import time
+
+from db.presence import Presence
+
+
+def test_nearby_lists_the_latest_first():
+    presence = Presence(timeout=60)
+    now = time.monotonic()
+    for id in range(1, 5):
+        presence.see(id, f"hero{id}", 1, now=now + id)
+    presence.see(9, "elsewhere", 2, now=now)
+    assert presence.get_nearby(1, character_id=4, limit=2) == (
+        ["hero3", "hero2"],
+        3,
+    )
+    presence.see(2, "hero2", 2, now=now + 5)
+    assert presence.get_nearby(1) == (["hero4", "hero3", "hero1"], 3)
+    presence.leave(4)
+    assert presence.get_nearby(1) == (["hero3", "hero1"], 2)
+
+
+def test_idle_players_expire():
+    presence = Presence(timeout=60)
+    now = time.monotonic()
+    presence.see(1, "idle", 1, now=now - 120)
+    presence.see(2, "active", 1, now=now)
+    assert presence.get_nearby(1) == (["active"], 1)
+    assert 1 not in presence.players
+
+
+def test_sweep_expires_the_locations_nobody_looks_at():
+    presence = Presence(timeout=60)
+    for id in range(1, 101):
+        presence.see(id, f"hero{id}", id % 10, now=0)
+    # seeing a player expires only the location the player is in
+    presence.see(1000, "active", 1, now=100)
+    assert len(presence.players) == 91
+    assert presence.sweep(now=100) == 90
+    assert presence.players == {1000: 1}
+    assert list(presence.locations) == [1]
+
+
+def test_disabled_index_stays_empty():
+    presence = Presence(enabled=False)
+    presence.see(1, "hero", 1)
+    assert presence.get_nearby(1) == ([], 0)
+    assert presence.sweep() == 0
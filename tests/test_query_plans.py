@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from db.query_plans import find_full_scans
+from tests.helpers import run_python
+
+
+def test_find_full_scans_flags_unindexed_lookups():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (id INTEGER PRIMARY KEY, name VARCHAR)"))
+    statements = [
+        ("SELECT name FROM t WHERE id = ?", (1,)),
+        ("SELECT id FROM t WHERE name = ?", ("a",)),
+    ]
+    assert [sql for sql, _ in find_full_scans(engine, statements)] == [
+        "SELECT id FROM t WHERE name = ?"
+    ]
+
+
+@pytest.mark.parametrize("layout", ["rows", "packed"])
+def test_player_queries_use_indexes(tmp_path, layout):
+    result = run_python(
+        "-m",
+        "db.query_plans",
+        env={"GAME_DB_PATH": str(tmp_path / "game.db"), "INVENTORY_LAYOUT": layout},
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "No statements scan a whole table" in result.stdout
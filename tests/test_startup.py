@@ -0,0 +1,47 @@
+import os
+
+from tests.conftest import TMP_DIR
+from tests.helpers import run_python
+
+HEAVY_MODULES = ("aiogram", "sqlalchemy", "fastapi", "uvicorn")
+
+
+def test_main_defers_the_heavy_imports():
+    result = run_python(
+        "-c",
+        "import sys, main; print(' '.join(sorted({m.split('.')[0] for m in sys.modules})))",
+    )
+    assert result.returncode == 0, result.stderr
+    assert not set(HEAVY_MODULES) & set(result.stdout.split())
+
+
+def test_profile_imports_every_startup_module():
+    from main import STARTUP_MODULES
+
+    result = run_python("main.py", "--profile-imports")
+    assert result.returncode == 0, result.stderr
+    profiled = [line.split()[0] for line in result.stdout.splitlines()]
+    assert profiled == [*STARTUP_MODULES, "total"]
+
+
+def test_messages_are_formatted_when_defined():
+    from bot import msg_text
+
+    for name in dir(msg_text):
+        if name.startswith("msg_"):
+            assert getattr(msg_text, name).endswith(msg_text.SPEC_MSG_END), name
+        elif name.startswith("spec_msg_"):
+            assert not getattr(msg_text, name).endswith(msg_text.SPEC_MSG_END), name
+
+
+def test_check_db_creates_and_reopens_the_database():
+    path = os.path.join(TMP_DIR, "startup.db")
+    code = (
+        "from db.utils import check_db; check_db();"
+        "from db.world import get_world; print(len(get_world().locations))"
+    )
+    # the first run creates the database, the second finds it up to date
+    for _ in range(2):
+        result = run_python("-c", code, env={"GAME_DB_PATH": path})
+        assert result.returncode == 0, result.stderr
+        assert int(result.stdout) > 0
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import multiprocessing
+import shutil
+
+import pytest
+
+from db import content, world
+
+
+@pytest.fixture
+def content_dir(database, tmp_path, monkeypatch):
+    """A fixture that points the content to a copy of db/data and restores the world after the test."""
+    current = world.get_world()
+    directory = tmp_path / "data"
+    shutil.copytree(content.DATA_DIR, directory)
+    monkeypatch.setattr(content, "DATA_DIR", str(directory))
+    yield directory
+    monkeypatch.setattr(world, "_world", current)
+
+
+def rename_first_location(directory, name):
+    locations = json.loads((directory / "locations.json").read_text())
+    locations[0]["name"] = name
+    (directory / "locations.json").write_text(json.dumps(locations))
+    return locations[0]["id"]
+
+
+def test_reload_swaps_the_world(content_dir):
+    current = world.get_world()
+    id = rename_first_location(content_dir, "Renamed")
+    reloaded = asyncio.run(world.reload_world())
+    assert world.get_world() is reloaded
+    assert reloaded.version != current.version
+    assert reloaded.locations[id].name == "Renamed"
+
+
+@pytest.mark.parametrize(
+    "damage, error",
+    [
+        (lambda directory: (directory / "npcs.json").write_text("[{"), "npcs"),
+        (lambda directory: (directory / "items.json").unlink(), "items"),
+        (
+            lambda directory: (directory / "locations.json").write_text(
+                json.dumps(
+                    [
+                        {**location, "directions": [12345]}
+                        for location in json.loads(
+                            (directory / "locations.json").read_text()
+                        )
+                    ]
+                )
+            ),
+            "unknown location 12345",
+        ),
+    ],
+)
+def test_failed_reload_keeps_the_current_world(content_dir, damage, error):
+    current = world.get_world()
+    damage(content_dir)
+    with pytest.raises(ValueError, match=error):
+        asyncio.run(world.reload_world())
+    assert world.get_world() is current
+
+
+def test_workers_follow_the_shared_generation(content_dir, monkeypatch):
+    # the generation is shared for this test only
+    monkeypatch.setattr(world, "_shared_generation", None)
+    monkeypatch.setattr(world, "_generation", 0)
+    generation = multiprocessing.Value("i", 0)
+    world.share_world_generation(generation)
+    current = world.get_world()
+    rename_first_location(content_dir, "Followed")
+
+    async def follow():
+        task = asyncio.create_task(world.follow_world_generation(0.01))
+        await asyncio.sleep(0.05)
+        assert world.get_world() is current
+        with generation.get_lock():
+            generation.value += 1
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if world.get_world() is not current:
+                break
+        task.cancel()
+
+    asyncio.run(follow())
+    assert world.get_world() is not current